@@ -0,0 +1,148 @@
+"""
+Cheap feasibility checks that run before any CP-SAT model is built.
+
+Every check is a necessary condition for a schedule to exist; a non-empty
+result proves the input infeasible and names the entities responsible.
+Passing all checks does not prove feasibility.
+"""
+from typing import List, Dict, Tuple
+from ortools.graph.python import max_flow
+from models import Teacher, Room, SchoolClass, TimeSlot, Conflict
+
+def slot_masks(teachers: List[Teacher], rooms: List[Room],
+               time_slots: List[TimeSlot]) -> Tuple[int, List[int], List[int]]:
+    """Availability as bitsets over slot positions: bit n is time_slots[n].
+
+    Returns the open (not blocked) slots, then one mask per teacher and
+    one per room in input order. Unknown slot ids are ignored.
+    """
+    bit = {s.id: 1 << n for n, s in enumerate(time_slots)}
+    open_mask = sum(bit[s.id] for s in time_slots if not s.blocked)
+
+    def available(unavailable: List[str]) -> int:
+        mask = open_mask
+        for s_id in unavailable:
+            mask &= ~bit.get(s_id, 0)
+        return mask
+
+    return open_mask, [available(t.unavailable) for t in teachers], [available(r.unavailable) for r in rooms]
+
+def analyze(teachers: List[Teacher], rooms: List[Room], classes: List[SchoolClass],
+            time_slots: List[TimeSlot]) -> List[Conflict]:
+    conflicts = []
+    open_mask, teacher_masks, room_masks = slot_masks(teachers, rooms, time_slots)
+    teacher_mask = {t.id: m for t, m in zip(teachers, teacher_masks)}
+    # Slots each teacher can give
+    capacity = {t.id: m.bit_count() for t, m in zip(teachers, teacher_masks)}
+    eligible = {c.id: [t for t in teachers if c.can_be_taught_by(t)] for c in classes}
+    usable_rooms = {c.id: [(r, m) for r, m in zip(rooms, room_masks) if c.can_use_room(r)] for c in classes}
+    demand = [c for c in classes if c.required_sessions > 0]
+
+    # 1. Subject coverage: every class needs at least one eligible teacher
+    for c in demand:
+        if not eligible[c.id]:
+            if c.teacher_id and not any(t.id == c.teacher_id for t in teachers):
+                message = f"Class '{c.name}' is pre-assigned to unknown teacher '{c.teacher_id}'"
+            elif c.teacher_id:
+                message = f"Pre-assigned teacher '{c.teacher_id}' is not qualified for {c.subject} ('{c.name}')"
+            else:
+                message = f"No teacher is qualified for {c.subject} ('{c.name}')"
+            conflicts.append(Conflict("no_qualified_teacher", message, {"classes": [c.id]}))
+        if not usable_rooms[c.id]:
+            needs = f"a '{c.room_type}' room" if c.room_type else "an ordinary room"
+            conflicts.append(Conflict(
+                "no_suitable_room",
+                f"Class '{c.name}' needs {needs} for {c.enrollment} students and none fits",
+                {"classes": [c.id]}
+            ))
+
+    # 2. A class meets at most once per slot, and only where one of its
+    # teachers and one of its rooms are both available
+    for c in demand:
+        if not eligible[c.id] or not usable_rooms[c.id]:
+            continue
+        teachers_free = rooms_free = 0
+        for t in eligible[c.id]:
+            teachers_free |= teacher_mask[t.id]
+        for _, m in usable_rooms[c.id]:
+            rooms_free |= m
+        n_slots = (open_mask & teachers_free & rooms_free).bit_count()
+        if c.required_sessions > n_slots:
+            conflicts.append(Conflict(
+                "too_many_sessions",
+                f"Class '{c.name}' needs {c.required_sessions} sessions but only {n_slots} time slots have "
+                f"both a teacher and a room available for it",
+                {"classes": [c.id]}
+            ))
+
+    # 3. Per-teacher load: classes that only one teacher can take
+    load = {}
+    for c in demand:
+        if len(eligible[c.id]) == 1:
+            load.setdefault(eligible[c.id][0].id, []).append(c)
+    for t_id, t_classes in load.items():
+        sessions = sum(c.required_sessions for c in t_classes)
+        if sessions > capacity[t_id]:
+            conflicts.append(Conflict(
+                "teacher_overloaded",
+                f"Teacher '{t_id}' is the only option for {sessions} sessions but is available in only "
+                f"{capacity[t_id]} time slots",
+                {"teachers": [t_id], "classes": [c.id for c in t_classes]}
+            ))
+
+    # 4. Total room-slot capacity
+    total = sum(c.required_sessions for c in demand)
+    room_slots = sum(m.bit_count() for m in room_masks)
+    if total > room_slots:
+        conflicts.append(Conflict(
+            "room_capacity",
+            f"{total} sessions are required but only {room_slots} room-slots are available "
+            f"({len(rooms)} rooms, {open_mask.bit_count()} open slots)",
+            {"rooms": [r.id for r in rooms]}
+        ))
+
+    # 5. Teacher-subject demand as max-flow; subsumes check 3 when classes
+    # share teachers, but only worth running once the cheap checks pass.
+    if not conflicts and demand:
+        conflict = _teacher_flow_conflict(teachers, demand, eligible, capacity)
+        if conflict:
+            conflicts.append(conflict)
+
+    return conflicts
+
+def _teacher_flow_conflict(teachers: List[Teacher], classes: List[SchoolClass],
+                           eligible: Dict[str, List[Teacher]], capacity: Dict[str, int]):
+    # source -> class (required sessions) -> eligible teacher (unbounded)
+    # -> sink (one session per available slot). If the max flow is short of
+    # the total demand, the source side of the min cut is a Hall violator: a
+    # set of classes whose eligible teachers cannot cover them together.
+    source, sink = 0, 1
+    class_node = {c.id: 2 + i for i, c in enumerate(classes)}
+    teacher_node = {t.id: 2 + len(classes) + i for i, t in enumerate(teachers)}
+
+    total = sum(c.required_sessions for c in classes)
+    flow = max_flow.SimpleMaxFlow()
+    for c in classes:
+        flow.add_arc_with_capacity(source, class_node[c.id], c.required_sessions)
+        for t in eligible[c.id]:
+            # Larger than any cut, so the min cut never separates a class
+            # from one of its eligible teachers
+            flow.add_arc_with_capacity(class_node[c.id], teacher_node[t.id], total + 1)
+    for t in teachers:
+        flow.add_arc_with_capacity(teacher_node[t.id], sink, capacity[t.id])
+
+    if flow.solve(source, sink) != flow.OPTIMAL:
+        return None
+    if flow.optimal_flow() >= total:
+        return None
+
+    cut = set(flow.get_source_side_min_cut())
+    cut_classes = [c.id for c in classes if class_node[c.id] in cut]
+    cut_teachers = [t.id for t in teachers if teacher_node[t.id] in cut]
+    demand = sum(c.required_sessions for c in classes if class_node[c.id] in cut)
+    return Conflict(
+        "teacher_capacity",
+        f"{len(cut_classes)} classes need {demand} sessions but their {len(cut_teachers)} eligible "
+        f"teachers can give at most {sum(capacity[t] for t in cut_teachers)}",
+        {"classes": cut_classes, "teachers": cut_teachers}
+    )
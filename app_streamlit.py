@@ -2,10 +2,16 @@ import streamlit as st
 import pandas as pd
 from models import Teacher, Room, SchoolClass, TimeSlot
 from solver import SchoolScheduler
+from cache import ResultCache, canonical_key
+from templates import TemplateCache
+from term import TermSpec, solve_term
 import uuid
+from dataclasses import asdict
 
 st.set_page_config(page_title="School Scheduler Agent", layout="wide")
 
+ALL_DAYS = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat']
+
 # Initialize Session State
 if 'teachers' not in st.session_state:
     st.session_state.teachers = []
@@ -13,66 +19,244 @@ if 'rooms' not in st.session_state:
     st.session_state.rooms = []
 if 'classes' not in st.session_state:
     st.session_state.classes = []
-if 'schedule' not in st.session_state:
-    st.session_state.schedule = []
+if 'index' not in st.session_state:
+    # id -> entity lookups, kept in step with the lists by add_entity
+    st.session_state.index = {'teachers': {}, 'rooms': {}, 'classes': {}, 'teacher_names': {}}
+if 'version' not in st.session_state:
+    # Bumped on every change to the entities; cached views compare against it
+    st.session_state.version = 0
+if 'result' not in st.session_state:
+    # Last solve, kept across reruns: key, version, response, display frame
+    st.session_state.result = None
+if 'grid' not in st.session_state:
+    # Representative week: school days and periods per day
+    st.session_state.grid = (tuple(ALL_DAYS[:5]), 5)
+if 'insights' not in st.session_state:
+    st.session_state.insights = {}  # result key -> Gemini summary
+
+@st.cache_resource
+def get_result_cache():
+    # Shared across reruns and sessions; identical inputs skip CP-SAT
+    return ResultCache()
+
+@st.cache_resource
+def get_template_cache():
+    # Changing session counts or pre-assignments reuses the built model
+    return TemplateCache(max_bytes=64 * 1024 * 1024)
+
+def time_slots():
+    """The week's slots, rebuilt only when the grid changes."""
+    cached = st.session_state.get('slots')
+    if cached and cached[0] == st.session_state.grid:
+        return cached[1]
+    days, periods = st.session_state.grid
+    slots = [TimeSlot(id=f"{d}_{p}", day=d, period=p) for d in days for p in range(1, periods + 1)]
+    st.session_state.slots = (st.session_state.grid, slots)
+    return slots
+
+def parse_closed_days(text):
+    """'3:Mon, 7:Fri' -> term exceptions closing those days."""
+    closed = {}
+    for part in text.split(','):
+        if ':' in part:
+            week, day = part.split(':', 1)
+            closed.setdefault(int(week), []).append(day.strip())
+    return [{"week": week, "closed_days": days} for week, days in sorted(closed.items())]
 
 def generate_uid():
     return str(uuid.uuid4())[:8]
 
+def add_entity(kind, entity):
+    st.session_state[kind].append(entity)
+    st.session_state.index[kind][entity.id] = entity
+    if kind == 'teachers':
+        st.session_state.index['teacher_names'][entity.name.lower()] = entity.id
+    st.session_state.version += 1
+
+def entity_frames():
+    """DataFrames of teachers, rooms and classes, rebuilt only after a change."""
+    cached = st.session_state.get('frames')
+    if cached and cached[0] == st.session_state.version:
+        return cached[1]
+    teachers = st.session_state.index['teachers']
+    classes = []
+    for c in st.session_state.classes:
+        d = asdict(c)
+        # Map teacher ID back to name for display
+        if d['teacher_id']:
+            t = teachers.get(d['teacher_id'])
+            d['teacher_name'] = t.name if t else "Unknown"
+        else:
+            d['teacher_name'] = "Any"
+        classes.append(d)
+    frames = (
+        pd.DataFrame([asdict(t) for t in st.session_state.teachers]),
+        pd.DataFrame([asdict(r) for r in st.session_state.rooms]),
+        pd.DataFrame(classes),
+    )
+    st.session_state.frames = (st.session_state.version, frames)
+    return frames
+
+def schedule_frame(schedule):
+    """One display row per scheduled session, resolved through the indexes."""
+    index = st.session_state.index
+    slot_by_id = {s.id: s for s in time_slots()}
+    rows = []
+    for item in schedule:
+        cls = index['classes'].get(item.class_id)
+        tch = index['teachers'].get(item.teacher_id)
+        rm = index['rooms'].get(item.room_id)
+        slot = slot_by_id.get(item.time_slot_id)
+        if cls and tch and rm and slot:
+            rows.append({
+                "Day": slot.day,
+                "Period": slot.period,
+                "Class": cls.name,
+                "Subject": cls.subject,
+                "Teacher": tch.name,
+                "Room": rm.name
+            })
+    return pd.DataFrame(rows, columns=["Day", "Period", "Class", "Subject", "Teacher", "Room"])
+
+def solve_current():
+    """Solve the current entities, memoized on their canonical hash."""
+    slots = time_slots()
+    key = canonical_key(st.session_state.teachers, st.session_state.rooms, st.session_state.classes, slots)
+    result = st.session_state.result
+    if result and result['key'] == key:
+        if result['version'] != st.session_state.version:
+            # Same problem as solved (e.g. an edit was undone); names may
+            # still differ, so only the display frame is rebuilt
+            if result['frame'] is not None:
+                result['frame'] = schedule_frame(result['response'].schedule)
+            result['version'] = st.session_state.version
+        return
+    result_cache = get_result_cache()
+    response = result_cache.get(key)
+    if response is None:
+        with st.spinner("Optimizing Schedule..."):
+            scheduler = SchoolScheduler(
+                st.session_state.teachers,
+                st.session_state.rooms,
+                st.session_state.classes,
+                slots,
+                templates=get_template_cache()
+            )
+            response = scheduler.solve()
+        result_cache.put(key, response)
+    frame = schedule_frame(response.schedule) if response.status in ["OPTIMAL", "FEASIBLE"] else None
+    st.session_state.result = {'key': key, 'version': st.session_state.version, 'response': response,
+                               'frame': frame}
+
+def solve_current_term(spec_dict):
+    """Solve the pattern week(s) once and apply the exception weeks."""
+    spec = TermSpec.from_dict(spec_dict)
+    school = (st.session_state.teachers, st.session_state.rooms, st.session_state.classes, time_slots())
+    result_cache = get_result_cache()
+
+    def solve(teachers, rooms, classes, slots, options, previous):
+        key = canonical_key(teachers, rooms, classes, slots, options, previous)
+        response = result_cache.get(key)
+        if response is None:
+            response = SchoolScheduler(teachers, rooms, classes, slots, options, previous,
+                                       templates=get_template_cache()).solve()
+            result_cache.put(key, response)
+        return response
+
+    with st.spinner("Optimizing Term..."):
+        st.session_state.term = solve_term(school, spec, solve=solve)
+
+def term_frames(term):
+    """Display frames of the term's pattern weeks, rebuilt only after a
+    change or a new term solve."""
+    cached = st.session_state.get('term_frames')
+    if cached and cached[0] is term and cached[1] == st.session_state.version:
+        return cached[2]
+    frames = {label: schedule_frame(pattern) for label, pattern in term.patterns.items()}
+    st.session_state.term_frames = (term, st.session_state.version, frames)
+    return frames
+
+@st.fragment
+def render_schedule(df_schedule, key="schedule"):
+    # Switching views reruns only this fragment
+    view = st.radio("View", ["List", "Timetable Grid"], horizontal=True, label_visibility="collapsed",
+                    key=f"view_{key}")
+    if view == "List":
+        st.subheader("Schedule List")
+        st.dataframe(df_schedule, use_container_width=True)
+    else:
+        st.subheader("Timetable Grid")
+        if not df_schedule.empty:
+            # Several classes can share a slot, so join their names
+            pivot = df_schedule.pivot_table(index='Period', columns='Day', values='Class',
+                                            aggfunc=', '.join, sort=False)
+            st.dataframe(pivot, use_container_width=True)
+
+@st.fragment
+def render_insights(key, df_schedule):
+    st.subheader("✨ Gemini Insights")
+    if st.button("Analyze with Gemini"):
+        from gemini_integration import analyze_schedule_insights
+        with st.spinner("Gemini is analyzing the schedule..."):
+            # Convert dataframe to string for context
+            csv_data = df_schedule.to_csv(index=False)
+            st.session_state.insights[key] = analyze_schedule_insights(csv_data)
+    if key in st.session_state.insights:
+        st.markdown(st.session_state.insights[key])
+
+def add_parsed(result):
+    if "error" in result:
+        st.error(f"Error: {result['error']}")
+        return
+    dtype = result.get("type")
+    data = result.get("data", {})
+
+    if dtype == "teacher":
+        add_entity('teachers', Teacher(
+            id=generate_uid(),
+            name=data.get("name", "Unknown"),
+            qualifications=data.get("qualifications", [])
+        ))
+        st.success(f"Added Teacher: {data.get('name')}")
+    elif dtype == "room":
+        add_entity('rooms', Room(
+            id=generate_uid(),
+            name=data.get("name", "Unknown"),
+            capacity=data.get("capacity", 30)
+        ))
+        st.success(f"Added Room: {data.get('name')}")
+    elif dtype == "class":
+        # Handle preferred teacher mapping if present
+        t_id = None
+        if "preferred_teacher_name" in data:
+            t_id = st.session_state.index['teacher_names'].get(data["preferred_teacher_name"].lower())
+
+        add_entity('classes', SchoolClass(
+            id=generate_uid(),
+            name=data.get("name", "Unknown"),
+            subject=data.get("subject", "General"),
+            required_sessions=data.get("required_sessions", 1),
+            teacher_id=t_id
+        ))
+        st.success(f"Added Class: {data.get('name')}")
+    else:
+        st.warning(f"Unknown type: {dtype}")
+
 # --- Sidebar: Data Entry ---
 st.sidebar.title("Configuration")
 
 # Smart Assistant (Gemini)
-from gemini_integration import parse_scheduler_command
 st.sidebar.header("✨ Smart Assistant")
 with st.sidebar.expander("Natural Language Input", expanded=True):
-    nl_input = st.text_area("e.g. 'Add Ms. Davis for Biology'")
+    nl_input = st.text_area("e.g. 'Add Ms. Davis for Biology' (one entity per line)")
     if st.button("Process with Gemini"):
         if nl_input:
+            # Imported on demand: reruns that never ask Gemini skip loading it
+            from gemini_integration import parse_scheduler_commands
             with st.spinner("Asking Gemini..."):
-                result = parse_scheduler_command(nl_input)
-            
-            if "error" in result:
-                st.error(f"Error: {result['error']}")
-            else:
-                dtype = result.get("type")
-                data = result.get("data", {})
-                
-                if dtype == "teacher":
-                    st.session_state.teachers.append(Teacher(
-                        id=generate_uid(), 
-                        name=data.get("name", "Unknown"), 
-                        qualifications=data.get("qualifications", [])
-                    ))
-                    st.success(f"Added Teacher: {data.get('name')}")
-                elif dtype == "room":
-                    st.session_state.rooms.append(Room(
-                        id=generate_uid(), 
-                        name=data.get("name", "Unknown"), 
-                        capacity=data.get("capacity", 30)
-                    ))
-                    st.success(f"Added Room: {data.get('name')}")
-                elif dtype == "class":
-                    # Handle preferred teacher mapping if present
-                    t_id = None
-                    if "preferred_teacher_name" in data:
-                        t_name = data["preferred_teacher_name"]
-                        # Try to find existing teacher
-                        for t in st.session_state.teachers:
-                            if t.name.lower() == t_name.lower():
-                                t_id = t.id
-                                break
-                    
-                    st.session_state.classes.append(SchoolClass(
-                        id=generate_uid(),
-                        name=data.get("name", "Unknown"),
-                        subject=data.get("subject", "General"),
-                        required_sessions=data.get("required_sessions", 1),
-                        teacher_id=t_id
-                    ))
-                    st.success(f"Added Class: {data.get('name')}")
-                else:
-                    st.warning(f"Unknown type: {dtype}")
+                results = parse_scheduler_commands(nl_input)
+            for result in results:
+                add_parsed(result)
 
 # Teachers Management
 st.sidebar.header("1. Teachers")
@@ -82,7 +266,7 @@ with st.sidebar.expander("Add Teacher", expanded=False):
     if st.button("Add Teacher"):
         if t_name and t_subjects:
             subjects = [s.strip() for s in t_subjects.split(',')]
-            st.session_state.teachers.append(Teacher(id=generate_uid(), name=t_name, qualifications=subjects))
+            add_entity('teachers', Teacher(id=generate_uid(), name=t_name, qualifications=subjects))
             st.success(f"Added {t_name}")
 
 # Rooms Management
@@ -92,7 +276,7 @@ with st.sidebar.expander("Add Room", expanded=False):
     r_cap = st.number_input("Capacity", min_value=1, value=30, key="r_cap")
     if st.button("Add Room"):
         if r_name:
-            st.session_state.rooms.append(Room(id=generate_uid(), name=r_name, capacity=r_cap))
+            add_entity('rooms', Room(id=generate_uid(), name=r_name, capacity=r_cap))
             st.success(f"Added {r_name}")
 
 # Classes Management
@@ -101,7 +285,7 @@ with st.sidebar.expander("Add Class", expanded=False):
     c_name = st.text_input("Class Name", key="c_name")
     c_subject = st.text_input("Subject", key="c_sub")
     c_sessions = st.number_input("Sessions/Week", min_value=1, value=3, key="c_sess")
-    
+
     # Optional: Pre-assign teacher
     teacher_options = {t.name: t.id for t in st.session_state.teachers}
     selected_teacher_name = st.selectbox("Preferred Teacher (Optional)", ["Any"] + list(teacher_options.keys()))
@@ -109,23 +293,35 @@ with st.sidebar.expander("Add Class", expanded=False):
 
     if st.button("Add Class"):
         if c_name and c_subject:
-            st.session_state.classes.append(SchoolClass(
-                id=generate_uid(), 
-                name=c_name, 
-                subject=c_subject, 
+            add_entity('classes', SchoolClass(
+                id=generate_uid(),
+                name=c_name,
+                subject=c_subject,
                 required_sessions=c_sessions,
                 teacher_id=selected_teacher_id
             ))
             st.success(f"Added {c_name}")
 
+# Week grid and term
+st.sidebar.header("4. Week & Term")
+with st.sidebar.expander("Week Grid and Term", expanded=False):
+    g_days = st.multiselect("School days", ALL_DAYS, default=list(st.session_state.grid[0]))
+    g_periods = st.number_input("Periods per day", min_value=1, max_value=12, value=st.session_state.grid[1])
+    if g_days and (tuple(g_days), g_periods) != st.session_state.grid:
+        st.session_state.grid = (tuple(g_days), g_periods)
+        st.session_state.version += 1
+    term_weeks = st.number_input("Weeks in term", min_value=1, max_value=52, value=1)
+    term_ab = st.checkbox("A/B rotation")
+    term_closed = st.text_input("Closed days (week:day, e.g. '3:Mon, 7:Fri')")
+
 # --- Main Page ---
 st.title("School Timetable Scheduler")
 
+df_t, df_r, df_c = entity_frames()
 col1, col2, col3 = st.columns(3)
 with col1:
     st.subheader("Teachers")
     if st.session_state.teachers:
-        df_t = pd.DataFrame([vars(t) for t in st.session_state.teachers])
         st.dataframe(df_t, use_container_width=True)
     else:
         st.info("No teachers added.")
@@ -133,7 +329,6 @@ with col1:
 with col2:
     st.subheader("Rooms")
     if st.session_state.rooms:
-        df_r = pd.DataFrame([vars(r) for r in st.session_state.rooms])
         st.dataframe(df_r, use_container_width=True)
     else:
         st.info("No rooms added.")
@@ -141,18 +336,7 @@ with col2:
 with col3:
     st.subheader("Classes")
     if st.session_state.classes:
-        # Convert to dict but handle optional fields for display
-        data = []
-        for c in st.session_state.classes:
-            d = vars(c).copy()
-            # Map teacher ID back to name for display
-            if d['teacher_id']:
-                t = next((t for t in st.session_state.teachers if t.id == d['teacher_id']), None)
-                d['teacher_name'] = t.name if t else "Unknown"
-            else:
-                d['teacher_name'] = "Any"
-            data.append(d)
-        st.dataframe(pd.DataFrame(data), use_container_width=True)
+        st.dataframe(df_c, use_container_width=True)
     else:
         st.info("No classes added.")
 
@@ -162,67 +346,42 @@ st.markdown("---")
 if st.button("Generate Schedule", type="primary"):
     if not st.session_state.teachers or not st.session_state.rooms or not st.session_state.classes:
         st.error("Please add at least one teacher, room, and class.")
+    elif term_weeks > 1:
+        try:
+            solve_current_term({"weeks": term_weeks, "rotation": ["A", "B"] if term_ab else ["A"],
+                                "exceptions": parse_closed_days(term_closed)})
+        except ValueError as e:
+            st.error(f"Term settings: {e}")
     else:
-        # Define Time Slots (Fixed for Demo: Mon-Fri, 5 periods)
-        days = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri']
-        time_slots = []
-        for d in days:
-            for p in range(1, 6):
-                time_slots.append(TimeSlot(id=f"{d}_{p}", day=d, period=p))
-        
-        with st.spinner("Optimizing Schedule..."):
-            scheduler = SchoolScheduler(
-                st.session_state.teachers, 
-                st.session_state.rooms, 
-                st.session_state.classes, 
-                time_slots
-            )
-            response = scheduler.solve()
-        
-        if response.status in ["OPTIMAL", "FEASIBLE"]:
-            st.success(f"Schedule Found! Status: {response.status}")
-            
-            # Process results for display
-            schedule_data = []
-            for item in response.schedule:
-                # Lookup objects
-                cls = next((c for c in st.session_state.classes if c.id == item.class_id), None)
-                tch = next((t for t in st.session_state.teachers if t.id == item.teacher_id), None)
-                rm = next((r for r in st.session_state.rooms if r.id == item.room_id), None)
-                slot = next((s for s in time_slots if s.id == item.time_slot_id), None)
-                
-                if cls and tch and rm and slot:
-                    schedule_data.append({
-                        "Day": slot.day,
-                        "Period": slot.period,
-                        "Class": cls.name,
-                        "Subject": cls.subject,
-                        "Teacher": tch.name,
-                        "Room": rm.name
-                    })
-            
-            df_schedule = pd.DataFrame(schedule_data)
-            
-            # Pivot for grid view (optional) - let's verify list view first
-            st.subheader("Schedule List")
-            st.dataframe(df_schedule, use_container_width=True)
-            
-            # Grid View
-            st.subheader("Timetable Grid")
-            if not df_schedule.empty:
-                pivot = df_schedule.pivot(index='Period', columns='Day', values='Class')
-                st.dataframe(pivot, use_container_width=True)
-
-            # Gemini Insights
-            from gemini_integration import analyze_schedule_insights
-            st.markdown("---")
-            st.subheader("✨ Gemini Insights")
-            if st.button("Analyze with Gemini"):
-                with st.spinner("Gemini is analyzing the schedule..."):
-                    # Convert dataframe to string for context
-                    csv_data = df_schedule.to_csv(index=False)
-                    insights = analyze_schedule_insights(csv_data)
-                    st.markdown(insights)
-                
-        else:
-            st.error("Could not find a feasible schedule. Please check constraints (e.g., teacher availability, qualifications).")
+        solve_current()
+
+term = st.session_state.get('term')
+if term is not None and term_weeks > 1:
+    if term.status in ["OPTIMAL", "FEASIBLE"]:
+        st.success(f"Term of {len(term.weeks)} weeks scheduled. Status: {term.status}")
+        for label, frame in term_frames(term).items():
+            st.subheader(f"Week {label}")
+            render_schedule(frame, key=f"week_{label}")
+        exceptions = [{"Week": w.week, "Pattern": w.pattern, "Moved": len(w.changes["added"]),
+                       "Missed": sum(w.missed.values())} for w in term.weeks if w.schedule is not None]
+        if exceptions:
+            st.subheader("Exception Weeks")
+            st.dataframe(pd.DataFrame(exceptions), use_container_width=True)
+    else:
+        st.error("Could not find a feasible pattern week.")
+
+# The last result stays on screen across reruns (e.g. the Gemini button)
+result = st.session_state.result
+if result is not None and term_weeks == 1:
+    response = result['response']
+    if result['version'] != st.session_state.version:
+        st.info("Inputs changed since this schedule was generated.")
+    if response.status in ["OPTIMAL", "FEASIBLE"]:
+        st.success(f"Schedule Found! Status: {response.status}")
+        render_schedule(result['frame'])
+        st.markdown("---")
+        render_insights(result['key'], result['frame'])
+    else:
+        st.error("Could not find a feasible schedule. Please check constraints (e.g., teacher availability, qualifications).")
+        for conflict in response.conflicts or []:
+            st.warning(conflict.message)
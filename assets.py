@@ -0,0 +1,91 @@
+"""
+In-memory cache of static assets.
+
+Files are read once, fingerprinted with an ETag and precompressed with
+gzip (and brotli when the `brotli` package is installed). Each lookup
+stats the file and reloads it when its mtime or size changed, so edits
+show up without a restart.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Only text-like content is worth compressing
+COMPRESSIBLE = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+
+@dataclass
+class Asset:
+    path: str
+    content_type: str
+    etag: str
+    mtime_ns: int
+    size: int
+    # Content-Encoding -> body; '' is the identity encoding
+    bodies: Dict[str, bytes] = field(default_factory=dict)
+
+    def negotiate(self, accept_encoding: str) -> Tuple[str, bytes]:
+        """The smallest variant the client accepts, as (encoding, body)."""
+        accepted = {part.split(';')[0].strip() for part in (accept_encoding or '').split(',')}
+        for encoding in ('br', 'gzip'):
+            if encoding in accepted and encoding in self.bodies:
+                return encoding, self.bodies[encoding]
+        return '', self.bodies['']
+
+def load_asset(path: str) -> Asset:
+    st = os.stat(path)
+    with open(path, 'rb') as f:
+        content = f.read()
+    ctype, _ = mimetypes.guess_type(path)
+    ctype = ctype or 'application/octet-stream'
+    if ctype.startswith('text/') or ctype == 'application/javascript':
+        ctype += '; charset=utf-8'
+
+    bodies = {'': content}
+    if ctype.startswith(COMPRESSIBLE):
+        variants = {'gzip': gzip.compress(content, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            variants['br'] = brotli.compress(content)
+        # Keep a variant only if it actually saves bytes
+        bodies.update((enc, body) for enc, body in variants.items() if len(body) < len(content))
+    etag = '"' + hashlib.sha1(content).hexdigest()[:20] + '"'
+    return Asset(path=path, content_type=ctype, etag=etag, mtime_ns=st.st_mtime_ns, size=st.st_size,
+                 bodies=bodies)
+
+class AssetCache:
+    def __init__(self, root: str):
+        self.root = root
+        self._assets = {}  # path relative to root -> Asset
+        self._lock = threading.Lock()
+
+    def preload(self, directory: str):
+        """Load every file under `directory` (relative to the root)."""
+        for dirpath, _, filenames in os.walk(os.path.join(self.root, directory)):
+            for name in filenames:
+                self.get(os.path.relpath(os.path.join(dirpath, name), self.root))
+
+    def get(self, relpath: str) -> Optional[Asset]:
+        """The asset at `relpath`, reloaded if the file changed; None if missing."""
+        path = os.path.join(self.root, relpath)
+        try:
+            st = os.stat(path)
+        except OSError:
+            with self._lock:
+                self._assets.pop(relpath, None)
+            return None
+        asset = self._assets.get(relpath)
+        if asset is None or asset.mtime_ns != st.st_mtime_ns or asset.size != st.st_size:
+            if not os.path.isfile(path):
+                return None
+            asset = load_asset(path)
+            with self._lock:
+                self._assets[relpath] = asset
+        return asset
@@ -0,0 +1,191 @@
+"""
+Scaling benchmark for SchoolScheduler.
+
+Runs a sweep of generated schools (see generator.py) and records, per
+size and formulation:
+- variable and constraint counts
+- model build time, solve time and solution extraction time
+- peak RSS
+- solver status
+
+Each case runs in a fresh process so peak RSS belongs to that case alone.
+Results can be written as JSON and compared against a stored baseline;
+regressions are listed and make the run exit non-zero.
+
+    python benchmark.py
+    python benchmark.py --sizes tiny,small,medium --output bench.json
+    python benchmark.py --baseline bench_baseline.json --tolerance 0.25
+    python benchmark.py --build-only --formulation factorized
+"""
+import argparse
+import json
+import multiprocessing
+import platform
+import resource
+import sys
+import time
+from queue import Empty
+from models import SolverOptions
+from solver import SchoolScheduler
+from generator import generate_school
+
+# Size sweep: generator arguments per named point
+SIZES = {
+    "tiny": dict(n_teachers=4, n_subjects=4, n_rooms=3, n_classes=8, periods=5),
+    "small": dict(n_teachers=10, n_subjects=8, n_rooms=8, n_classes=25, periods=6),
+    "medium": dict(n_teachers=20, n_subjects=10, n_rooms=15, n_classes=60, periods=6),
+    "large": dict(n_teachers=40, n_subjects=12, n_rooms=30, n_classes=120, periods=7),
+    "district": dict(n_teachers=80, n_subjects=16, n_rooms=60, n_classes=250, periods=8),
+}
+
+# Differences smaller than this are timer noise, never regressions
+MIN_TIME_DELTA = 0.05
+# Seconds between checks that a benchmark child is still alive
+CHILD_POLL_S = 1.0
+
+def run_case(size: str, options: SolverOptions, seed: int, build_only: bool) -> dict:
+    school = generate_school(seed=seed, **SIZES[size])
+    scheduler = SchoolScheduler(*school, options)
+
+    start = time.perf_counter()
+    scheduler.build()
+    build_s = time.perf_counter() - start
+
+    status, solve_s, extract_s = None, None, None
+    if not build_only:
+        start = time.perf_counter()
+        status = scheduler.solve().status
+        solve_s = time.perf_counter() - start
+        extract_s = scheduler.timings.get("extract")
+
+    proto = scheduler.model.Proto()
+    return {
+        "size": size,
+        "formulation": options.formulation,
+        "sessions": sum(c.required_sessions for c in school[2]),
+        "variables": len(proto.variables),
+        "constraints": len(proto.constraints),
+        "build_s": round(build_s, 4),
+        "solve_s": round(solve_s, 4) if solve_s is not None else None,
+        "extract_s": round(extract_s, 4) if extract_s is not None else None,
+        # ru_maxrss is in KiB on Linux
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "status": status,
+    }
+
+def _child(queue, size, options, seed, build_only):
+    try:
+        queue.put(run_case(size, options, seed, build_only))
+    except Exception as e:
+        queue.put({"size": size, "formulation": options.formulation, "error": str(e)})
+
+def run_isolated(size: str, options: SolverOptions, seed: int, build_only: bool) -> dict:
+    """run_case in a fresh process; a child that dies without a result
+    (e.g. OOM-killed) is recorded as a crash."""
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_child, args=(queue, size, options, seed, build_only))
+    proc.start()
+    result = None
+    while result is None:
+        try:
+            result = queue.get(timeout=CHILD_POLL_S)
+        except Empty:
+            if proc.exitcode is None:
+                continue
+            # Gone: take a result that was still in flight, else a crash
+            try:
+                result = queue.get(timeout=CHILD_POLL_S)
+            except Empty:
+                result = {"size": size, "formulation": options.formulation,
+                          "error": f"crashed (exit code {proc.exitcode})"}
+    proc.join()
+    return result
+
+def compare(results, baseline, tolerance: float):
+    """Regressions of `results` against `baseline` as human-readable strings."""
+    base = {(r["size"], r["formulation"]): r for r in baseline["results"]}
+    regressions = []
+    for r in results:
+        b = base.get((r["size"], r["formulation"]))
+        if b is None or "error" in b:
+            continue
+        name = f"{r['size']}/{r['formulation']}"
+        if "error" in r:
+            regressions.append(f"{name}: failed ({r['error']})")
+            continue
+        if b.get("status") and r.get("status") != b["status"]:
+            regressions.append(f"{name}: status {b['status']} -> {r['status']}")
+        if r["variables"] > b["variables"]:
+            regressions.append(f"{name}: variables {b['variables']} -> {r['variables']}")
+        for metric in ("build_s", "solve_s"):
+            old, new = b.get(metric), r.get(metric)
+            if old is None or new is None:
+                continue
+            if new > old * (1 + tolerance) and new - old > MIN_TIME_DELTA:
+                regressions.append(f"{name}: {metric} {old:.3f} -> {new:.3f}")
+        if r["peak_rss_mb"] > b["peak_rss_mb"] * (1 + tolerance):
+            regressions.append(f"{name}: peak_rss_mb {b['peak_rss_mb']} -> {r['peak_rss_mb']}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="tiny,small,medium,large",
+                        help=f"comma separated points from: {', '.join(SIZES)}")
+    parser.add_argument("--formulation", choices=SolverOptions.FORMULATIONS + ("all",), default="all")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--time-limit", type=float, default=60.0, help="per-case solve budget in seconds")
+    parser.add_argument("--build-only", action="store_true", help="skip solving")
+    parser.add_argument("--name-vars", action="store_true", help="build with named variables")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--baseline", help="compare against results JSON from an earlier run")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative slowdown")
+    args = parser.parse_args()
+
+    sizes = args.sizes.split(",")
+    for size in sizes:
+        if size not in SIZES:
+            parser.error(f"unknown size: {size}")
+    formulations = SolverOptions.FORMULATIONS if args.formulation == "all" else (args.formulation,)
+
+    results = []
+    print(f"{'size':>9} {'formulation':>11} {'vars':>9} {'constraints':>11} {'build s':>8} "
+          f"{'solve s':>8} {'rss MB':>7}  status")
+    for size in sizes:
+        for formulation in formulations:
+            options = SolverOptions(formulation=formulation, name_vars=args.name_vars,
+                                    time_limit=args.time_limit)
+            r = run_isolated(size, options, args.seed, args.build_only)
+            results.append(r)
+            if "error" in r:
+                print(f"{size:>9} {formulation:>11}  error: {r['error']}")
+                continue
+            solve = f"{r['solve_s']:>8.3f}" if r["solve_s"] is not None else f"{'-':>8}"
+            print(f"{size:>9} {formulation:>11} {r['variables']:>9} {r['constraints']:>11} "
+                  f"{r['build_s']:>8.3f} {solve} {r['peak_rss_mb']:>7.1f}  {r['status'] or '-'}")
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "seed": args.seed,
+            "time_limit": args.time_limit,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("\nRegressions against baseline:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("\nNo regressions against baseline.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+from collections import OrderedDict
+from dataclasses import asdict
+from typing import List, Optional
+from models import Teacher, Room, SchoolClass, TimeSlot, ScheduleResponse, ScheduledClass, SolverOptions
+
+def school_digest(teachers: List[Teacher], rooms: List[Room], classes: List[SchoolClass],
+                  time_slots: List[TimeSlot]) -> str:
+    """SHA-256 of a canonical form of the school.
+
+    Entities are sorted by id and qualifications and unavailable slots are
+    treated as sets, so list ordering and JSON whitespace in the original
+    payload do not change the digest. Display names are left out (as in
+    templates.skeleton_key): they never reach the model, so renaming an
+    entity keeps its results.
+    """
+    def without_name(entity, **fields):
+        d = {**asdict(entity), **fields}
+        d.pop("name", None)
+        return d
+
+    canonical = {
+        "teachers": sorted(
+            (without_name(t, qualifications=sorted(set(t.qualifications)), unavailable=sorted(set(t.unavailable)))
+             for t in teachers),
+            key=lambda d: d["id"]
+        ),
+        "rooms": sorted((without_name(r, unavailable=sorted(set(r.unavailable))) for r in rooms), key=lambda d: d["id"]),
+        "classes": sorted((without_name(c) for c in classes), key=lambda d: d["id"]),
+        "time_slots": sorted((asdict(s) for s in time_slots), key=lambda d: d["id"]),
+    }
+    blob = json.dumps(canonical, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(blob.encode()).hexdigest()
+
+def canonical_key(teachers: List[Teacher], rooms: List[Room], classes: List[SchoolClass],
+                  time_slots: List[TimeSlot], options: Optional[SolverOptions] = None,
+                  previous: Optional[List[ScheduledClass]] = None, school: Optional[str] = None) -> str:
+    """SHA-256 of a canonical form of the parsed problem.
+
+    The school enters through school_digest; `school` is that digest when
+    the caller already has it (stored datasets), which skips hashing the
+    entities again. Variable naming and instrumentation are excluded as
+    they do not affect the result.
+    `previous` is the prior schedule for incremental solves whose answer
+    depends on it.
+    """
+    options = asdict(options or SolverOptions())
+    options.pop('name_vars', None)
+    options.pop('stats', None)
+    canonical = {
+        "school": school or school_digest(teachers, rooms, classes, time_slots),
+        "options": options,
+    }
+    if previous:
+        canonical["previous"] = sorted(
+            (a.class_id, a.teacher_id, a.room_id, a.time_slot_id) for a in previous
+        )
+    blob = json.dumps(canonical, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(blob.encode()).hexdigest()
+
+_KEY_RE = re.compile(r'[0-9a-f]{64}')
+
+class ResultCache:
+    """Two-tier cache of solved ScheduleResponses keyed by canonical_key.
+
+    The memory tier is an LRU bounded by the total size of the serialized
+    responses. The optional disk tier stores one JSON file per key under
+    `disk_dir` and survives restarts; disk hits are promoted to memory.
+    """
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, disk_dir: Optional[str] = None):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self._entries = OrderedDict()  # key -> serialized response bytes
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.evictions = 0
+
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def get(self, key: str) -> Optional[ScheduleResponse]:
+        with self._lock:
+            blob = self._entries.get(key)
+            if blob is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+        if blob is None:
+            blob = self._read_disk(key)
+            with self._lock:
+                if blob is None:
+                    self.misses += 1
+                    return None
+                self.hits += 1
+                self.disk_hits += 1
+                self._insert(key, blob)
+        return ScheduleResponse.from_dict(json.loads(blob))
+
+    def put(self, key: str, response: ScheduleResponse):
+        # A search that ran out of budget before finding anything proves
+        # nothing; asking again (maybe with more time) should re-solve.
+        if response.status == "UNKNOWN":
+            return
+        blob = json.dumps(response.to_dict(), separators=(',', ':')).encode()
+        with self._lock:
+            self._insert(key, blob)
+        self._write_disk(key, blob)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "disk_hits": self.disk_hits,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "disk": bool(self.disk_dir),
+            }
+
+    def _insert(self, key: str, blob: bytes):
+        # Caller holds the lock
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= len(old)
+        if len(blob) > self.max_bytes:
+            return
+        self._entries[key] = blob
+        self._bytes += len(blob)
+        while self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= len(evicted)
+            self.evictions += 1
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key[:2], f"{key}.json")
+
+    def _read_disk(self, key: str) -> Optional[bytes]:
+        # Keys can arrive from clients (previous_id); never let them form a path
+        if not self.disk_dir or not _KEY_RE.fullmatch(key):
+            return None
+        try:
+            with open(self._disk_path(key), 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _write_disk(self, key: str, blob: bytes):
+        if not self.disk_dir or not _KEY_RE.fullmatch(key):
+            return
+        path = self._disk_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write then rename so readers never see a partial file
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+            with os.fdopen(fd, 'wb') as f:
+                f.write(blob)
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"Warning: could not write cache entry {key}: {e}")
@@ -0,0 +1,576 @@
+"""
+Solver workers on other machines behind the main.py front end.
+
+A worker (`python cluster.py worker`) runs its own SolveExecutor and takes
+jobs over TCP. On the front end, ClusterExecutor replaces the local
+SolveExecutor; it has the same submit() interface. It is used when either
+of these is set:
+- SCHEDULER_WORKERS lists worker addresses
+- SCHEDULER_CLUSTER=1 waits for workers to register themselves. They POST
+  to /api/cluster/workers, which `worker --register URL` does at start and
+  every HEARTBEAT seconds.
+
+Front end and workers share a secret, SCHEDULER_CLUSTER_TOKEN; neither
+starts without it. Registering with or listing the workers of a front end
+takes it as a Bearer token, so outside clients cannot point the front end
+at arbitrary hosts. Every frame is signed with it, so a worker only runs
+jobs from its front ends and a front end only trusts answers from its
+workers. Frames are signed, not encrypted: keep the cluster on a private
+network. Workers listen on 127.0.0.1 unless given --host.
+
+Protocol: on accepting a connection the worker sends a random NONCE_SIZE
+byte nonce. Each message after that is one frame: a 4-byte big-endian
+length and its HMAC-SHA256, then the body (a JSON object with a "type")
+and its HMAC-SHA256. Both MACs are keyed by the token and the nonce and
+cover the sender's side and a per-direction sequence number, so a frame
+cannot be replayed on another connection or out of turn, and the length
+is checked before any body is read. One connection carries one request:
+
+    ping                                  -> pong {max_workers, capacity, admitted}
+    solve {school, options, previous, stream}
+                                          -> solution* then result {response, timings}
+                                             or overloaded {retry_after}
+                                             or error {kind, error}
+
+An error's kind is "invalid" for a job the worker cannot accept (the
+front end answers 400, as for a local solve) and "failed" otherwise.
+
+While a solve runs, the front end may send `cancel`. Closing the
+connection cancels too.
+
+Jobs go to the least-loaded healthy worker: fewest jobs running per
+solver process. A background thread pings every worker every
+`health_interval` seconds. If a worker stops answering, it gets no new
+jobs, and its running jobs are retried on another worker, up to
+`max_attempts` tries in all. A streaming consumer then sees the new
+search's solutions start over.
+
+    SCHEDULER_CLUSTER_TOKEN=... python cluster.py worker --host 0.0.0.0 --register http://frontend:8000
+    SCHEDULER_CLUSTER_TOKEN=... SCHEDULER_WORKERS=host1:9101,host2:9101 python main.py
+    python cluster.py local --workers 3    # front end and 3 workers here
+"""
+import argparse
+import hashlib
+import hmac
+import json
+import math
+import os
+import queue
+import secrets
+import signal
+import socket
+import socketserver
+import struct
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from dataclasses import asdict, dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+from datasets import school_from_dict, school_to_dict
+from executor import SolveExecutor, Overloaded
+from models import ScheduledClass, ScheduleResponse, SolverOptions
+from solver import SchoolScheduler
+
+FRAME_HEADER = struct.Struct('>I')
+MAC_SIZE = hashlib.sha256().digest_size
+NONCE_SIZE = 16
+# Largest frame either side accepts, well above any school's solve job
+MAX_FRAME = 64 * 1024 * 1024
+
+HEALTH_INTERVAL = 2.0
+CONNECT_TIMEOUT = 2.0
+MAX_ATTEMPTS = 3
+# Seconds between a worker's registrations with its front end
+HEARTBEAT = 10.0
+# Self-registered workers failing health checks this long are forgotten
+WORKER_EXPIRY = 60.0
+
+class ConnectionClosed(ConnectionError):
+    """The other side closed the connection or stopped answering."""
+
+def cluster_token(token: Optional[str]) -> bytes:
+    """The shared secret as bytes; raises ValueError when it is not set."""
+    if not token:
+        raise ValueError("SCHEDULER_CLUSTER_TOKEN must be set to run a solver cluster")
+    return token.encode()
+
+def _recv_exactly(sock: socket.socket, n: int) -> bytes:
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            raise ConnectionClosed("Connection closed")
+        buf += chunk
+    return bytes(buf)
+
+class Channel:
+    """One connection's signed frames (see the protocol above)."""
+    def __init__(self, sock: socket.socket, token: bytes, nonce: bytes, side: bytes):
+        self.sock = sock
+        self._key = hmac.new(token, nonce, hashlib.sha256).digest()
+        self._side, self._peer = side, b"W" if side == b"F" else b"F"
+        self._sent = self._received = 0
+        self._send_lock = threading.Lock()
+
+    @classmethod
+    def accept(cls, sock: socket.socket, token: bytes) -> "Channel":
+        """Worker side: send a fresh nonce."""
+        nonce = secrets.token_bytes(NONCE_SIZE)
+        sock.sendall(nonce)
+        return cls(sock, token, nonce, b"W")
+
+    @classmethod
+    def connect(cls, sock: socket.socket, token: bytes) -> "Channel":
+        """Front end side: read the worker's nonce."""
+        return cls(sock, token, _recv_exactly(sock, NONCE_SIZE), b"F")
+
+    def _mac(self, side: bytes, seq: int, part: bytes, data: bytes) -> bytes:
+        return hmac.new(self._key, side + seq.to_bytes(8, 'big') + part + data, hashlib.sha256).digest()
+
+    def send(self, message: dict):
+        body = json.dumps(message).encode()
+        with self._send_lock:
+            seq, self._sent = self._sent, self._sent + 1
+            length = FRAME_HEADER.pack(len(body))
+            self.sock.sendall(length + self._mac(self._side, seq, b"L", length) + body
+                              + self._mac(self._side, seq, b"B", body))
+
+    def recv(self) -> dict:
+        seq = self._received
+        header = _recv_exactly(self.sock, FRAME_HEADER.size + MAC_SIZE)
+        length, mac = header[:FRAME_HEADER.size], header[FRAME_HEADER.size:]
+        if not hmac.compare_digest(mac, self._mac(self._peer, seq, b"L", length)):
+            raise ValueError("Frame is not signed with the cluster token")
+        (size,) = FRAME_HEADER.unpack(length)
+        if size > MAX_FRAME:
+            raise ValueError(f"Frame of {size} bytes is over the {MAX_FRAME} byte limit")
+        data = _recv_exactly(self.sock, size + MAC_SIZE)
+        body, mac = data[:size], data[size:]
+        if not hmac.compare_digest(mac, self._mac(self._peer, seq, b"B", body)):
+            raise ValueError("Frame is not signed with the cluster token")
+        self._received += 1
+        return json.loads(body)
+
+def split_address(address: str) -> Tuple[str, int]:
+    host, sep, port = address.rpartition(':')
+    if not sep or not host or not port.isdigit():
+        raise ValueError(f"Worker address must be host:port, got {address!r}")
+    return host, int(port)
+
+def encode_job(scheduler: SchoolScheduler, stream: bool) -> dict:
+    school = (scheduler.teachers, scheduler.rooms, scheduler.classes, scheduler.time_slots)
+    previous = [asdict(a) for a in scheduler.previous] if scheduler.previous is not None else None
+    return {"type": "solve", "school": school_to_dict(school), "options": asdict(scheduler.options),
+            "previous": previous, "stream": stream}
+
+def decode_job(message: dict) -> SchoolScheduler:
+    previous = message.get("previous")
+    return SchoolScheduler(*school_from_dict(message["school"]), SolverOptions.from_dict(message["options"]),
+                           [ScheduledClass.from_dict(a) for a in previous] if previous is not None else None)
+
+# -- Worker side
+
+class WorkerServer(socketserver.ThreadingTCPServer):
+    """Runs solve jobs from front ends on a local SolveExecutor."""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address: Tuple[str, int], executor: SolveExecutor, token: str):
+        self.token = cluster_token(token)
+        super().__init__(address, _WorkerHandler)
+        self.executor = executor
+
+    def load(self) -> dict:
+        executor = self.executor
+        return {"max_workers": executor.max_workers, "capacity": executor.max_workers + executor.max_queue,
+                "admitted": executor.admitted}
+
+class _WorkerHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        try:
+            # Front ends send their request straight away
+            self.request.settimeout(CONNECT_TIMEOUT)
+            channel = Channel.accept(self.request, self.server.token)
+            message = channel.recv()
+            self.request.settimeout(None)
+        except (OSError, ValueError):
+            # Includes frames not signed with the cluster token: no answer
+            return
+        kind = message.get("type")
+        if kind == "ping":
+            channel.send({"type": "pong", **self.server.load()})
+        elif kind == "solve":
+            self.solve(channel, message)
+        else:
+            channel.send({"type": "error", "kind": "invalid", "error": f"Unknown message type: {kind}"})
+
+    def solve(self, channel: Channel, message: dict):
+        try:
+            scheduler = decode_job(message)
+        except (KeyError, TypeError, ValueError) as e:
+            channel.send({"type": "error", "kind": "invalid", "error": f"Bad job: {e}"})
+            return
+
+        cancelled = threading.Event()
+
+        def watch():
+            # A cancel frame or a closed connection stops the search
+            try:
+                while channel.recv().get("type") != "cancel":
+                    pass
+            except (OSError, ValueError):
+                pass
+            cancelled.set()
+
+        threading.Thread(target=watch, daemon=True).start()
+
+        def relay(response: ScheduleResponse):
+            try:
+                channel.send({"type": "solution", "response": response.to_dict()})
+                return True
+            except OSError:
+                return False
+
+        try:
+            result, timings = self.server.executor.submit(scheduler, relay if message.get("stream") else None,
+                                                          cancelled.is_set)
+            reply = {"type": "result", "response": result.to_dict(), "timings": timings}
+        except Overloaded as e:
+            reply = {"type": "overloaded", "retry_after": e.retry_after}
+        except ValueError as e:
+            reply = {"type": "error", "kind": "invalid", "error": str(e)}
+        except Exception as e:
+            reply = {"type": "error", "kind": "failed", "error": str(e)}
+        try:
+            channel.send(reply)
+        except OSError:
+            pass
+
+def register_with(frontend: str, address: str, token: str, stop: threading.Event):
+    """Register `address` with a front end now and every HEARTBEAT seconds."""
+    url = frontend.rstrip('/') + '/api/cluster/workers'
+    body = json.dumps({"address": address}).encode()
+    headers = {'Content-Type': 'application/json', 'Authorization': f'Bearer {token}'}
+    while True:
+        try:
+            request = urllib.request.Request(url, data=body, headers=headers)
+            urllib.request.urlopen(request, timeout=CONNECT_TIMEOUT).read()
+        except OSError as e:
+            print(f"Could not register with {frontend}: {e}", file=sys.stderr)
+        if stop.wait(HEARTBEAT):
+            return
+
+# -- Front end side
+
+@dataclass(slots=True)
+class WorkerInfo:
+    address: str
+    # Listed in SCHEDULER_WORKERS (never forgotten) rather than registered
+    static: bool = True
+    healthy: bool = False
+    # From the last pong: solver processes, jobs taken before refusing,
+    # and jobs the worker has from all front ends
+    max_workers: int = 1
+    capacity: int = 1
+    admitted: int = 0
+    # Jobs this front end has running there
+    in_flight: int = 0
+    last_seen: Optional[float] = None
+
+    @property
+    def load(self) -> float:
+        return max(self.in_flight, self.admitted) / self.max_workers
+
+    def to_dict(self):
+        d = asdict(self)
+        d["load"] = self.load
+        return d
+
+class ClusterExecutor:
+    """SolveExecutor stand-in that solves on remote workers."""
+    def __init__(self, workers: List[str] = (), token: Optional[str] = None,
+                 health_interval: float = HEALTH_INTERVAL, max_attempts: int = MAX_ATTEMPTS):
+        self.token = cluster_token(token)
+        self.health_interval = health_interval
+        self.max_attempts = max_attempts
+        self._workers = {}  # address -> WorkerInfo
+        self._lock = threading.Lock()
+        # Notified when a worker frees a slot or comes up
+        self._changed = threading.Condition(self._lock)
+        self._stopped = threading.Event()
+        # Moving average of solve durations, for Retry-After
+        self._avg_seconds = 1.0
+        for address in workers:
+            self.register(address, static=True)
+        self._checker = threading.Thread(target=self._check_loop, daemon=True)
+        self._checker.start()
+
+    def register(self, address: str, static: bool = False) -> WorkerInfo:
+        split_address(address)
+        with self._lock:
+            worker = self._workers.get(address)
+            if worker is None:
+                worker = self._workers[address] = WorkerInfo(address, static)
+        # Checked now so it can take jobs straight away
+        self._check(worker)
+        return worker
+
+    def workers(self) -> List[dict]:
+        with self._lock:
+            return [w.to_dict() for w in self._workers.values()]
+
+    def _check(self, worker: WorkerInfo):
+        try:
+            with socket.create_connection(split_address(worker.address), timeout=CONNECT_TIMEOUT) as sock:
+                channel = Channel.connect(sock, self.token)
+                channel.send({"type": "ping"})
+                pong = channel.recv()
+            load = (max(1, int(pong["max_workers"])), max(1, int(pong["capacity"])), int(pong["admitted"]))
+        except (OSError, ValueError, KeyError, TypeError):
+            load = None
+        with self._changed:
+            worker.healthy = load is not None
+            if load is not None:
+                worker.max_workers, worker.capacity, worker.admitted = load
+                worker.last_seen = time.monotonic()
+                self._changed.notify_all()
+            elif not worker.static and time.monotonic() - (worker.last_seen or 0) > WORKER_EXPIRY:
+                self._workers.pop(worker.address, None)
+
+    def _check_loop(self):
+        while not self._stopped.wait(self.health_interval):
+            with self._lock:
+                workers = list(self._workers.values())
+            for worker in workers:
+                self._check(worker)
+
+    @property
+    def max_workers(self) -> int:
+        with self._lock:
+            return max(1, sum(w.max_workers for w in self._workers.values() if w.healthy))
+
+    @property
+    def admitted(self) -> int:
+        with self._lock:
+            return sum(w.in_flight for w in self._workers.values())
+
+    @property
+    def running(self) -> int:
+        with self._lock:
+            return sum(min(w.in_flight, w.max_workers) for w in self._workers.values())
+
+    @property
+    def queued(self) -> int:
+        with self._lock:
+            return sum(max(0, w.in_flight - w.max_workers) for w in self._workers.values())
+
+    @property
+    def full(self) -> bool:
+        with self._lock:
+            return not any(w.healthy and w.in_flight < w.capacity for w in self._workers.values())
+
+    def retry_after(self) -> int:
+        """Seconds until a slot is likely to free up."""
+        waves = (self.queued + 1) / self.max_workers
+        return max(1, math.ceil(self._avg_seconds * waves))
+
+    def _acquire(self, exclude, deadline: float) -> Optional[WorkerInfo]:
+        """Reserve a slot on the least-loaded healthy worker not in `exclude`.
+
+        Waits for a slot until `deadline`. Returns None when no such worker
+        is up at all; raises Overloaded when they are all busy.
+        """
+        with self._changed:
+            while True:
+                candidates = [w for w in self._workers.values() if w.healthy and w.address not in exclude]
+                free = [w for w in candidates if w.in_flight < w.capacity]
+                if free:
+                    worker = min(free, key=lambda w: (w.load, w.in_flight))
+                    worker.in_flight += 1
+                    return worker
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    if not candidates:
+                        return None
+                    raise Overloaded(max(1, math.ceil(self._avg_seconds)))
+                self._changed.wait(remaining)
+
+    def _release(self, worker: WorkerInfo, lost: bool):
+        with self._changed:
+            worker.in_flight -= 1
+            if lost:
+                worker.healthy = False
+            self._changed.notify_all()
+
+    def submit(self, scheduler: SchoolScheduler,
+               on_solution: Optional[Callable[[ScheduleResponse], Optional[bool]]] = None,
+               cancelled: Callable[[], bool] = lambda: False,
+               wait: float = 0) -> Tuple[ScheduleResponse, Dict[str, float]]:
+        """Solve on a worker and wait for the result; see SolveExecutor.submit.
+
+        Raises Overloaded when every worker is busy for longer than `wait`
+        seconds, or when none is up.
+        """
+        message = encode_job(scheduler, on_solution is not None)
+        deadline = time.monotonic() + wait
+        tried = set()
+        error = None
+        retry_after = max(1, math.ceil(self.health_interval))
+        start = time.perf_counter()
+        try:
+            for _ in range(self.max_attempts):
+                worker = self._acquire(tried, deadline)
+                if worker is None:
+                    break
+                tried.add(worker.address)
+                lost = False
+                try:
+                    reply = self._run(worker, message, on_solution, cancelled)
+                except (OSError, ValueError) as e:
+                    lost = True
+                    error = f"Worker {worker.address} lost: {e}"
+                    if cancelled() or self._stopped.is_set():
+                        return ScheduleResponse(status="UNKNOWN", schedule=[]), {}
+                    continue
+                finally:
+                    self._release(worker, lost)
+                if reply["type"] == "result":
+                    return ScheduleResponse.from_dict(reply["response"]), reply.get("timings", {})
+                if reply["type"] == "overloaded":
+                    # Busy with other front ends' jobs; try another worker
+                    error, retry_after = None, reply.get("retry_after", retry_after)
+                    continue
+                if reply.get("kind") == "invalid":
+                    raise ValueError(reply.get("error", "Job rejected by the solver worker"))
+                raise RuntimeError(reply.get("error", "Solver worker failed"))
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self._avg_seconds = 0.8 * self._avg_seconds + 0.2 * elapsed
+        if error:
+            raise RuntimeError(error)
+        # No worker up, or every one tried was full
+        raise Overloaded(retry_after)
+
+    def _run(self, worker: WorkerInfo, message: dict, on_solution, cancelled) -> dict:
+        """Send one job and relay its solutions; returns the final frame."""
+        sock = socket.create_connection(split_address(worker.address), timeout=CONNECT_TIMEOUT)
+        try:
+            channel = Channel.connect(sock, self.token)
+            sock.settimeout(None)
+            channel.send(message)
+            frames = queue.Queue()
+
+            def read():
+                try:
+                    while True:
+                        frame = channel.recv()
+                        frames.put(frame)
+                        if frame.get("type") != "solution":
+                            return
+                except (OSError, ValueError) as e:
+                    frames.put(e)
+
+            threading.Thread(target=read, daemon=True).start()
+            cancel_sent = False
+            while True:
+                try:
+                    frame = frames.get(timeout=0.1)
+                except queue.Empty:
+                    if not worker.healthy:
+                        raise ConnectionClosed("Worker failed its health check")
+                    if not cancel_sent and (cancelled() or self._stopped.is_set()):
+                        channel.send({"type": "cancel"})
+                        cancel_sent = True
+                    continue
+                if isinstance(frame, Exception):
+                    raise frame
+                if frame.get("type") != "solution":
+                    return frame
+                if on_solution(ScheduleResponse.from_dict(frame["response"])) is False and not cancel_sent:
+                    channel.send({"type": "cancel"})
+                    cancel_sent = True
+        finally:
+            sock.close()
+
+    def shutdown(self):
+        """Stop health checks and cancel running jobs."""
+        self._stopped.set()
+
+# -- Command line
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def run_worker(args):
+    token = os.environ.get('SCHEDULER_CLUSTER_TOKEN')
+    executor = SolveExecutor(max_workers=args.processes or None, max_queue=args.queue, cpus=args.cpus or None,
+                             template_bytes=args.template_mb * 1024 * 1024)
+    server = WorkerServer((args.host, args.port), executor, token)
+    host = args.host if args.host not in ('', '0.0.0.0') else socket.gethostname()
+    address = args.advertise or f"{host}:{server.server_address[1]}"
+    stop = threading.Event()
+    if args.register:
+        threading.Thread(target=register_with, args=(args.register, address, token, stop), daemon=True).start()
+    print(f"Solver worker {address}: {executor.max_workers} processes, {executor.threads_per_solve} threads each")
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        server.serve_forever()
+    finally:
+        stop.set()
+        server.server_close()
+        executor.shutdown()
+
+def run_local(args):
+    """A front end and `args.workers` workers on this machine, until interrupted."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    cpus = max(1, (os.cpu_count() or 1) // args.workers)
+    # A fresh secret per run unless one is given
+    token_env = {"SCHEDULER_CLUSTER_TOKEN": os.environ.get('SCHEDULER_CLUSTER_TOKEN') or secrets.token_hex(32)}
+    addresses = [f"127.0.0.1:{_free_port()}" for _ in range(args.workers)]
+    procs = [subprocess.Popen([sys.executable, os.path.join(here, "cluster.py"), "worker", "--host", "127.0.0.1",
+                               "--port", address.rpartition(':')[2], "--cpus", str(cpus)], cwd=here,
+                              env={**os.environ, **token_env})
+             for address in addresses]
+    env = {**os.environ, **token_env, "SCHEDULER_WORKERS": ",".join(addresses), "SCHEDULER_PORT": str(args.port)}
+    procs.append(subprocess.Popen([sys.executable, os.path.join(here, "main.py")], cwd=here, env=env))
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        procs[-1].wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for proc in procs:
+            proc.terminate()
+        for proc in procs:
+            proc.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    worker = commands.add_parser("worker", help="run a solver worker")
+    worker.add_argument("--host", default="127.0.0.1", help="address to listen on, e.g. 0.0.0.0 for all")
+    worker.add_argument("--port", type=int, default=9101)
+    worker.add_argument("--advertise", help="host:port front ends should connect to")
+    worker.add_argument("--register", help="front end URL to register with, e.g. http://frontend:8000")
+    worker.add_argument("--processes", type=int, help="concurrent solves (default: cores / 4)")
+    worker.add_argument("--queue", type=int, help="jobs waiting beyond those (default: 2 per process)")
+    worker.add_argument("--cpus", type=int, help="cores to share between solves (default: all)")
+    worker.add_argument("--template-mb", type=int, default=256, help="model template cache size, 0 disables it")
+    local = commands.add_parser("local", help="run a front end and several workers on this machine")
+    local.add_argument("--workers", type=int, default=2)
+    local.add_argument("--port", type=int, default=8000, help="front end HTTP port")
+    args = parser.parse_args()
+    if args.command == "worker":
+        if not os.environ.get('SCHEDULER_CLUSTER_TOKEN'):
+            parser.error("SCHEDULER_CLUSTER_TOKEN must be set")
+        run_worker(args)
+    else:
+        run_local(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Compact representations for large instances.
+
+Interner maps string ids to dense integers; ColumnarSchedule stores a
+schedule as four parallel integer arrays over interned ids instead of one
+ScheduledClass object per assignment, and still reads like a list of
+ScheduledClass.
+"""
+from array import array
+from collections.abc import Sequence
+from typing import Dict, Iterable, List, Optional
+from models import ScheduledClass
+
+class Interner:
+    """Dense integer ids for strings, numbered in first-seen order."""
+    __slots__ = ('ids', 'index')
+
+    def __init__(self, values: Iterable[str] = ()):
+        self.ids = []    # int -> str
+        self.index = {}  # str -> int
+        for value in values:
+            self.add(value)
+
+    def add(self, value: str) -> int:
+        i = self.index.get(value)
+        if i is None:
+            i = self.index[value] = len(self.ids)
+            self.ids.append(value)
+        return i
+
+    def get(self, value: str) -> Optional[int]:
+        return self.index.get(value)
+
+    def __getitem__(self, i: int) -> str:
+        return self.ids[i]
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+class ColumnarSchedule(Sequence):
+    """A schedule as parallel arrays of class, teacher, room and slot numbers.
+
+    Row i is the assignment (classes[class_col[i]], teachers[teacher_col[i]],
+    rooms[room_col[i]], slots[slot_col[i]]), where the tables are the id
+    lists of the scheduler's interners. Indexing and iteration produce
+    ScheduledClass objects on demand.
+    """
+    __slots__ = ('classes', 'teachers', 'rooms', 'slots', 'class_col', 'teacher_col', 'room_col', 'slot_col')
+
+    def __init__(self, classes: List[str], teachers: List[str], rooms: List[str], slots: List[str]):
+        self.classes = classes
+        self.teachers = teachers
+        self.rooms = rooms
+        self.slots = slots
+        self.class_col = array('i')
+        self.teacher_col = array('i')
+        self.room_col = array('i')
+        self.slot_col = array('i')
+
+    def append(self, c: int, t: int, r: int, s: int):
+        self.class_col.append(c)
+        self.teacher_col.append(t)
+        self.room_col.append(r)
+        self.slot_col.append(s)
+
+    def __len__(self) -> int:
+        return len(self.class_col)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        return ScheduledClass(
+            class_id=self.classes[self.class_col[i]],
+            teacher_id=self.teachers[self.teacher_col[i]],
+            room_id=self.rooms[self.room_col[i]],
+            time_slot_id=self.slots[self.slot_col[i]]
+        )
+
+    def __iter__(self):
+        classes, teachers, rooms, slots = self.classes, self.teachers, self.rooms, self.slots
+        for c, t, r, s in zip(self.class_col, self.teacher_col, self.room_col, self.slot_col):
+            yield ScheduledClass(classes[c], teachers[t], rooms[r], slots[s])
+
+    def __eq__(self, other):
+        if isinstance(other, (Sequence, ColumnarSchedule)):
+            return len(self) == len(other) and list(self) == list(other)
+        return NotImplemented
+
+    def to_dicts(self) -> List[Dict[str, str]]:
+        """The JSON form of the schedule, without building ScheduledClass objects."""
+        classes, teachers, rooms, slots = self.classes, self.teachers, self.rooms, self.slots
+        return [
+            {"class_id": classes[c], "teacher_id": teachers[t], "room_id": rooms[r], "time_slot_id": slots[s]}
+            for c, t, r, s in zip(self.class_col, self.teacher_col, self.room_col, self.slot_col)
+        ]
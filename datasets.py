@@ -0,0 +1,227 @@
+"""
+Server-side datasets: schools stored once and solved by id and version.
+
+A dataset is created from a JSON body or by a streaming bulk import of
+JSON Lines or CSV records. Each PATCH applies a delta (see scenarios.py)
+and creates a new version; entities a delta does not touch are shared
+between versions. Solving by dataset id skips uploading and parsing the
+school, and its canonical digest is computed once per version.
+
+With a `disk_dir` every dataset is an append-only log of one snapshot
+followed by its deltas, replayed on startup.
+
+Import records carry their entity type in a `type` field (teacher, room,
+class or time_slot), e.g. as JSON Lines:
+
+    {"type": "teacher", "id": "t1", "name": "Mr. Smith", "qualifications": ["Math"]}
+    {"type": "class", "id": "c1", "name": "Math 7", "subject": "Math", "required_sessions": 3}
+
+CSV uses a `type` column plus the union of the entity fields; empty cells
+are left out, list fields (qualifications, unavailable) are separated by
+";" and `blocked` is true for 1, true or yes.
+"""
+import csv
+import json
+import os
+import re
+import secrets
+import threading
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from cache import school_digest
+from scenarios import School, KINDS, apply_delta
+
+# Record "type" -> position in the School tuple
+RECORD_TYPES = {"teacher": 0, "room": 1, "class": 2, "time_slot": 3}
+# CSV cells holding ";"-separated lists
+LIST_FIELDS = ("qualifications", "unavailable")
+
+_ID_RE = re.compile(r'[0-9a-f]{16}')
+
+class DatasetNotFound(LookupError):
+    """Unknown dataset id, or a version no longer kept."""
+
+class VersionConflict(Exception):
+    """A PATCH was based on a version that is no longer the latest."""
+
+@dataclass
+class DatasetVersion:
+    version: int
+    school: School
+    _digest: Optional[str] = field(default=None, repr=False)
+
+    @property
+    def digest(self) -> str:
+        # Computed on the first solve of this version only
+        if self._digest is None:
+            self._digest = school_digest(*self.school)
+        return self._digest
+
+    def summary(self) -> Dict[str, Any]:
+        return {"version": self.version, **{kind: len(entities) for (kind, _), entities in zip(KINDS, self.school)}}
+
+def school_from_dict(data: Dict[str, Any]) -> School:
+    """A school from a JSON object of entity lists by kind. Raises
+    ValueError on any other shape or on an entity missing a field."""
+    if not isinstance(data, dict):
+        raise ValueError("Expected a JSON object")
+    school = []
+    for kind, cls in KINDS:
+        entities = data.get(kind, [])
+        if not isinstance(entities, list):
+            raise ValueError(f"'{kind}' must be a list")
+        try:
+            school.append([cls.from_dict(d) for d in entities])
+        except (AttributeError, KeyError, TypeError) as e:
+            raise ValueError(f"Invalid entry in '{kind}': {e!r}")
+    return tuple(school)
+
+def school_to_dict(school: School) -> Dict[str, Any]:
+    return {kind: [asdict(e) for e in entities] for (kind, _), entities in zip(KINDS, school)}
+
+def _entity(record: Dict[str, Any]):
+    kind = record.pop("type", None)
+    if kind not in RECORD_TYPES:
+        raise ValueError(f"Unknown record type: {kind}")
+    return RECORD_TYPES[kind], KINDS[RECORD_TYPES[kind]][1].from_dict(record)
+
+def school_from_records(records: Iterable[Dict[str, Any]]) -> School:
+    """Collect a school from import records, rejecting duplicate ids."""
+    school = ([], [], [], [])
+    seen = (set(), set(), set(), set())
+    for n, record in enumerate(records, 1):
+        try:
+            i, entity = _entity(record)
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"Record {n}: {e!r}")
+        if entity.id in seen[i]:
+            raise ValueError(f"Record {n}: duplicate {KINDS[i][0]} id {entity.id}")
+        seen[i].add(entity.id)
+        school[i].append(entity)
+    return school
+
+def jsonl_records(lines: Iterable[bytes]) -> Iterator[Dict[str, Any]]:
+    for line in lines:
+        if line.strip():
+            record = json.loads(line)
+            if not isinstance(record, dict):
+                raise ValueError("Each JSON Lines record must be an object")
+            yield record
+
+def csv_records(lines: Iterable[bytes]) -> Iterator[Dict[str, Any]]:
+    for row in csv.DictReader(line.decode('utf-8-sig') for line in lines):
+        record = {k: v for k, v in row.items() if k and v not in (None, '')}
+        for name in LIST_FIELDS:
+            if name in record:
+                record[name] = [v.strip() for v in record[name].split(';') if v.strip()]
+        if 'blocked' in record:
+            record['blocked'] = record['blocked'].strip().lower() in ('1', 'true', 'yes')
+        yield record
+
+class DatasetStore:
+    """Versioned datasets in memory, optionally logged to `disk_dir`.
+
+    The newest `max_versions` versions of each dataset are kept.
+    """
+    def __init__(self, max_versions: int = 16, disk_dir: Optional[str] = None):
+        self.max_versions = max_versions
+        self.disk_dir = disk_dir
+        self._datasets = {}  # id -> OrderedDict(version -> DatasetVersion)
+        self._lock = threading.Lock()
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+            self._load()
+
+    def create(self, school: School) -> Tuple[str, DatasetVersion]:
+        dataset_id = secrets.token_hex(8)
+        first = DatasetVersion(1, school)
+        with self._lock:
+            self._datasets[dataset_id] = OrderedDict([(1, first)])
+        self._log(dataset_id, {"version": 1, "school": school_to_dict(school)}, create=True)
+        return dataset_id, first
+
+    def get(self, dataset_id: str, version: Optional[int] = None) -> DatasetVersion:
+        with self._lock:
+            versions = self._datasets.get(dataset_id)
+            if versions is None:
+                raise DatasetNotFound(f"Unknown dataset: {dataset_id}")
+            if version is None:
+                return next(reversed(versions.values()))
+            if version not in versions:
+                raise DatasetNotFound(f"Dataset {dataset_id} has no version {version}")
+            return versions[version]
+
+    def patch(self, dataset_id: str, delta: Dict[str, Any], base_version: Optional[int] = None) -> DatasetVersion:
+        """Apply `delta` to the latest version. Raises VersionConflict when
+        `base_version` is given and is not the latest."""
+        with self._lock:
+            versions = self._datasets.get(dataset_id)
+            if versions is None:
+                raise DatasetNotFound(f"Unknown dataset: {dataset_id}")
+            latest = next(reversed(versions.values()))
+            if base_version is not None and base_version != latest.version:
+                raise VersionConflict(f"Dataset {dataset_id} is at version {latest.version}, not {base_version}")
+            new = DatasetVersion(latest.version + 1, apply_delta(latest.school, delta))
+            self._add_version(versions, new)
+            # Under the lock, so the log replays in version order
+            self._log(dataset_id, {"version": new.version, "delta": delta})
+        return new
+
+    def delete(self, dataset_id: str):
+        with self._lock:
+            if self._datasets.pop(dataset_id, None) is None:
+                raise DatasetNotFound(f"Unknown dataset: {dataset_id}")
+        if self.disk_dir:
+            try:
+                os.remove(self._path(dataset_id))
+            except OSError:
+                pass
+
+    def versions(self, dataset_id: str) -> List[int]:
+        with self._lock:
+            if dataset_id not in self._datasets:
+                raise DatasetNotFound(f"Unknown dataset: {dataset_id}")
+            return list(self._datasets[dataset_id])
+
+    def _add_version(self, versions, new: DatasetVersion):
+        # Caller holds the lock
+        versions[new.version] = new
+        while len(versions) > self.max_versions:
+            versions.popitem(last=False)
+
+    def _path(self, dataset_id: str) -> str:
+        return os.path.join(self.disk_dir, f"{dataset_id}.jsonl")
+
+    def _log(self, dataset_id: str, entry: Dict[str, Any], create: bool = False):
+        if not self.disk_dir:
+            return
+        try:
+            with open(self._path(dataset_id), 'w' if create else 'a') as f:
+                f.write(json.dumps(entry, separators=(',', ':')) + "\n")
+        except OSError as e:
+            print(f"Warning: could not log dataset {dataset_id}: {e}")
+
+    def _load(self):
+        for name in os.listdir(self.disk_dir):
+            dataset_id, ext = os.path.splitext(name)
+            if ext != '.jsonl' or not _ID_RE.fullmatch(dataset_id):
+                continue
+            versions = OrderedDict()
+            school = None
+            try:
+                with open(self._path(dataset_id)) as f:
+                    for line in f:
+                        entry = json.loads(line)
+                        if "school" in entry:
+                            school = school_from_dict(entry["school"])
+                        elif school is None:
+                            raise ValueError("log does not start with a snapshot")
+                        else:
+                            school = apply_delta(school, entry["delta"])
+                        self._add_version(versions, DatasetVersion(entry["version"], school))
+            except (OSError, ValueError, KeyError) as e:
+                # A torn last line keeps the versions before it
+                print(f"Warning: dataset {dataset_id} log is damaged: {e}")
+            if versions:
+                self._datasets[dataset_id] = versions
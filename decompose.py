@@ -0,0 +1,121 @@
+"""
+Split a scheduling problem into independent sub-problems.
+
+Classes, teachers and rooms form an interaction graph: a class is linked to
+every teacher that may teach it and every room it may use. Entities in
+different connected components never compete for the same resource, so
+each component can be solved as its own (much smaller) CP-SAT model and the
+schedules concatenated.
+
+The solver pool (executor.py) runs the components side by side as separate
+pool jobs and merges them with merge_responses.
+"""
+from typing import List, Optional, Tuple
+from models import Teacher, Room, SchoolClass, TimeSlot, ScheduleResponse, ScheduledClass
+
+Component = Tuple[List[Teacher], List[Room], List[SchoolClass]]
+
+def find_components(teachers: List[Teacher], rooms: List[Room], classes: List[SchoolClass]) -> List[Component]:
+    """Connected components of the class-teacher-room graph.
+
+    Teachers and rooms that no class can use belong to no component.
+    Classes with no eligible teacher or room still form their own component
+    so that their infeasibility is reported.
+    """
+    parent = {}
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    def union(a, b):
+        parent[find(a)] = find(b)
+
+    for c in classes:
+        parent[('c', c.id)] = ('c', c.id)
+    for c in classes:
+        for t in teachers:
+            if c.can_be_taught_by(t):
+                parent.setdefault(('t', t.id), ('t', t.id))
+                union(('c', c.id), ('t', t.id))
+        for r in rooms:
+            if c.can_use_room(r):
+                parent.setdefault(('r', r.id), ('r', r.id))
+                union(('c', c.id), ('r', r.id))
+
+    groups = {}
+    for c in classes:
+        groups.setdefault(find(('c', c.id)), ([], [], []))[2].append(c)
+    for t in teachers:
+        if ('t', t.id) in parent:
+            groups[find(('t', t.id))][0].append(t)
+    for r in rooms:
+        if ('r', r.id) in parent:
+            groups[find(('r', r.id))][1].append(r)
+    return list(groups.values())
+
+def component_jobs(teachers: List[Teacher], rooms: List[Room], classes: List[SchoolClass],
+                   time_slots: List[TimeSlot], previous: Optional[List[ScheduledClass]] = None):
+    """(teachers, rooms, classes, time_slots, previous) for each component."""
+    jobs = []
+    for c_teachers, c_rooms, c_classes in find_components(teachers, rooms, classes):
+        class_ids = {c.id for c in c_classes}
+        c_previous = [a for a in previous or [] if a.class_id in class_ids]
+        jobs.append((c_teachers, c_rooms, c_classes, time_slots, c_previous))
+    return jobs
+
+def merge_responses(responses: List[ScheduleResponse]) -> ScheduleResponse:
+    """Combine per-component results into one response.
+
+    Any INFEASIBLE component makes the whole problem INFEASIBLE; otherwise
+    any UNKNOWN makes it UNKNOWN, and it is OPTIMAL only if every part is.
+    """
+    statuses = {r.status for r in responses}
+    if "INFEASIBLE" in statuses:
+        status = "INFEASIBLE"
+    elif "UNKNOWN" in statuses:
+        status = "UNKNOWN"
+    elif statuses == {"OPTIMAL"}:
+        status = "OPTIMAL"
+    else:
+        status = "FEASIBLE"
+
+    conflicts = [c for r in responses for c in r.conflicts or []]
+    wall_times = [r.wall_time for r in responses if r.wall_time is not None]
+    exhausted = [r.budget_exhausted for r in responses if r.budget_exhausted is not None]
+    solved = status in ("OPTIMAL", "FEASIBLE")
+    return ScheduleResponse(
+        status=status,
+        schedule=[a for r in responses for a in r.schedule] if solved else [],
+        budget_exhausted=any(exhausted) if exhausted else None,
+        wall_time=max(wall_times) if wall_times else None,
+        objective=sum(r.objective or 0 for r in responses) if solved else None,
+        bound=sum(r.bound or 0 for r in responses) if solved else None,
+        conflicts=conflicts or None,
+        stats=merge_stats([r.stats for r in responses if r.stats is not None]) or None
+    )
+
+def merge_stats(parts: List[dict]) -> dict:
+    """Combine per-component instrumentation.
+
+    Components run side by side, so phase and wall times take the slowest
+    component; model sizes and search counters add up.
+    """
+    if not parts:
+        return {}
+    merged = {"components": len(parts), "phases": {}}
+    for part in parts:
+        for name, seconds in part.get("phases", {}).items():
+            merged["phases"][name] = max(merged["phases"].get(name, 0.0), seconds)
+        for section in ("model", "solver"):
+            for name, value in part.get(section, {}).items():
+                if value is None or name in ("objective", "bound"):
+                    continue
+                totals = merged.setdefault(section, {})
+                if name == "wall_time":
+                    totals[name] = max(totals.get(name, 0.0), value)
+                else:
+                    totals[name] = totals.get(name, 0) + value
+    return merged
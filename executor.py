@@ -0,0 +1,266 @@
+"""
+Bounded process pool for CP-SAT solves.
+
+Each solve runs in a worker process with a fixed share of the machine's
+cores, so concurrent requests no longer oversubscribe the CPU. Admission
+is bounded: at most `max_workers` solves run and `max_queue` more wait;
+beyond that `submit` raises Overloaded so the server can answer 503.
+
+Cancellation (client gone, or a streaming consumer asking to stop) sets a
+shared flag; a watcher thread in the worker then stops the CP-SAT search.
+
+Decomposed requests (options.decompose) send their independent components
+(see decompose.py) to the pool as separate jobs under the request's one
+slot. Components running side by side split the request's thread share,
+so a decomposed solve uses no more cores than a whole one.
+"""
+import itertools
+import math
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, wait as wait_futures
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import replace
+from typing import Callable, Dict, Optional, Tuple
+from models import ScheduleResponse, SolverOptions
+from solver import SchoolScheduler
+from decompose import component_jobs, merge_responses
+from templates import TemplateCache
+
+# CP-SAT's portfolio search needs a few workers to be effective; by
+# default fewer concurrent solves get more threads each.
+MIN_THREADS_PER_SOLVE = 4
+# Longest wait, once a streamed job is done, for its last solutions
+STREAM_END_TIMEOUT = 5.0
+
+class Overloaded(Exception):
+    """All solver slots and queue places are taken."""
+    def __init__(self, retry_after: int):
+        super().__init__(f"Solver queue is full, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+# Worker-process state, set by _init_worker
+_cancel_flags = None
+_events = None
+_templates = None
+
+def _init_worker(cancel_flags, events, template_bytes, template_dir):
+    global _cancel_flags, _events, _templates
+    _cancel_flags = cancel_flags
+    _events = events
+    # Each worker keeps its own templates; the disk tier is shared
+    if template_bytes:
+        _templates = TemplateCache(template_bytes, template_dir)
+
+def _solve_job(slot: int, job_id: int, teachers, rooms, classes, time_slots, options: SolverOptions,
+               previous, stream: bool) -> Tuple[ScheduleResponse, Dict[str, float]]:
+    try:
+        if _cancel_flags[slot]:
+            # Cancelled while still queued
+            return ScheduleResponse(status="UNKNOWN", schedule=[]), {}
+
+        def on_solution(response: ScheduleResponse):
+            _events.put((job_id, response.to_dict()))
+
+        scheduler = SchoolScheduler(teachers, rooms, classes, time_slots, options, previous, templates=_templates)
+        return _run_cancellable(slot, scheduler, on_solution if stream else None), scheduler.timings
+    finally:
+        if stream:
+            # Marks the end of the job's solutions; the result itself may
+            # reach the parent first
+            _events.put((job_id, None))
+
+def _run_cancellable(slot: int, scheduler: SchoolScheduler, on_solution=None) -> ScheduleResponse:
+    done = threading.Event()
+
+    def watch():
+        # StopSearch before Solve() has started is lost, so keep asking
+        # until the solve returns
+        while not done.wait(0.05):
+            if _cancel_flags[slot]:
+                scheduler.stop()
+
+    watcher = threading.Thread(target=watch, daemon=True)
+    watcher.start()
+    try:
+        return scheduler.solve(on_solution)
+    finally:
+        done.set()
+
+class SolveExecutor:
+    def __init__(self, max_workers: Optional[int] = None, max_queue: Optional[int] = None,
+                 cpus: Optional[int] = None, template_bytes: int = 0, template_dir: Optional[str] = None):
+        self.cpus = cpus or os.cpu_count() or 1
+        self.max_workers = max_workers or max(1, self.cpus // MIN_THREADS_PER_SOLVE)
+        self.max_queue = self.max_workers * 2 if max_queue is None else max_queue
+        # Concurrent solves split the cores evenly
+        self.threads_per_solve = max(1, self.cpus // self.max_workers)
+        # Per-worker model template cache (see templates.py); 0 disables it
+        self.template_bytes = template_bytes
+        self.template_dir = template_dir
+
+        # Workers come from a clean fork server: forking the threaded HTTP
+        # server would hand every worker a copy of its listening socket
+        self._context = multiprocessing.get_context('forkserver')
+        capacity = self.max_workers + self.max_queue
+        self._slots = queue.Queue()
+        for slot in range(capacity):
+            self._slots.put(slot)
+        self._cancel_flags = self._context.RawArray('b', capacity)
+        self._events = self._context.Queue()
+        self._streams = {}  # job id -> queue.Queue of intermediate response dicts
+        self._job_ids = itertools.count()
+        self._lock = threading.Lock()
+        self._pool = None
+        self._router = None
+        self.admitted = 0
+        # Moving average of solve durations, for Retry-After
+        self._avg_seconds = 1.0
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=self._context,
+                                                 initializer=_init_worker,
+                                                 initargs=(self._cancel_flags, self._events,
+                                                           self.template_bytes, self.template_dir))
+            if self._router is None:
+                self._router = threading.Thread(target=self._route_events, daemon=True)
+                self._router.start()
+            return self._pool
+
+    def _route_events(self):
+        while True:
+            job_id, payload = self._events.get()
+            stream = self._streams.get(job_id)
+            if stream is not None:
+                stream.put(payload)
+
+    @property
+    def running(self) -> int:
+        return min(self.admitted, self.max_workers)
+
+    @property
+    def queued(self) -> int:
+        return max(0, self.admitted - self.max_workers)
+
+    @property
+    def full(self) -> bool:
+        return self._slots.empty()
+
+    def retry_after(self) -> int:
+        """Seconds until a slot is likely to free up."""
+        waves = (self.queued + 1) / self.max_workers
+        return max(1, math.ceil(self._avg_seconds * waves))
+
+    def submit(self, scheduler: SchoolScheduler,
+               on_solution: Optional[Callable[[ScheduleResponse], Optional[bool]]] = None,
+               cancelled: Callable[[], bool] = lambda: False,
+               wait: float = 0) -> Tuple[ScheduleResponse, Dict[str, float]]:
+        """Solve in a worker process and wait for the result.
+
+        `on_solution` is called in this thread with each intermediate
+        solution; returning False stops the search, as does `cancelled()`
+        becoming true. Returns the response and the worker's phase timings.
+        Raises Overloaded when no slot is free within `wait` seconds.
+        """
+        try:
+            slot = self._slots.get(timeout=wait) if wait > 0 else self._slots.get_nowait()
+        except queue.Empty:
+            raise Overloaded(self.retry_after())
+        with self._lock:
+            self.admitted += 1
+        start = time.perf_counter()
+
+        job_id = next(self._job_ids)
+        stream = queue.Queue()
+        if on_solution is not None:
+            self._streams[job_id] = stream
+        self._cancel_flags[slot] = 0
+        try:
+            jobs = self._jobs(scheduler, on_solution is not None)
+            try:
+                futures = [self._get_pool().submit(_solve_job, slot, job_id, *job) for job in jobs]
+            except BrokenProcessPool:
+                self._reset_pool()
+                futures = [self._get_pool().submit(_solve_job, slot, job_id, *job) for job in jobs]
+            ended = False
+            while wait_futures(futures, timeout=0.1).not_done:
+                ended = self._drain(stream, on_solution, slot) or ended
+                if cancelled():
+                    self._cancel_flags[slot] = 1
+            if on_solution is not None and not ended and futures[0].exception() is None:
+                # Solutions still on their way from the worker
+                self._drain(stream, on_solution, slot, timeout=STREAM_END_TIMEOUT)
+            try:
+                results = [f.result() for f in futures]
+                if len(results) == 1:
+                    return results[0]
+                # Components ran side by side: each phase took as long as
+                # its slowest component
+                timings = {}
+                for _, part in results:
+                    for phase, seconds in part.items():
+                        timings[phase] = max(timings.get(phase, 0.0), seconds)
+                return merge_responses([response for response, _ in results]), timings
+            except BrokenProcessPool:
+                # A worker died (e.g. out of memory); start afresh next time
+                self._reset_pool()
+                raise RuntimeError("Solver process crashed")
+        finally:
+            self._streams.pop(job_id, None)
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.admitted -= 1
+                self._avg_seconds = 0.8 * self._avg_seconds + 0.2 * elapsed
+            self._slots.put(slot)
+
+    def _drain(self, stream: queue.Queue, on_solution, slot: int, timeout: float = 0) -> bool:
+        """Pass queued solutions to `on_solution`, waiting up to `timeout`
+        for each. True once the job's end marker is reached."""
+        while True:
+            try:
+                payload = stream.get(timeout=timeout) if timeout > 0 else stream.get_nowait()
+            except queue.Empty:
+                return False
+            if payload is None:
+                return True
+            if on_solution(ScheduleResponse.from_dict(payload)) is False:
+                self._cancel_flags[slot] = 1
+
+    def _jobs(self, scheduler: SchoolScheduler, stream: bool) -> list:
+        """_solve_job arguments (after slot and job id) for each pool job.
+
+        A decomposed solve that splits gives one job per component; a
+        streamed one stays whole so its solutions cover the full schedule.
+        """
+        options = scheduler.options
+        threads = min(options.num_workers or self.threads_per_solve, self.threads_per_solve)
+        parts = []
+        if options.decompose and not stream:
+            parts = component_jobs(scheduler.teachers, scheduler.rooms, scheduler.classes,
+                                   scheduler.time_slots, scheduler.previous)
+        if len(parts) <= 1:
+            return [(scheduler.teachers, scheduler.rooms, scheduler.classes, scheduler.time_slots,
+                     replace(options, num_workers=threads), scheduler.previous, stream)]
+        side_by_side = min(len(parts), self.max_workers)
+        options = replace(options, num_workers=max(1, threads // side_by_side))
+        return [(t, r, c, s, options, p, False) for t, r, c, s, p in parts]
+
+    def _reset_pool(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def shutdown(self):
+        """Stop running searches and wait for the worker processes to exit."""
+        for slot in range(len(self._cancel_flags)):
+            self._cancel_flags[slot] = 1
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
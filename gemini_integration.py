@@ -1,80 +1,285 @@
-import vertexai
-from vertexai.generative_models import GenerativeModel, Part
+"""
+Natural-language helpers backed by Gemini.
+
+The model client is created on first use, not at import time, and reused
+afterwards. Parse and insight results are kept in small LRU caches keyed
+on normalized text and on a hash of the schedule, so repeated Streamlit
+reruns cost nothing. Multi-line input is parsed in a single round trip.
+
+The backend is chosen with SCHEDULER_LLM_BACKEND: "vertex" (default) or
+"stub", a deterministic offline stand-in for tests and benchmarks whose
+simulated latency is set with SCHEDULER_LLM_STUB_LATENCY (seconds).
+"""
+import csv
+import hashlib
+import io
 import json
 import os
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Dict, List
 
-# Initialize Vertex AI
-# We assume the environment has GOOGLE_APPLICATION_CREDENTIALS or is running in a GCP environment
-# User might need to set project/location if not auto-detected
-try:
-    vertexai.init() 
-except Exception as e:
-    print(f"Warning: Vertex AI init failed (might be expected if credentials not set yet): {e}")
+MODEL_NAME = "gemini-1.5-flash-001"
 
-def parse_scheduler_command(text: str) -> dict:
-    """
-    Parses natural language text to extract scheduler data.
-    Returns a dict with 'type' (teacher, room, class) and 'data' (dict of attributes).
-    """
-    model = GenerativeModel("gemini-1.5-flash-001")
-    
-    prompt = f"""
+PARSE_PROMPT = """
     You are a data extraction assistant for a school scheduling app.
     Extract the following entities from the text: Teacher, Room, or Class.
-    
-    Output JSON ONLY with this structure:
+    Each line of the text describes exactly one entity.
+
+    Output JSON ONLY: an array with one object per line, in input order, each with this structure:
     {{
         "type": "teacher" | "room" | "class",
         "data": {{ ...attributes... }}
     }}
-    
+
     Attributes for Teacher: name, qualifications (list of strings).
     Attributes for Room: name, capacity (int).
-    Attributes for Class: name, subject, elementary_sessions (int, default 1), preferred_teacher_name (optional).
-    
-    Example Input: "Add Mr. Smith who teaches Math and Physics"
-    Example Output: {{ "type": "teacher", "data": {{ "name": "Mr. Smith", "qualifications": ["Math", "Physics"] }} }}
-    
-    Example Input: "Create a room called Room 101 with 30 seats"
-    Example Output: {{ "type": "room", "data": {{ "name": "Room 101", "capacity": 30 }} }}
-
-    Example Input: "Math 101 class for Math subject needs 3 sessions"
-    Example Output: {{ "type": "class", "data": {{ "name": "Math 101", "subject": "Math", "required_sessions": 3 }} }}
-
-    Text to parse: "{text}"
-    """
-    
-    try:
-        response = model.generate_content(prompt)
-        # Clean response to ensure pure JSON
-        content = response.text.strip()
-        if content.startswith("```json"):
-            content = content[7:-3]
-        elif content.startswith("```"):
-            content = content[3:-3]
-            
-        return json.loads(content)
-    except Exception as e:
-        return {"error": str(e)}
+    Attributes for Class: name, subject, required_sessions (int, default 1), preferred_teacher_name (optional).
 
-def analyze_schedule_insights(schedule_data: str) -> str:
-    """
-    Analyzes the textual representation of a schedule to provide insights.
+    Example Input:
+    Add Mr. Smith who teaches Math and Physics
+    Create a room called Room 101 with 30 seats
+    Math 101 class for Math subject needs 3 sessions
+    Example Output: [
+        {{ "type": "teacher", "data": {{ "name": "Mr. Smith", "qualifications": ["Math", "Physics"] }} }},
+        {{ "type": "room", "data": {{ "name": "Room 101", "capacity": 30 }} }},
+        {{ "type": "class", "data": {{ "name": "Math 101", "subject": "Math", "required_sessions": 3 }} }}
+    ]
+
+    Text to parse:
+    {text}
     """
-    model = GenerativeModel("gemini-1.5-flash-001")
-    
-    prompt = f"""
+
+INSIGHTS_PROMPT = """
     You are a helpful assistant analyzing a school timetable.
     Here is the generated schedule data:
     {schedule_data}
-    
-    Please provide a brief, friendly summary of this schedule. 
+
+    Please provide a brief, friendly summary of this schedule.
     Highlight how many classes each teacher has, room utilization, and any potential improvements or balanced workload observations.
     Keep it concise (3-4 bullet points).
     """
-    
+
+def _strip_fences(content: str) -> str:
+    # Models like to wrap JSON in markdown code fences
+    content = content.strip()
+    if content.startswith("```json"):
+        content = content[7:-3]
+    elif content.startswith("```"):
+        content = content[3:-3]
+    return content
+
+class VertexBackend:
+    """Gemini on Vertex AI. vertexai is imported and initialized on first use."""
+    def __init__(self, model_name: str = MODEL_NAME):
+        self.model_name = model_name
+        self._model = None
+        self._lock = threading.Lock()
+
+    def _get_model(self):
+        with self._lock:
+            if self._model is None:
+                # Credentials come from GOOGLE_APPLICATION_CREDENTIALS or the GCP environment
+                import vertexai
+                from vertexai.generative_models import GenerativeModel
+                vertexai.init()
+                self._model = GenerativeModel(self.model_name)
+            return self._model
+
+    def parse(self, lines: List[str]) -> List[dict]:
+        response = self._get_model().generate_content(PARSE_PROMPT.format(text="\n".join(lines)))
+        results = json.loads(_strip_fences(response.text))
+        if isinstance(results, dict):
+            results = [results]
+        if len(results) != len(lines):
+            raise ValueError(f"Expected {len(lines)} entities, model returned {len(results)}")
+        return results
+
+    def insights(self, schedule_data: str) -> str:
+        return self._get_model().generate_content(INSIGHTS_PROMPT.format(schedule_data=schedule_data)).text
+
+_CAPACITY_RE = re.compile(r'(\d+)\s*(?:seats|students|people|capacity)|capacity\s*(?:of\s*)?(\d+)', re.I)
+_SESSIONS_RE = re.compile(r'(\d+)\s*(?:sessions|times|periods)', re.I)
+_CALLED_RE = re.compile(r'\b(?:called|named)\s+(.+?)(?=\s+with\b|\s+for\b|$)', re.I)
+_LEADING_VERB_RE = re.compile(r'^(?:add|create|new)\s+(?:an?\s+)?', re.I)
+_SUBJECTS_RE = re.compile(r'\b(?:teaches|teaching|for)\s+(.+)$', re.I)
+_TEACHER_NAME_RE = re.compile(r'\b((?:Mr|Mrs|Ms|Dr|Prof)\.?\s+\w+)')
+_BY_TEACHER_RE = re.compile(r'\b(?:by|with)\s+((?:Mr|Mrs|Ms|Dr|Prof)\.?\s+\w+)')
+
+class StubBackend:
+    """Deterministic rule-based stand-in for the model, no network needed.
+
+    Understands simple phrasings like the prompt's examples; `latency`
+    seconds are slept per call to mimic a round trip.
+    """
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls = 0
+
+    def _round_trip(self):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def parse(self, lines: List[str]) -> List[dict]:
+        self._round_trip()
+        return [self._parse_line(line) for line in lines]
+
+    @staticmethod
+    def _parse_line(line: str) -> dict:
+        lower = line.lower()
+        if re.search(r'\bclass\b|\bsessions?\b', lower):
+            name = re.split(r'\s+class\b', line, maxsplit=1, flags=re.I)[0]
+            name = _LEADING_VERB_RE.sub('', name).strip()
+            subject = re.search(r'\bfor\s+(\w+)', line, re.I)
+            sessions = _SESSIONS_RE.search(line)
+            data = {
+                "name": name or "Unknown",
+                "subject": subject.group(1) if subject else (name.split()[0] if name else "General"),
+                "required_sessions": int(sessions.group(1)) if sessions else 1,
+            }
+            teacher = _BY_TEACHER_RE.search(line)
+            if teacher:
+                data["preferred_teacher_name"] = teacher.group(1)
+            return {"type": "class", "data": data}
+        if re.search(r'\broom\b|\blab\b|\bseats\b', lower):
+            called = _CALLED_RE.search(line)
+            name = called.group(1) if called else _LEADING_VERB_RE.sub('', re.split(r'\s+(?:with|for)\b', line, 1)[0])
+            capacity = _CAPACITY_RE.search(line)
+            return {"type": "room", "data": {
+                "name": name.strip() or "Unknown",
+                "capacity": int(capacity.group(1) or capacity.group(2)) if capacity else 30,
+            }}
+        name = _TEACHER_NAME_RE.search(line)
+        subjects = _SUBJECTS_RE.search(line)
+        qualifications = re.split(r'\s*,\s*|\s+and\s+', subjects.group(1).strip(' .')) if subjects else []
+        return {"type": "teacher", "data": {
+            "name": name.group(1) if name else "Unknown",
+            "qualifications": [q for q in qualifications if q],
+        }}
+
+    def insights(self, schedule_data: str) -> str:
+        self._round_trip()
+        rows = list(csv.DictReader(io.StringIO(schedule_data)))
+        if not rows:
+            return "- The schedule is empty."
+        per_teacher = Counter(row.get("Teacher") for row in rows)
+        per_room = Counter(row.get("Room") for row in rows)
+        busiest, most = per_teacher.most_common(1)[0]
+        lightest, least = per_teacher.most_common()[-1]
+        return "\n".join([
+            f"- {len(rows)} sessions across {len(per_teacher)} teachers and {len(per_room)} rooms.",
+            "- Classes per teacher: " + ", ".join(f"{t} {n}" for t, n in sorted(per_teacher.items())) + ".",
+            "- Room use: " + ", ".join(f"{r} {n}" for r, n in sorted(per_room.items())) + ".",
+            f"- Workload spread: {busiest} teaches {most}, {lightest} teaches {least}.",
+        ])
+
+class LRUCache:
+    """Thread-safe LRU of at most `max_entries` results."""
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+_backend = None
+_backend_lock = threading.Lock()
+PARSE_CACHE = LRUCache()
+INSIGHTS_CACHE = LRUCache(max_entries=32)
+
+def get_backend():
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            name = os.environ.get("SCHEDULER_LLM_BACKEND", "vertex")
+            if name == "stub":
+                _backend = StubBackend(float(os.environ.get("SCHEDULER_LLM_STUB_LATENCY", 0)))
+            elif name == "vertex":
+                _backend = VertexBackend()
+            else:
+                raise ValueError(f"Unknown SCHEDULER_LLM_BACKEND: {name}")
+        return _backend
+
+def set_backend(backend):
+    """Use `backend` from now on; cached results of the previous one are dropped."""
+    global _backend
+    with _backend_lock:
+        _backend = backend
+    PARSE_CACHE.clear()
+    INSIGHTS_CACHE.clear()
+
+def _normalize(text: str) -> str:
+    return " ".join(text.split())
+
+def parse_scheduler_commands(text: str) -> List[dict]:
+    """
+    Parses every non-empty line of `text` as one entity, in one model call.
+    Returns a list of dicts with 'type' and 'data', or 'error' per line.
+    Lines parsed before are answered from the cache.
+    """
+    lines = [_normalize(line) for line in text.splitlines()]
+    lines = [line for line in lines if line]
+    results: Dict[str, dict] = {}
+    missing = []
+    for line in lines:
+        cached = PARSE_CACHE.get(line)
+        if cached is not None:
+            results[line] = cached
+        elif line not in missing:
+            missing.append(line)
+
+    if missing:
+        try:
+            parsed = get_backend().parse(missing)
+        except Exception as e:
+            parsed = [{"error": str(e)}] * len(missing)
+        for line, result in zip(missing, parsed):
+            if not isinstance(result, dict):
+                result = {"error": f"Expected an entity object, model returned {json.dumps(result)}"}
+            results[line] = result
+            if "error" not in result:
+                PARSE_CACHE.put(line, result)
+    # Copies, so callers cannot alter cached entries
+    return [json.loads(json.dumps(results[line])) for line in lines]
+
+def parse_scheduler_command(text: str) -> dict:
+    """
+    Parses natural language text to extract scheduler data.
+    Returns a dict with 'type' (teacher, room, class) and 'data' (dict of attributes).
+    """
+    results = parse_scheduler_commands(_normalize(text))
+    return results[0] if results else {"error": "Nothing to parse"}
+
+def analyze_schedule_insights(schedule_data: str) -> str:
+    """
+    Analyzes the textual representation of a schedule to provide insights.
+    """
+    key = hashlib.sha256(schedule_data.encode()).hexdigest()
+    cached = INSIGHTS_CACHE.get(key)
+    if cached is not None:
+        return cached
     try:
-        response = model.generate_content(prompt)
-        return response.text
+        insights = get_backend().insights(schedule_data)
     except Exception as e:
         return f"Could not generate insights: {str(e)}"
+    INSIGHTS_CACHE.put(key, insights)
+    return insights
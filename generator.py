@@ -0,0 +1,154 @@
+"""
+Seeded generator of synthetic but realistic school scheduling instances.
+
+The same arguments and seed always produce the same school, so instances
+can be used for benchmarks and regression baselines.
+
+    python generator.py --teachers 40 --classes 120 --seed 7 > school.json
+"""
+import argparse
+import json
+import random
+from dataclasses import asdict
+from typing import List, Tuple
+from models import Teacher, Room, SchoolClass, TimeSlot
+
+SUBJECTS = [
+    "Math", "English", "Science", "History", "Geography", "French", "Spanish", "Art",
+    "Music", "PE", "Biology", "Chemistry", "Physics", "Computing", "Drama", "Economics",
+]
+# Core subjects get more classes and more sessions per week
+CORE = {"Math", "English", "Science"}
+DAYS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+# Subjects taught in special rooms when room types are on
+ROOM_TYPES = {"Science": "lab", "Biology": "lab", "Chemistry": "lab", "Physics": "lab", "PE": "gym"}
+
+School = Tuple[List[Teacher], List[Room], List[SchoolClass], List[TimeSlot]]
+
+def generate_school(n_teachers: int = 10, n_subjects: int = 8, n_rooms: int = 8, n_classes: int = 20,
+                    sessions_per_week: Tuple[int, int] = (2, 5), days: int = 5, periods: int = 6,
+                    preassigned: float = 0.1, seed: int = 0, room_types: bool = False,
+                    part_time: float = 0.0, blocked_slots: int = 0) -> School:
+    """Build one school.
+
+    With at least as many teachers as subjects, every subject has a
+    qualified teacher; teachers carry one to three subjects and core
+    subjects get proportionally more staff. `preassigned` is the fraction of classes pinned to a teacher.
+    Required sessions are capped by the slot grid.
+
+    The remaining options add availability data and leave the school
+    otherwise unchanged for the same seed. `room_types` turns rooms into
+    labs and gyms in proportion to lab and PE demand and gives every class
+    an enrollment that fits some room of its type; `part_time` is the
+    fraction of teachers unavailable for one whole day; `blocked_slots`
+    slots are closed to all classes.
+    """
+    if n_subjects > len(SUBJECTS):
+        raise ValueError(f"At most {len(SUBJECTS)} subjects are supported")
+    if days > len(DAYS):
+        raise ValueError(f"At most {len(DAYS)} days are supported")
+    rng = random.Random(seed)
+    subjects = SUBJECTS[:n_subjects]
+    weights = [3 if s in CORE else 1 for s in subjects]
+
+    teachers = []
+    for i in range(n_teachers):
+        # The first n_subjects teachers cover every subject once; after that
+        # staffing follows demand, so core subjects get more teachers
+        first = subjects[i] if i < n_subjects else rng.choices(subjects, weights)[0]
+        extra = rng.sample(subjects, rng.randint(0, min(2, n_subjects - 1)))
+        qualifications = [first] + [s for s in extra if s != first]
+        teachers.append(Teacher(id=f"t{i}", name=f"Teacher {i}", qualifications=qualifications))
+
+    rooms = [
+        Room(id=f"r{i}", name=f"Room {100 + i}", capacity=rng.choice([20, 25, 30, 30, 30, 35]))
+        for i in range(n_rooms)
+    ]
+
+    n_slots = days * periods
+    lo, hi = sessions_per_week
+    classes = []
+    for i in range(n_classes):
+        subject = rng.choices(subjects, weights)[0]
+        sessions = rng.randint(lo, hi) + (1 if subject in CORE else 0)
+        teacher_id = None
+        qualified = [t.id for t in teachers if subject in t.qualifications]
+        if qualified and rng.random() < preassigned:
+            teacher_id = rng.choice(qualified)
+        classes.append(SchoolClass(
+            id=f"c{i}",
+            name=f"{subject} {i}",
+            subject=subject,
+            required_sessions=min(sessions, n_slots),
+            teacher_id=teacher_id
+        ))
+
+    time_slots = [
+        TimeSlot(id=f"{DAYS[d]}_{p}", day=DAYS[d], period=p)
+        for d in range(days) for p in range(1, periods + 1)
+    ]
+
+    if room_types:
+        _add_room_types(rng, rooms, classes)
+    for t in rng.sample(teachers, round(part_time * n_teachers)):
+        day = rng.choice(DAYS[:days])
+        t.unavailable = [s.id for s in time_slots if s.day == day]
+    for s in rng.sample(time_slots, min(blocked_slots, n_slots)):
+        s.blocked = True
+    return teachers, rooms, classes, time_slots
+
+def _add_room_types(rng: random.Random, rooms: List[Room], classes: List[SchoolClass]):
+    # Each special type gets rooms in proportion to its share of sessions,
+    # at least one; ordinary rooms keep at least one too when needed
+    total = sum(c.required_sessions for c in classes) or 1
+    demand = {}
+    for c in classes:
+        c.room_type = ROOM_TYPES.get(c.subject)
+        demand[c.room_type] = demand.get(c.room_type, 0) + c.required_sessions
+    pool = list(rooms)
+    rng.shuffle(pool)
+    for room_type in sorted(t for t in demand if t is not None):
+        for _ in range(max(1, round(len(rooms) * demand[room_type] / total))):
+            if len(pool) <= (None in demand):
+                break
+            pool.pop().room_type = room_type
+    largest = {}
+    for r in rooms:
+        largest[r.room_type] = max(largest.get(r.room_type, 0), r.capacity)
+    for c in classes:
+        c.enrollment = min(rng.randint(15, 32), largest.get(c.room_type, 0))
+
+def to_payload(school: School) -> dict:
+    """The /api/solve request body for a generated school."""
+    teachers, rooms, classes, time_slots = school
+    return {
+        "teachers": [asdict(t) for t in teachers],
+        "rooms": [asdict(r) for r in rooms],
+        "classes": [asdict(c) for c in classes],
+        "time_slots": [asdict(s) for s in time_slots],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--teachers", type=int, default=10)
+    parser.add_argument("--subjects", type=int, default=8)
+    parser.add_argument("--rooms", type=int, default=8)
+    parser.add_argument("--classes", type=int, default=20)
+    parser.add_argument("--min-sessions", type=int, default=2)
+    parser.add_argument("--max-sessions", type=int, default=5)
+    parser.add_argument("--days", type=int, default=5)
+    parser.add_argument("--periods", type=int, default=6)
+    parser.add_argument("--preassigned", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--room-types", action="store_true", help="labs and gyms, class enrollments")
+    parser.add_argument("--part-time", type=float, default=0.0, help="fraction of teachers off one day")
+    parser.add_argument("--blocked-slots", type=int, default=0)
+    args = parser.parse_args()
+
+    school = generate_school(args.teachers, args.subjects, args.rooms, args.classes,
+                             (args.min_sessions, args.max_sessions), args.days, args.periods,
+                             args.preassigned, args.seed, args.room_types, args.part_time, args.blocked_slots)
+    print(json.dumps(to_payload(school), indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,372 @@
+"""
+Load test for the HTTP solve service.
+
+Starts main.py on a free port (or targets --url), then keeps --concurrency
+client threads sending POST /api/solve for --duration seconds. Each thread
+holds one keep-alive connection. Requests are drawn from a weighted mix of
+kinds. A kind is a school size (see benchmark.SIZES) and a cache mode:
+- hit: one fixed school per size, solved once during warm-up, so every
+  measured request is a result-cache hit
+- miss: a freshly generated school (new seed) every time. Against a
+  long-running --url server, give each run a different --seed so misses
+  are not served from an earlier run's cache
+
+The report gives per kind and overall:
+- p50, p95 and p99 latency of successful requests
+- throughput
+- error and 503 (overloaded) rates
+
+It also samples the server's RSS over time. The RSS covers the server and
+its solver processes. It is read from /proc, so it is Linux only and only
+available when this script started the server or was given --server-pid.
+The report can be saved as JSON and compared against a baseline; any
+regression fails the run.
+
+    python loadtest.py
+    python loadtest.py --concurrency 16 --mix tiny-hit:8,medium-miss:1 --duration 60
+    python loadtest.py --output load.json --baseline load_baseline.json
+    python loadtest.py --url http://localhost:8000 --server-pid 1234
+
+Schools for misses are generated by the client threads before their
+request is timed. On small machines, client and server still share CPU.
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+from benchmark import SIZES
+from datasets import school_to_dict
+from generator import generate_school
+
+DEFAULT_MIX = "tiny-hit:6,tiny-miss:2,medium-hit:1,medium-miss:1"
+CACHE_MODES = ("hit", "miss")
+
+# Latency differences smaller than this are noise, never regressions
+MIN_LATENCY_DELTA = 0.05
+
+def parse_mix(text: str):
+    """'tiny-hit:6,medium-miss:1' -> [((size, mode), weight), ...]"""
+    mix = []
+    for part in text.split(","):
+        name, _, weight = part.strip().partition(":")
+        size, _, mode = name.partition("-")
+        if size not in SIZES or mode not in CACHE_MODES:
+            raise ValueError(f"Unknown request kind: {name} (expected <size>-<hit|miss>)")
+        mix.append(((size, mode), float(weight or 1)))
+    return mix
+
+def payload(size: str, seed: int, solver: dict) -> bytes:
+    school = generate_school(seed=seed, **SIZES[size])
+    return json.dumps({**school_to_dict(school), "solver": solver}).encode()
+
+def percentile(sorted_values, p: float):
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * p // 100))
+    return sorted_values[int(rank) - 1]
+
+def process_rss_mb(pid: int):
+    """Resident memory of a process and all its descendants, from /proc."""
+    total_kb, stack, seen = 0, [pid], set()
+    while stack:
+        p = stack.pop()
+        if p in seen:
+            continue
+        seen.add(p)
+        try:
+            with open(f"/proc/{p}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total_kb += int(line.split()[1])
+                        break
+            for task in os.listdir(f"/proc/{p}/task"):
+                with open(f"/proc/{p}/task/{task}/children") as f:
+                    stack.extend(int(c) for c in f.read().split())
+        except (OSError, ValueError):
+            # Exited between listing and reading
+            continue
+    return round(total_kb / 1024, 1) if total_kb else None
+
+class Server:
+    """main.py in a child process on a free local port."""
+    def __init__(self, env=None):
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            self.port = s.getsockname()[1]
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.proc = subprocess.Popen(
+            [sys.executable, "main.py"], cwd=os.path.dirname(os.path.abspath(__file__)),
+            env={**os.environ, **(env or {}), "SCHEDULER_PORT": str(self.port)},
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        self.pid = self.proc.pid
+
+    def wait_ready(self, timeout: float = 30.0):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.proc.poll() is not None:
+                raise RuntimeError(f"Server exited with code {self.proc.returncode}")
+            try:
+                conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=2)
+                conn.request("GET", "/api/cache/stats")
+                conn.getresponse().read()
+                conn.close()
+                return
+            except OSError:
+                time.sleep(0.1)
+        raise RuntimeError("Server did not start in time")
+
+    def stop(self):
+        # SIGTERM lets main.py shut its solver processes down
+        self.proc.terminate()
+        try:
+            self.proc.wait(10)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+            self.proc.wait()
+
+class LoadRun:
+    def __init__(self, url: str, mix, concurrency: int, duration: float, max_requests, solver: dict, seed: int):
+        parts = urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.mix = mix
+        self.concurrency = concurrency
+        self.duration = duration
+        self.max_requests = max_requests
+        self.solver = solver
+        self.seed = seed
+        # Fixed schools for cache hits, by size
+        self.hit_payloads = {size: payload(size, seed, solver) for (size, mode), _ in mix if mode == "hit"}
+        # (kind, start offset, seconds, HTTP status or None for a transport error)
+        self.samples = []
+        self._lock = threading.Lock()
+        self._next_seed = seed + 1
+        self._sent = 0
+
+    def connect(self):
+        return http.client.HTTPConnection(self.host, self.port, timeout=max(60.0, self.solver["time_limit"] * 4))
+
+    def post(self, conn, body: bytes):
+        conn.request("POST", "/api/solve", body, {"Content-Type": "application/json"})
+        response = conn.getresponse()
+        response.read()
+        return response.status
+
+    def warm_up(self):
+        """Solve every hit school once so measured hits come from the cache."""
+        conn = self.connect()
+        try:
+            for size, body in self.hit_payloads.items():
+                status = self.post(conn, body)
+                if status != 200:
+                    raise RuntimeError(f"Warm-up solve for {size} failed with HTTP {status}")
+        finally:
+            conn.close()
+
+    def take_request(self) -> bool:
+        with self._lock:
+            if self.max_requests is not None and self._sent >= self.max_requests:
+                return False
+            self._sent += 1
+            return True
+
+    def miss_seed(self) -> int:
+        with self._lock:
+            self._next_seed += 1
+            return self._next_seed
+
+    def client(self, index: int, start: float):
+        rng = random.Random(self.seed * 1000 + index)
+        kinds = [kind for kind, _ in self.mix]
+        weights = [weight for _, weight in self.mix]
+        conn = self.connect()
+        samples = []
+        try:
+            while time.perf_counter() - start < self.duration and self.take_request():
+                size, mode = kind = rng.choices(kinds, weights)[0]
+                body = self.hit_payloads[size] if mode == "hit" else payload(size, self.miss_seed(), self.solver)
+                sent = time.perf_counter()
+                try:
+                    status = self.post(conn, body)
+                except (OSError, http.client.HTTPException):
+                    status = None
+                    conn.close()
+                    conn = self.connect()
+                samples.append((kind, sent - start, time.perf_counter() - sent, status))
+        finally:
+            conn.close()
+            with self._lock:
+                self.samples.extend(samples)
+
+    def run(self, server_pid=None, sample_interval: float = 0.5):
+        rss = []
+        done = threading.Event()
+        start = time.perf_counter()
+
+        def sample_rss():
+            while True:
+                mb = process_rss_mb(server_pid)
+                if mb is not None:
+                    rss.append((round(time.perf_counter() - start, 2), mb))
+                if done.wait(sample_interval):
+                    break
+
+        sampler = threading.Thread(target=sample_rss, daemon=True) if server_pid else None
+        if sampler:
+            sampler.start()
+        clients = [threading.Thread(target=self.client, args=(i, start)) for i in range(self.concurrency)]
+        for t in clients:
+            t.start()
+        for t in clients:
+            t.join()
+        elapsed = time.perf_counter() - start
+        done.set()
+        if sampler:
+            sampler.join()
+        return summarize(self.samples, elapsed), rss
+
+def summarize(samples, elapsed: float) -> dict:
+    """Latency percentiles, throughput and error rates, overall and per kind."""
+    def stats(rows):
+        # Fast 503s and failures would flatter the percentiles
+        latencies = sorted(seconds for _, _, seconds, status in rows if status == 200)
+        n = len(rows)
+        ok = sum(1 for *_, status in rows if status == 200)
+        overloaded = sum(1 for *_, status in rows if status == 503)
+        return {
+            "requests": n,
+            "throughput_rps": round(ok / elapsed, 3) if elapsed else 0.0,
+            "p50_s": _round(percentile(latencies, 50)),
+            "p95_s": _round(percentile(latencies, 95)),
+            "p99_s": _round(percentile(latencies, 99)),
+            # 503s are counted apart from other failures
+            "error_rate": round((n - ok - overloaded) / n, 4) if n else 0.0,
+            "rate_503": round(overloaded / n, 4) if n else 0.0,
+        }
+
+    by_kind = {}
+    for row in samples:
+        by_kind.setdefault(row[0], []).append(row)
+    return {
+        "elapsed_s": round(elapsed, 3),
+        "overall": stats(samples),
+        "kinds": {f"{size}-{mode}": stats(rows) for (size, mode), rows in sorted(by_kind.items())},
+    }
+
+def _round(value):
+    return round(value, 4) if value is not None else None
+
+def compare(report, baseline, tolerance: float):
+    """Regressions of `report` against `baseline` as human-readable strings."""
+    regressions = []
+    base_groups = {"overall": baseline["summary"]["overall"], **baseline["summary"]["kinds"]}
+    groups = {"overall": report["summary"]["overall"], **report["summary"]["kinds"]}
+    for name, r in groups.items():
+        b = base_groups.get(name)
+        if b is None or not b["requests"]:
+            continue
+        for metric in ("p50_s", "p95_s", "p99_s"):
+            old, new = b.get(metric), r.get(metric)
+            if old is None or new is None:
+                continue
+            if new > old * (1 + tolerance) and new - old > MIN_LATENCY_DELTA:
+                regressions.append(f"{name}: {metric} {old:.3f} -> {new:.3f}")
+        if r["throughput_rps"] < b["throughput_rps"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput_rps {b['throughput_rps']} -> {r['throughput_rps']}")
+        for metric in ("error_rate", "rate_503"):
+            # Rates are compared in absolute points; a few failures in a
+            # short run are not a regression
+            if r[metric] > b[metric] + 0.01:
+                regressions.append(f"{name}: {metric} {b[metric]} -> {r[metric]}")
+    old_rss, new_rss = baseline.get("peak_rss_mb"), report.get("peak_rss_mb")
+    if old_rss and new_rss and new_rss > old_rss * (1 + tolerance):
+        regressions.append(f"peak_rss_mb {old_rss} -> {new_rss}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="target a running server instead of starting one")
+    parser.add_argument("--server-pid", type=int, help="pid of the --url server, for RSS samples")
+    parser.add_argument("--concurrency", type=int, default=8, help="client threads")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds to send requests for")
+    parser.add_argument("--requests", type=int, help="stop after this many requests")
+    parser.add_argument("--mix", default=DEFAULT_MIX,
+                        help=f"weighted kinds <size>-<hit|miss>:<weight>, sizes from: {', '.join(SIZES)}")
+    parser.add_argument("--time-limit", type=float, default=10.0, help="per-solve budget in seconds")
+    parser.add_argument("--num-workers", type=int, default=1, help="CP-SAT workers per solve")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--sample-interval", type=float, default=0.5, help="seconds between RSS samples")
+    parser.add_argument("--output", help="write the report as JSON to this file")
+    parser.add_argument("--baseline", help="compare against a report JSON from an earlier run")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative slowdown")
+    args = parser.parse_args()
+
+    try:
+        mix = parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+    solver = {"time_limit": args.time_limit, "num_workers": args.num_workers}
+
+    server = None
+    url, server_pid = args.url, args.server_pid
+    if url is None:
+        server = Server()
+        server.wait_ready()
+        url, server_pid = server.url, server.pid
+    try:
+        load = LoadRun(url, mix, args.concurrency, args.duration, args.requests, solver, args.seed)
+        load.warm_up()
+        summary, rss = load.run(server_pid, args.sample_interval)
+    finally:
+        if server:
+            server.stop()
+
+    print(f"{'kind':>14} {'requests':>8} {'req/s':>8} {'p50 s':>8} {'p95 s':>8} {'p99 s':>8} "
+          f"{'errors':>7} {'503':>7}")
+    for name, s in [*summary["kinds"].items(), ("overall", summary["overall"])]:
+        latency = " ".join(f"{s[m]:>8.3f}" if s[m] is not None else f"{'-':>8}" for m in ("p50_s", "p95_s", "p99_s"))
+        print(f"{name:>14} {s['requests']:>8} {s['throughput_rps']:>8.2f} {latency} "
+              f"{s['error_rate']:>7.2%} {s['rate_503']:>7.2%}")
+    peak_rss = max((mb for _, mb in rss), default=None)
+    if peak_rss is not None:
+        print(f"\nServer RSS: {rss[0][1]} MB at start, {peak_rss} MB peak, {rss[-1][1]} MB at end")
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "mix": args.mix,
+            "solver": solver,
+            "seed": args.seed,
+        },
+        "summary": summary,
+        "peak_rss_mb": peak_rss,
+        "rss_mb": rss,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        if regressions:
+            print("\nRegressions against baseline:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("\nNo regressions against baseline.")
+
+if __name__ == "__main__":
+    main()
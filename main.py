@@ -1,89 +1,699 @@
 from http.server import BaseHTTPRequestHandler, HTTPServer
+import hmac
 import json
 import os
-import mimetypes
+import select
+import signal
+import socket
+import sys
+import time
+from typing import Optional
+from urllib.parse import parse_qs, unquote
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import replace
 from socketserver import ThreadingMixIn
-from models import Teacher, Room, SchoolClass, TimeSlot, ScheduleResponse
+from models import Teacher, Room, SchoolClass, TimeSlot, ScheduleResponse, SolverOptions
 from solver import SchoolScheduler
+from analysis import analyze
+from cache import ResultCache, canonical_key
+from executor import SolveExecutor, Overloaded
+from cluster import ClusterExecutor
+from scenarios import apply_delta, diff_schedules
+from term import TermSpec, solve_term
+from schedules import ScheduleStore, ScheduleNotFound, ExportUnavailable, EXPORT_FORMATS, KINDS
+from datasets import (DatasetStore, DatasetNotFound, VersionConflict, school_from_dict, school_from_records,
+                      school_to_dict, jsonl_records, csv_records)
+from assets import AssetCache
+from metrics import (REGISTRY, Counter, Gauge, REQUESTS, REQUEST_LATENCY, PHASE_LATENCY, SOLVES,
+                     SOLVES_IN_FLIGHT, QUEUE_DEPTH)
+
+# Server-wide solver budget. Requests may ask for less, never for more.
+DEFAULT_TIME_LIMIT = float(os.environ.get('SCHEDULER_DEFAULT_TIME_LIMIT', 30.0))
+MAX_TIME_LIMIT = float(os.environ.get('SCHEDULER_MAX_TIME_LIMIT', 120.0))
+DEFAULT_NUM_WORKERS = int(os.environ.get('SCHEDULER_DEFAULT_NUM_WORKERS', min(8, os.cpu_count() or 1)))
+MAX_NUM_WORKERS = int(os.environ.get('SCHEDULER_MAX_NUM_WORKERS', os.cpu_count() or 1))
+
+def apply_server_limits(options: SolverOptions) -> SolverOptions:
+    """Fill unset budget fields with server defaults and clamp to the caps."""
+    time_limit = options.time_limit if options.time_limit is not None else DEFAULT_TIME_LIMIT
+    num_workers = options.num_workers if options.num_workers is not None else DEFAULT_NUM_WORKERS
+    options.time_limit = min(time_limit, MAX_TIME_LIMIT)
+    options.num_workers = max(1, min(num_workers, MAX_NUM_WORKERS))
+    return options
+
+# Static files, held in memory and refreshed when they change on disk
+ASSETS = AssetCache(os.getcwd())
+STATIC_MAX_AGE = int(os.environ.get('SCHEDULER_STATIC_MAX_AGE', 300))
+
+# Largest number of scenarios one /api/solve/batch request may carry
+MAX_BATCH_SCENARIOS = int(os.environ.get('SCHEDULER_MAX_BATCH_SCENARIOS', 32))
+
+# Solved results keyed on the canonical problem hash. Set SCHEDULER_CACHE_DIR
+# to keep results across restarts.
+RESULT_CACHE = ResultCache(
+    max_bytes=int(os.environ.get('SCHEDULER_CACHE_BYTES', 64 * 1024 * 1024)),
+    disk_dir=os.environ.get('SCHEDULER_CACHE_DIR') or None
+)
+
+# Solved schedules by result_id, indexed on first query for
+# /api/schedules/{id}/...
+SCHEDULES = ScheduleStore(max_entries=int(os.environ.get('SCHEDULER_INDEXED_SCHEDULES', 256)))
+
+def scheduler_cache_key(scheduler: SchoolScheduler, school: Optional[str] = None) -> str:
+    # A hint-only warm start may change which valid schedule is found but not
+    # what counts as a correct answer; disruption modes depend on the prior.
+    # `school` is the stored digest of a dataset version, if known.
+    previous = scheduler.previous if scheduler.options.disruption != "none" else None
+    return canonical_key(scheduler.teachers, scheduler.rooms, scheduler.classes,
+                         scheduler.time_slots, scheduler.options, previous, school)
+
+# Schools stored server-side and solved by dataset_id. Set
+# SCHEDULER_DATASET_DIR to keep them across restarts.
+DATASETS = DatasetStore(
+    max_versions=int(os.environ.get('SCHEDULER_DATASET_VERSIONS', 16)),
+    disk_dir=os.environ.get('SCHEDULER_DATASET_DIR') or None
+)
+# Longest accepted line of a bulk import
+MAX_IMPORT_LINE = 1024 * 1024
+
+# Solves run in a bounded pool of worker processes. By default each solve
+# gets at least 4 cores; SCHEDULER_SOLVE_PROCESSES / SCHEDULER_SOLVE_QUEUE
+# override how many run at once and how many may wait.
+# With SCHEDULER_WORKERS (host:port,...) or SCHEDULER_CLUSTER=1, solves go
+# to remote solver workers instead (see cluster.py); SCHEDULER_CLUSTER_TOKEN
+# must then hold the cluster's shared secret.
+CLUSTER_TOKEN = os.environ.get('SCHEDULER_CLUSTER_TOKEN') or None
+if os.environ.get('SCHEDULER_WORKERS') or os.environ.get('SCHEDULER_CLUSTER'):
+    EXECUTOR = ClusterExecutor(
+        [a.strip() for a in os.environ.get('SCHEDULER_WORKERS', '').split(',') if a.strip()],
+        CLUSTER_TOKEN,
+        health_interval=float(os.environ.get('SCHEDULER_HEALTH_INTERVAL', 2.0))
+    )
+else:
+    EXECUTOR = SolveExecutor(
+        max_workers=int(os.environ.get('SCHEDULER_SOLVE_PROCESSES', 0)) or None,
+        max_queue=int(os.environ['SCHEDULER_SOLVE_QUEUE']) if os.environ.get('SCHEDULER_SOLVE_QUEUE') else None,
+        # Built models reused across requests with the same school skeleton
+        template_bytes=int(os.environ.get('SCHEDULER_TEMPLATE_CACHE_MB', 256)) * 1024 * 1024,
+        template_dir=os.environ.get('SCHEDULER_TEMPLATE_DIR') or None
+    )
+SOLVES_IN_FLIGHT.set_function(lambda: EXECUTOR.running)
+QUEUE_DEPTH.set_function(lambda: EXECUTOR.queued)
+
+REGISTRY.register(Counter(
+    'scheduler_cache_events_total', 'Result cache lookups and evictions by outcome', ('event',),
+    function=lambda: {(event,): RESULT_CACHE.stats()[event] for event in ('hits', 'misses', 'disk_hits', 'evictions')}))
+REGISTRY.register(Gauge(
+    'scheduler_cache_entries', 'Results held in the memory tier', function=lambda: RESULT_CACHE.stats()['entries']))
+REGISTRY.register(Gauge(
+    'scheduler_cache_bytes', 'Serialized size of the memory tier', function=lambda: RESULT_CACHE.stats()['bytes']))
+
+def with_current_names(scheduler: SchoolScheduler, result: ScheduleResponse) -> ScheduleResponse:
+    """A cached result whose precheck conflicts name this request's entities.
+
+    Names are not part of the cache key, but the precheck's messages quote
+    them; those are rebuilt from the request (the analysis is cheap).
+    """
+    if not result.conflicts or all(c.kind == "constraint_core" for c in result.conflicts):
+        return result
+    fresh = analyze(scheduler.teachers, scheduler.rooms, scheduler.classes, scheduler.time_slots)
+    if not fresh:
+        # Found per component by a decomposed solve; keep them as they were
+        return result
+    return replace(result, conflicts=fresh + [c for c in result.conflicts if c.kind == "constraint_core"])
+
+def run_solver(scheduler: SchoolScheduler, on_solution=None, cancelled=lambda: False, wait=0) -> ScheduleResponse:
+    """Solve on the executor with whichever strategy the request's options select.
+
+    Streaming solves (`on_solution`) always run as a single model. Raises
+    Overloaded when the solver queue is full (for longer than `wait` seconds).
+    """
+    start = time.perf_counter()
+    result, timings = EXECUTOR.submit(scheduler, on_solution, cancelled, wait)
+    PHASE_LATENCY.observe(time.perf_counter() - start, phase='solve')
+    for phase, seconds in timings.items():
+        PHASE_LATENCY.observe(seconds, phase=phase)
+    SOLVES.inc(status=result.status)
+    return result
 
 # Threading server to handle multiple requests if needed (though basic runs single threaded mostly)
 class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
-    pass
+    # Idle keep-alive connections must not hold up shutdown
+    daemon_threads = True
 
 class SchedulerHandler(BaseHTTPRequestHandler):
+    # Persistent connections: every response carries a Content-Length (SSE
+    # streams close the connection instead)
+    protocol_version = 'HTTP/1.1'
+    # Seconds an idle keep-alive connection is kept open
+    timeout = 60
+
     def do_GET(self):
         # Serve static files
         if self.path == '/' or self.path == '/index.html':
             self.serve_file('static/index.html')
+        elif self.path == '/api/cache/stats':
+            self.send_json(RESULT_CACHE.stats())
+        elif self.path.startswith('/api/datasets/'):
+            self.dispatch('/api/datasets/{id}', self.handle_dataset_get)
+        elif self.path.startswith('/api/schedules/'):
+            self.dispatch('/api/schedules/{id}', self.handle_schedule_get)
+        elif self.path == '/api/cluster/workers':
+            self.dispatch(self.path, self.handle_cluster_workers)
+        elif self.path == '/metrics':
+            body = REGISTRY.render().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
         elif self.path.startswith('/static/'):
-            # Security check: prevent ../ traversal
-            safe_path = os.path.normpath(self.path).lstrip('/')
+            # Security check: prevent ../ traversal. Query strings (cache
+            # busting) do not name a different file.
+            safe_path = os.path.normpath(self.path.split('?', 1)[0]).lstrip('/')
             if not safe_path.startswith('static/'):
                self.send_error(403, "Forbidden")
                return
             self.serve_file(safe_path)
+        elif self.path == '/favicon.ico':
+            # There is no icon; let browsers remember that for a day
+            self.send_empty(404, {'Cache-Control': 'public, max-age=86400'})
         else:
             self.send_error(404, "File not found")
 
     def do_POST(self):
-        if self.path == '/api/solve':
-            try:
-                content_length = int(self.headers['Content-Length'])
-                post_data = self.rfile.read(content_length)
-                data = json.loads(post_data)
+        routes = {
+            '/api/solve': self.handle_solve,
+            '/api/solve/stream': self.handle_solve_stream,
+            '/api/solve/batch': self.handle_solve_batch,
+            '/api/solve/term': self.handle_solve_term,
+        }
+        if self.path == '/api/cluster/workers':
+            # Authorized before the body is read
+            self.dispatch(self.path, self.handle_cluster_register)
+            return
+        if self.path == '/api/datasets':
+            # Reads its own body: bulk imports are parsed as they stream in
+            self.dispatch(self.path, self.handle_dataset_create)
+            return
+        handler = routes.get(self.path)
+        if handler is None:
+            self.send_error(404, "Endpoint not found")
+            return
+        self.dispatch(self.path, lambda: self.with_json(handler))
+
+    def do_PATCH(self):
+        if not self.path.startswith('/api/datasets/'):
+            self.send_error(404, "Endpoint not found")
+            return
+        self.dispatch('/api/datasets/{id}', lambda: self.with_json(self.handle_dataset_patch))
+
+    def do_DELETE(self):
+        if not self.path.startswith('/api/datasets/'):
+            self.send_error(404, "Endpoint not found")
+            return
+        self.dispatch('/api/datasets/{id}', self.handle_dataset_delete)
+
+    def with_json(self, handler):
+        with self.phase('parse'):
+            data = self.read_json()
+        handler(data)
+
+    def dispatch(self, endpoint, handler):
+        """Run `handler`, map errors to status codes and record request metrics.
+
+        `endpoint` is the route pattern used as the metrics label.
+        """
+        start = time.perf_counter()
+        self.timings = {}
+        self.school_digest = None
+        try:
+            handler()
+        except (BrokenPipeError, ConnectionResetError):
+            # Client went away; nothing left to answer
+            self.status_code = 499
+            self.close_connection = True
+        except Overloaded as e:
+            self.send_json({"error": str(e)}, 503, headers={'Retry-After': str(e.retry_after)})
+        except (DatasetNotFound, ScheduleNotFound) as e:
+            self.send_json({"error": str(e)}, 404)
+        except VersionConflict as e:
+            self.send_json({"error": str(e)}, 409)
+        except ExportUnavailable as e:
+            self.send_json({"error": str(e)}, 501)
+        except ValueError as e:
+            self.send_error(400, f"Bad Request: {str(e)}")
+        except Exception as e:
+            import traceback
+            traceback.print_exc()
+            self.send_error(500, f"Server Error: {str(e)}")
+        finally:
+            REQUESTS.inc(endpoint=endpoint, code=getattr(self, 'status_code', 0))
+            REQUEST_LATENCY.observe(time.perf_counter() - start, endpoint=endpoint)
+
+    def client_gone(self) -> bool:
+        """True once the client has closed its end of the connection."""
+        try:
+            readable, _, _ = select.select([self.connection], [], [], 0)
+            # A closed socket is readable with nothing left to read
+            return bool(readable) and not self.connection.recv(1, socket.MSG_PEEK)
+        except OSError:
+            return True
+
+    def send_response(self, code, message=None):
+        # Remembered for the request metrics
+        self.status_code = code
+        super().send_response(code, message)
+
+    @contextmanager
+    def phase(self, name):
+        """Time one request phase for /metrics and the optional response stats."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.timings[name] = self.timings.get(name, 0.0) + elapsed
+            PHASE_LATENCY.observe(elapsed, phase=name)
 
-                # Parse data into models
+    def read_json(self):
+        content_length = int(self.headers['Content-Length'])
+        post_data = self.rfile.read(content_length)
+        return json.loads(post_data)
+
+    def build_scheduler(self, data) -> SchoolScheduler:
+        # Parse data into models, or take them from a stored dataset
+        with self.phase('parse'):
+            if data.get('dataset_id'):
+                dataset = DATASETS.get(data['dataset_id'], data.get('version'))
+                teachers, rooms, classes, time_slots = dataset.school
+                self.school_digest = dataset.digest
+            else:
                 teachers = [Teacher.from_dict(t) for t in data.get('teachers', [])]
                 rooms = [Room.from_dict(r) for r in data.get('rooms', [])]
                 classes = [SchoolClass.from_dict(c) for c in data.get('classes', [])]
                 time_slots = [TimeSlot.from_dict(t) for t in data.get('time_slots', [])]
+            options = apply_server_limits(SolverOptions.from_dict(data.get('solver', {})))
+            previous = self.previous_schedule(data)
+        return SchoolScheduler(teachers, rooms, classes, time_slots, options, previous)
 
-                # Run Solver
-                solver = SchoolScheduler(teachers, rooms, classes, time_slots)
-                result = solver.solve()
+    def previous_schedule(self, data):
+        """Schedule to warm-start from: inline `previous` or a cached `previous_id`."""
+        if data.get('previous_id'):
+            prior = RESULT_CACHE.get(data['previous_id'])
+            if prior is None:
+                raise ValueError(f"Unknown previous_id: {data['previous_id']}")
+            return prior.schedule
+        if data.get('previous'):
+            return ScheduleResponse.from_dict(data['previous']).schedule
+        return None
 
-                # Send Response
-                self.send_response(200)
-                self.send_header('Content-Type', 'application/json')
-                self.end_headers()
-                self.wfile.write(json.dumps(result.to_dict()).encode())
+    def send_json(self, payload, status=200, headers=None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
 
-            except Exception as e:
-                import traceback
-                traceback.print_exc()
-                self.send_error(500, f"Server Error: {str(e)}")
-        else:
-            self.send_error(404, "Endpoint not found")
+    def lookup(self, scheduler: SchoolScheduler, school: Optional[str] = None):
+        with self.phase('cache'):
+            key = scheduler_cache_key(scheduler, school)
+            result = RESULT_CACHE.get(key)
+        if result is not None:
+            result = with_current_names(scheduler, result)
+            self.keep_schedule(scheduler, result)
+        return key, result
 
-    def serve_file(self, filepath):
-        try:
-            # Resolve relative to current directory
-            full_path = os.path.join(os.getcwd(), filepath)
-            if not os.path.exists(full_path):
-                self.send_error(404, "File not found")
+    def keep_schedule(self, scheduler: SchoolScheduler, result: ScheduleResponse):
+        if result.status in ("OPTIMAL", "FEASIBLE") and result.result_id:
+            SCHEDULES.put(result.result_id, result.schedule, scheduler.time_slots)
+
+    def solve_and_cache(self, scheduler: SchoolScheduler, key: str, on_solution=None, keep=lambda: True, wait=0):
+        """Run the solver and cache the result (if `keep()` still holds).
+
+        Returns the result and its solver stats; stats belong to this run
+        only and are never cached.
+        """
+        result = run_solver(scheduler, on_solution, self.client_gone, wait)
+        stats, result.stats = result.stats, None
+        result.result_id = key
+        if keep():
+            RESULT_CACHE.put(key, result)
+            self.keep_schedule(scheduler, result)
+        return result, stats
+
+    def response_body(self, scheduler: SchoolScheduler, result: ScheduleResponse, stats=None):
+        # The serialize phase covers building the response dict, not the
+        # final JSON encoding of it
+        with self.phase('serialize'):
+            body = result.to_dict()
+        if scheduler.options.stats:
+            stats = dict(stats or {})
+            request_phases = {name: round(seconds, 6) for name, seconds in self.timings.items()}
+            serialize = request_phases.pop('serialize')
+            stats["phases"] = {**request_phases, **stats.get("phases", {}), "serialize": serialize}
+            body["stats"] = stats
+        return body
+
+    def handle_solve(self, data):
+        scheduler = self.build_scheduler(data)
+        key, result = self.lookup(scheduler, self.school_digest)
+        cache_status = 'HIT'
+        stats = None
+        if result is None:
+            # Run Solver; a search cut short by a disconnect is not cached
+            result, stats = self.solve_and_cache(scheduler, key, keep=lambda: not self.client_gone())
+            if self.client_gone():
+                # 499: client closed the request (nothing is sent)
+                self.status_code = 499
+                self.close_connection = True
                 return
+            cache_status = 'MISS'
+
+        # Send Response
+        self.send_json(self.response_body(scheduler, result, stats), headers={'X-Cache': cache_status})
 
-            # Guess mime type
-            ctype, _ = mimetypes.guess_type(full_path)
-            if ctype is None:
-                ctype = 'application/octet-stream'
+    def handle_solve_batch(self, data):
+        """Solve a base school and what-if variants of it side by side.
 
-            with open(full_path, 'rb') as f:
-                content = f.read()
-            
+        `scenarios` is a list of deltas (see scenarios.py), each with an
+        optional `name` and `solver` options overriding the base ones. The
+        base is parsed once and unchanged entities are shared; all variants
+        are submitted to the executor together, so the batch takes about as
+        long as its slowest solve when there are enough solver slots.
+
+        Every variant warm-starts from the request's `previous`/`previous_id`;
+        passing the base's earlier result_id (with disruption "penalize")
+        keeps each variant's diff against the base small.
+        """
+        scenarios = data.get('scenarios')
+        if not isinstance(scenarios, list) or not scenarios:
+            raise ValueError("scenarios must be a non-empty list")
+        if len(scenarios) > MAX_BATCH_SCENARIOS:
+            raise ValueError(f"At most {MAX_BATCH_SCENARIOS} scenarios per batch")
+
+        base = self.build_scheduler(data)
+        school = (base.teachers, base.rooms, base.classes, base.time_slots)
+        variants = [("base", base, self.school_digest)]
+        with self.phase('parse'):
+            for i, scenario in enumerate(scenarios):
+                if not isinstance(scenario, dict):
+                    raise ValueError("Each scenario must be an object")
+                options = SolverOptions.from_dict({**data.get('solver', {}), **scenario.get('solver', {})})
+                variants.append((
+                    scenario.get('name') or f"scenario {i + 1}",
+                    SchoolScheduler(*apply_delta(school, scenario), apply_server_limits(options), base.previous),
+                    None
+                ))
+
+        # Variants beyond the free solver slots wait for earlier ones
+        waves = -(-len(variants) // EXECUTOR.max_workers)
+        wait = max(v.options.time_limit for _, v, _ in variants) * waves
+        with ThreadPoolExecutor(max_workers=len(variants)) as pool:
+            outcomes = list(pool.map(lambda v: self.solve_variant(*v, wait), variants))
+
+        base_result = outcomes[0]["result"]
+        solved = ("OPTIMAL", "FEASIBLE")
+        for outcome in outcomes[1:]:
+            if base_result.status in solved and outcome["result"].status in solved:
+                outcome["diff"] = diff_schedules(base_result.schedule, outcome["result"].schedule)
+        with self.phase('serialize'):
+            body = {"base": self.variant_body(outcomes[0]),
+                    "scenarios": [self.variant_body(o) for o in outcomes[1:]]}
+        self.send_json(body)
+
+    def solve_variant(self, name, scheduler: SchoolScheduler, school: Optional[str], wait: float):
+        start = time.perf_counter()
+        key, result = self.lookup(scheduler, school)
+        cached = result is not None
+        if result is None:
+            result, _ = self.solve_and_cache(scheduler, key, wait=wait)
+        return {"name": name, "result": result, "cached": cached, "seconds": time.perf_counter() - start}
+
+    def variant_body(self, outcome):
+        body = {"name": outcome["name"], "cached": outcome["cached"], "seconds": round(outcome["seconds"], 6),
+                **outcome["result"].to_dict()}
+        if "diff" in outcome:
+            body["diff"] = outcome["diff"]
+        return body
+
+    def handle_solve_term(self, data):
+        """Solve a term from its pattern weeks (see term.py).
+
+        `term` holds the number of weeks, the rotation, per-cycle session
+        counts and exception weeks. Pattern weeks and exception re-solves go
+        through the executor and result cache like any other solve. With
+        `expand` the response also lists every session of the term.
+        """
+        base = self.build_scheduler(data)
+        with self.phase('parse'):
+            spec = TermSpec.from_dict(data.get('term') or {})
+
+        def solve(teachers, rooms, classes, time_slots, options, previous):
+            scheduler = SchoolScheduler(teachers, rooms, classes, time_slots, options, previous)
+            key, result = self.lookup(scheduler)
+            if result is None:
+                result, _ = self.solve_and_cache(scheduler, key, wait=options.time_limit)
+            return result
+
+        result = solve_term((base.teachers, base.rooms, base.classes, base.time_slots), spec, base.options, solve)
+        with self.phase('serialize'):
+            body = result.to_dict(expand=bool(data.get('expand')))
+        self.send_json(body)
+
+    def cluster_authorized(self) -> bool:
+        """True for a cluster front end and a request carrying its token;
+        answers 404 or 401 otherwise."""
+        if not isinstance(EXECUTOR, ClusterExecutor):
+            self.send_json({"error": "Not a cluster front end"}, 404)
+            return False
+        given = self.headers.get('Authorization', '').encode()
+        if not hmac.compare_digest(given, f"Bearer {CLUSTER_TOKEN}".encode()):
+            self.send_json({"error": "Cluster token required"}, 401, headers={'WWW-Authenticate': 'Bearer'})
+            return False
+        return True
+
+    def handle_cluster_workers(self):
+        if self.cluster_authorized():
+            self.send_json({"workers": EXECUTOR.workers()})
+
+    def handle_cluster_register(self):
+        """A solver worker announcing itself (see cluster.py register_with)."""
+        if not self.cluster_authorized():
+            # The unread body would be taken for the next request
+            self.close_connection = True
+            return
+        with self.phase('parse'):
+            data = self.read_json()
+        address = data.get('address') if isinstance(data, dict) else None
+        if not isinstance(address, str):
+            raise ValueError("address must be a host:port string")
+        self.send_json(EXECUTOR.register(address).to_dict())
+
+    def handle_solve_stream(self, data):
+        """Server-Sent Events variant of /api/solve.
+
+        Emits a `solution` event for every improving schedule CP-SAT finds,
+        then a single `result` event with the final response. Closing the
+        connection stops the search.
+        """
+        scheduler = self.build_scheduler(data)
+        key, cached = self.lookup(scheduler, self.school_digest)
+        if cached is None and EXECUTOR.full:
+            # Refuse before the 200 and event-stream headers go out
+            raise Overloaded(EXECUTOR.retry_after())
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+
+        if cached is not None:
+            self.send_event('result', self.response_body(scheduler, cached))
+            return
+
+        connected = [True]
+
+        def on_solution(response: ScheduleResponse):
+            connected[0] = self.send_event('solution', response.to_dict())
+            return connected[0]
+
+        # A search cut short by the client is not a result worth reusing
+        try:
+            result, stats = self.solve_and_cache(scheduler, key, on_solution, keep=lambda: connected[0])
+        except Overloaded as e:
+            # Lost the race for the last free slot
+            self.send_event('error', {"error": str(e), "retry_after": e.retry_after})
+            return
+        if connected[0]:
+            self.send_event('result', self.response_body(scheduler, result, stats))
+
+    def send_event(self, event: str, payload) -> bool:
+        """Write one SSE frame; returns False once the client has gone away."""
+        try:
+            self.wfile.write(f"event: {event}\ndata: {json.dumps(payload)}\n\n".encode())
+            self.wfile.flush()
+            return True
+        except (BrokenPipeError, ConnectionResetError):
+            return False
+
+    def body_lines(self):
+        """Yield the request body line by line, bounded by Content-Length."""
+        remaining = int(self.headers.get('Content-Length') or 0)
+        while remaining > 0:
+            line = self.rfile.readline(min(remaining, MAX_IMPORT_LINE + 1))
+            if not line:
+                break
+            remaining -= len(line)
+            if len(line) > MAX_IMPORT_LINE and not line.endswith(b'\n'):
+                raise ValueError(f"Import line longer than {MAX_IMPORT_LINE} bytes")
+            yield line
+
+    def dataset_target(self):
+        """(dataset id, query) of a /api/datasets/{id} path."""
+        path, _, query = self.path.partition('?')
+        dataset_id = path[len('/api/datasets/'):]
+        if not dataset_id or '/' in dataset_id:
+            raise DatasetNotFound(f"Unknown dataset: {dataset_id}")
+        return dataset_id, parse_qs(query)
+
+    def handle_schedule_get(self):
+        """Slices and exports of a solved schedule.
+
+        /api/schedules/{id} summarizes it; /api/schedules/{id}/{kind}/{key}
+        lists the sessions of one teacher, room, class or day in slot order;
+        /api/schedules/{id}/export?format=arrow|parquet streams it (or the
+        slice named by a teacher=, room=, class= or day= parameter) as Arrow
+        IPC or Parquet.
+        """
+        path, _, query = self.path.partition('?')
+        parts = [unquote(p) for p in path[len('/api/schedules/'):].split('/')]
+        schedule = self.indexed_schedule(parts[0])
+        if len(parts) == 1:
+            self.send_json({"id": parts[0], **schedule.summary()})
+        elif len(parts) == 3 and parts[1] in KINDS:
+            rows = schedule.rows(parts[1], parts[2])
+            self.send_json({"id": parts[0], parts[1]: parts[2], "schedule": schedule.records(rows)})
+        elif len(parts) == 2 and parts[1] == 'export':
+            params = parse_qs(query)
+            fmt = params.get('format', ['arrow'])[0]
+            if fmt not in EXPORT_FORMATS:
+                raise ValueError(f"Unknown export format: {fmt}")
+            slices = [kind for kind in KINDS if kind in params]
+            if len(slices) > 1:
+                raise ValueError("Export takes at most one of teacher, room, class and day")
+            rows = schedule.rows(slices[0], params[slices[0]][0]) if slices else None
+            with self.phase('serialize'):
+                body = schedule.export(fmt, rows)
             self.send_response(200)
-            self.send_header('Content-Type', ctype)
-            self.send_header('Content-Length', str(len(content)))
+            self.send_header('Content-Type', EXPORT_FORMATS[fmt])
+            self.send_header('Content-Length', str(body.size))
             self.end_headers()
-            self.wfile.write(content)
-        except Exception as e:
-            self.send_error(500, str(e))
+            # Written straight from Arrow's buffer
+            self.wfile.write(memoryview(body))
+        else:
+            self.send_json({"error": "Unknown schedule query"}, 404)
+
+    def indexed_schedule(self, result_id: str):
+        schedule = SCHEDULES.get(result_id)
+        if schedule is None:
+            # Solved before this process started (disk tier) or evicted from
+            # the store: no time slots, so no day index
+            result = RESULT_CACHE.get(result_id) if result_id else None
+            if result is None or result.status not in ("OPTIMAL", "FEASIBLE"):
+                raise ScheduleNotFound(f"Unknown schedule: {result_id}")
+            SCHEDULES.put(result_id, result.schedule, [])
+            schedule = SCHEDULES.get(result_id)
+        return schedule
+
+    def handle_dataset_create(self):
+        content_type = (self.headers.get('Content-Type') or '').split(';')[0].strip()
+        with self.phase('parse'):
+            if content_type in ('application/x-ndjson', 'application/jsonl'):
+                school = school_from_records(jsonl_records(self.body_lines()))
+            elif content_type == 'text/csv':
+                school = school_from_records(csv_records(self.body_lines()))
+            else:
+                school = school_from_dict(self.read_json())
+        dataset_id, version = DATASETS.create(school)
+        self.send_json({"id": dataset_id, **version.summary()}, 201)
+
+    def handle_dataset_get(self):
+        dataset_id, query = self.dataset_target()
+        version = query.get('version', [None])[0]
+        dataset = DATASETS.get(dataset_id, int(version) if version else None)
+        body = {"id": dataset_id, "versions": DATASETS.versions(dataset_id), **dataset.summary()}
+        if query.get('full', ['0'])[0] not in ('0', ''):
+            body["school"] = school_to_dict(dataset.school)
+        self.send_json(body)
+
+    def handle_dataset_patch(self, data):
+        dataset_id, _ = self.dataset_target()
+        if not isinstance(data, dict):
+            raise ValueError("Expected a JSON object")
+        data = dict(data)
+        base_version = data.pop('base_version', None)
+        version = DATASETS.patch(dataset_id, data, base_version)
+        self.send_json({"id": dataset_id, **version.summary()})
+
+    def handle_dataset_delete(self):
+        dataset_id, _ = self.dataset_target()
+        DATASETS.delete(dataset_id)
+        self.send_empty(204)
+
+    def serve_file(self, filepath):
+        asset = ASSETS.get(filepath)
+        if asset is None:
+            self.send_error(404, "File not found")
+            return
+
+        cache_control = 'no-cache' if filepath.endswith('.html') else f'public, max-age={STATIC_MAX_AGE}'
+        if_none_match = self.headers.get('If-None-Match', '')
+        if asset.etag in (tag.strip().removeprefix('W/') for tag in if_none_match.split(',')) or if_none_match == '*':
+            self.send_response(304)
+            self.send_header('ETag', asset.etag)
+            self.send_header('Cache-Control', cache_control)
+            self.end_headers()
+            return
+
+        encoding, body = asset.negotiate(self.headers.get('Accept-Encoding', ''))
+        self.send_response(200)
+        self.send_header('Content-Type', asset.content_type)
+        self.send_header('Content-Length', str(len(body)))
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        self.send_header('Vary', 'Accept-Encoding')
+        self.send_header('ETag', asset.etag)
+        self.send_header('Cache-Control', cache_control)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_empty(self, status, headers=None):
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
 
 def run(server_class=ThreadingHTTPServer, handler_class=SchedulerHandler, port=8000):
     server_address = ('', port)
     httpd = server_class(server_address, handler_class)
+    ASSETS.preload('static')
     print(f"Starting server on port {port}...")
-    httpd.serve_forever()
+    # Exit through the finally below on SIGTERM too, so solver processes
+    # are not left behind
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        httpd.serve_forever()
+    finally:
+        httpd.server_close()
+        EXECUTOR.shutdown()
 
 if __name__ == "__main__":
-    run()
+    run(port=int(os.environ.get('SCHEDULER_PORT', 8000)))
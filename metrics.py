@@ -0,0 +1,141 @@
+"""
+Minimal Prometheus instrumentation for the scheduler server.
+
+Counters, gauges and histograms with optional labels, rendered in the
+Prometheus text exposition format by `REGISTRY.render()`.
+"""
+import threading
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Request and solve latencies range from milliseconds (cache hits) to minutes
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, doc: str, labels: Sequence[str] = (),
+                 function: Optional[Callable[[], object]] = None):
+        self.name = name
+        self.doc = doc
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+        # Values owned elsewhere (e.g. cache stats) are read at scrape time:
+        # `function` returns a number, or {label values tuple: number} when
+        # the metric has labels.
+        self._function = function
+
+    def set_function(self, function: Callable[[], object]):
+        self._function = function
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(n, '')) for n in self.labels)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+    def _samples(self) -> List[str]:
+        if self._function is not None:
+            values = self._function()
+            if not self.labels:
+                values = {(): values}
+        else:
+            with self._lock:
+                values = dict(self._values)
+        return [f"{self.name}{_format_labels(self.labels, k)} {v}" for k, v in sorted(values.items())]
+
+    def _add(self, amount: float, labels: Dict[str, str]):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        self._add(amount, labels)
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def inc(self, amount: float = 1, **labels):
+        self._add(amount, labels)
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def dec(self, amount: float = 1, **labels):
+        self._add(-amount, labels)
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, doc, labels=(), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, doc, labels)
+        self.buckets = tuple(sorted(buckets))
+        self._counts = {}  # label key -> [count per bucket..., +Inf]
+        self._sums = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts = self._counts.setdefault(key, [0] * (len(self.buckets) + 1))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+            self._sums[key] = self._sums.get(key, 0.0) + value
+
+    def _samples(self):
+        lines = []
+        with self._lock:
+            for key, counts in sorted(self._counts.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + ('+Inf',), counts):
+                    cumulative += count
+                    le = 'le="%s"' % bound
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {self._sums[key]}")
+                lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {cumulative}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+REGISTRY = Registry()
+
+REQUESTS = REGISTRY.register(Counter(
+    'scheduler_requests_total', 'HTTP API requests by endpoint and response code', ('endpoint', 'code')))
+REQUEST_LATENCY = REGISTRY.register(Histogram(
+    'scheduler_request_duration_seconds', 'End-to-end API request latency', ('endpoint',)))
+PHASE_LATENCY = REGISTRY.register(Histogram(
+    'scheduler_phase_duration_seconds', 'Time spent per solve phase', ('phase',)))
+SOLVES = REGISTRY.register(Counter(
+    'scheduler_solves_total', 'Completed solves by result status', ('status',)))
+SOLVES_IN_FLIGHT = REGISTRY.register(Gauge(
+    'scheduler_solves_in_flight', 'Solves currently running'))
+QUEUE_DEPTH = REGISTRY.register(Gauge(
+    'scheduler_solve_queue_depth', 'Solves waiting for a free solver slot'))
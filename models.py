@@ -1,80 +1,286 @@
+import sys
 from dataclasses import dataclass, field, asdict
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Sequence
 
-@dataclass
+def _intern(value):
+    # Ids and subjects repeat across entities and schedules; interned they
+    # are stored once and compare by identity
+    return sys.intern(value) if isinstance(value, str) else value
+
+@dataclass(slots=True)
 class Teacher:
     id: str
     name: str
     qualifications: List[str]
+    # Ids of the time slots the teacher cannot teach
+    unavailable: List[str] = field(default_factory=list)
 
     @staticmethod
     def from_dict(d: Dict[str, Any]):
         return Teacher(
-            id=d['id'],
+            id=_intern(d['id']),
             name=d['name'],
-            qualifications=d.get('qualifications', [])
+            qualifications=[_intern(q) for q in d.get('qualifications', [])],
+            unavailable=[_intern(s) for s in d.get('unavailable', [])]
         )
 
-@dataclass
+@dataclass(slots=True)
 class Room:
     id: str
     name: str
     capacity: int
+    # e.g. "lab" or "gym"; only classes asking for this type may use it
+    room_type: Optional[str] = None
+    # Ids of the time slots the room cannot be used
+    unavailable: List[str] = field(default_factory=list)
 
     @staticmethod
     def from_dict(d: Dict[str, Any]):
         return Room(
-            id=d['id'],
+            id=_intern(d['id']),
             name=d['name'],
-            capacity=int(d['capacity'])
+            capacity=int(d['capacity']),
+            room_type=_intern(d.get('room_type')),
+            unavailable=[_intern(s) for s in d.get('unavailable', [])]
         )
 
-@dataclass
+@dataclass(slots=True)
 class SchoolClass:
     id: str
     name: str
     subject: str
     required_sessions: int = 1
     teacher_id: Optional[str] = None
+    # Number of students; 0 when unknown (fits any room)
+    enrollment: int = 0
+    # Room type the class needs; None for an ordinary (untyped) room
+    room_type: Optional[str] = None
 
     @staticmethod
     def from_dict(d: Dict[str, Any]):
+        enrollment = int(d.get('enrollment') or 0)
+        if enrollment < 0:
+            raise ValueError("enrollment must not be negative")
         return SchoolClass(
-            id=d['id'],
+            id=_intern(d['id']),
             name=d['name'],
-            subject=d['subject'],
+            subject=_intern(d['subject']),
             required_sessions=int(d.get('required_sessions', 1)),
-            teacher_id=d.get('teacher_id')
+            teacher_id=_intern(d.get('teacher_id')),
+            enrollment=enrollment,
+            room_type=_intern(d.get('room_type'))
         )
 
-@dataclass
+    def can_be_taught_by(self, t: Teacher) -> bool:
+        # Qualification check plus teacher pre-assignment
+        return self.subject in t.qualifications and (not self.teacher_id or self.teacher_id == t.id)
+
+    def can_use_room(self, r: Room) -> bool:
+        # Room type must match (untyped classes take untyped rooms) and the
+        # class must fit
+        return self.room_type == r.room_type and self.enrollment <= r.capacity
+
+@dataclass(slots=True)
 class TimeSlot:
     id: str
     day: str
     period: int
+    # No class may meet in a blocked slot (assemblies, lunch)
+    blocked: bool = False
 
     @staticmethod
     def from_dict(d: Dict[str, Any]):
         return TimeSlot(
-            id=d['id'],
-            day=d['day'],
-            period=int(d['period'])
+            id=_intern(d['id']),
+            day=_intern(d['day']),
+            period=int(d['period']),
+            blocked=bool(d.get('blocked', False))
+        )
+
+@dataclass(slots=True)
+class SolverOptions:
+    # "cube": one BoolVar per (class, teacher, room, slot)
+    # "factorized": separate teacher, slot and room layers linked by channeling
+    formulation: str = "cube"
+    # Give every variable a descriptive name (slower to build, for debugging)
+    name_vars: bool = False
+    # Search budget; None leaves the CP-SAT default (or the server default)
+    time_limit: Optional[float] = None
+    num_workers: Optional[int] = None
+    relative_gap: Optional[float] = None
+    stop_at_first_solution: bool = False
+    # How to treat a previous schedule passed for an incremental re-solve:
+    # "none" only uses it as a solution hint, "penalize" minimizes the number
+    # of changed assignments, "fix" keeps still-valid assignments in place.
+    disruption: str = "none"
+    # Run the cheap analysis pass before building the model
+    precheck: bool = True
+    # On INFEASIBLE, extract a minimal set of conflicting constraint groups
+    # via assumption literals (costs extra solves)
+    explain: bool = False
+    # Split independent groups of classes/teachers/rooms into separate models
+    decompose: bool = False
+    # Pool interchangeable rooms and order interchangeable slots
+    symmetry: bool = True
+    # Attach phase timings, model size and CP-SAT search statistics
+    stats: bool = False
+    # Soft objective: minimize how often a class meets more than once a day
+    spread: bool = False
+    # Large Neighborhood Search: take a first solution, then repeatedly
+    # re-solve small groups of classes with everything else fixed until
+    # time_limit runs out or lns_stall neighborhoods in a row bring no
+    # improvement. Needs an objective (spread or disruption="penalize").
+    lns: bool = False
+    # Classes freed per neighborhood
+    lns_neighborhood: int = 20
+    lns_stall: int = 50
+    # Let classes get fewer than required_sessions. A missed session costs
+    # more than the rest of the objective, so sessions are only dropped when
+    # they cannot be placed (term exception weeks, see term.py).
+    missed_sessions: bool = False
+
+    FORMULATIONS = ("cube", "factorized")
+    DISRUPTION_MODES = ("none", "penalize", "fix")
+
+    @staticmethod
+    def from_dict(d: Dict[str, Any]):
+        formulation = d.get('formulation', 'cube')
+        if formulation not in SolverOptions.FORMULATIONS:
+            raise ValueError(f"Unknown formulation: {formulation}")
+        time_limit = _optional(d, 'time_limit', float)
+        num_workers = _optional(d, 'num_workers', int)
+        relative_gap = _optional(d, 'relative_gap', float)
+        if time_limit is not None and time_limit <= 0:
+            raise ValueError("time_limit must be positive")
+        if num_workers is not None and num_workers < 1:
+            raise ValueError("num_workers must be at least 1")
+        if relative_gap is not None and relative_gap < 0:
+            raise ValueError("relative_gap must not be negative")
+        disruption = d.get('disruption', 'none')
+        if disruption not in SolverOptions.DISRUPTION_MODES:
+            raise ValueError(f"Unknown disruption mode: {disruption}")
+        lns_neighborhood = int(d.get('lns_neighborhood', 20))
+        lns_stall = int(d.get('lns_stall', 50))
+        if lns_neighborhood < 1:
+            raise ValueError("lns_neighborhood must be at least 1")
+        if lns_stall < 1:
+            raise ValueError("lns_stall must be at least 1")
+        missed_sessions = bool(d.get('missed_sessions', False))
+        if missed_sessions and d.get('lns'):
+            raise ValueError("lns cannot be combined with missed_sessions")
+        return SolverOptions(
+            formulation=formulation,
+            name_vars=bool(d.get('name_vars', False)),
+            time_limit=time_limit,
+            num_workers=num_workers,
+            relative_gap=relative_gap,
+            stop_at_first_solution=bool(d.get('stop_at_first_solution', False)),
+            disruption=disruption,
+            precheck=bool(d.get('precheck', True)),
+            explain=bool(d.get('explain', False)),
+            decompose=bool(d.get('decompose', False)),
+            symmetry=bool(d.get('symmetry', True)),
+            stats=bool(d.get('stats', False)),
+            spread=bool(d.get('spread', False)),
+            lns=bool(d.get('lns', False)),
+            lns_neighborhood=lns_neighborhood,
+            lns_stall=lns_stall,
+            missed_sessions=missed_sessions
         )
 
-@dataclass
+def _optional(d: Dict[str, Any], key: str, cast):
+    value = d.get(key)
+    return None if value is None else cast(value)
+
+@dataclass(slots=True)
 class ScheduledClass:
     class_id: str
     teacher_id: str
     room_id: str
     time_slot_id: str
 
-@dataclass
+    @staticmethod
+    def from_dict(d: Dict[str, Any]):
+        return ScheduledClass(
+            class_id=_intern(d['class_id']),
+            teacher_id=_intern(d['teacher_id']),
+            room_id=_intern(d['room_id']),
+            time_slot_id=_intern(d['time_slot_id'])
+        )
+
+@dataclass(slots=True)
+class Conflict:
+    kind: str
+    message: str
+    # Offending entity ids by type: {"classes": [...], "teachers": [...], ...}
+    entities: Dict[str, List[str]] = field(default_factory=dict)
+
+    def to_dict(self):
+        return {"kind": self.kind, "message": self.message, "entities": self.entities}
+
+    @staticmethod
+    def from_dict(d: Dict[str, Any]):
+        return Conflict(kind=d['kind'], message=d['message'], entities=d.get('entities', {}))
+
+@dataclass(slots=True)
 class ScheduleResponse:
     status: str
-    schedule: List[ScheduledClass]
+    # A list, or a compact.ColumnarSchedule when produced by the solver
+    schedule: Sequence[ScheduledClass]
+    # True when the search stopped on the time limit rather than by proving
+    # optimality/infeasibility. None when the solver never ran.
+    budget_exhausted: Optional[bool] = None
+    wall_time: Optional[float] = None
+    # Objective value and best bound at the time the response was produced
+    objective: Optional[float] = None
+    bound: Optional[float] = None
+    # Server-side handle that later requests can pass as previous_id
+    result_id: Optional[str] = None
+    # Why an INFEASIBLE input is infeasible, when that could be determined
+    conflicts: Optional[List[Conflict]] = None
+    # Instrumentation, only when requested via SolverOptions.stats:
+    # {"phases": {name: seconds}, "model": {...}, "solver": {...}}
+    stats: Optional[Dict[str, Any]] = None
+    # LNS only: every improvement as {"time", "objective", "neighborhood"}
+    trajectory: Optional[List[Dict[str, Any]]] = None
 
     def to_dict(self):
-        return {
+        d = {
             "status": self.status,
-            "schedule": [asdict(s) for s in self.schedule]
+            # Columnar schedules (see compact.py) serialize without building rows
+            "schedule": self.schedule.to_dicts() if hasattr(self.schedule, 'to_dicts')
+                        else [asdict(s) for s in self.schedule]
         }
+        # Optional fields are only emitted when set
+        if self.budget_exhausted is not None:
+            d["budget_exhausted"] = self.budget_exhausted
+        if self.wall_time is not None:
+            d["wall_time"] = self.wall_time
+        if self.objective is not None:
+            d["objective"] = self.objective
+        if self.bound is not None:
+            d["bound"] = self.bound
+        if self.result_id is not None:
+            d["result_id"] = self.result_id
+        if self.conflicts is not None:
+            d["conflicts"] = [c.to_dict() for c in self.conflicts]
+        if self.stats is not None:
+            d["stats"] = self.stats
+        if self.trajectory is not None:
+            d["trajectory"] = self.trajectory
+        return d
+
+    @staticmethod
+    def from_dict(d: Dict[str, Any]):
+        return ScheduleResponse(
+            status=d['status'],
+            schedule=[ScheduledClass.from_dict(s) for s in d.get('schedule', [])],
+            budget_exhausted=d.get('budget_exhausted'),
+            wall_time=d.get('wall_time'),
+            objective=d.get('objective'),
+            bound=d.get('bound'),
+            result_id=d.get('result_id'),
+            conflicts=[Conflict.from_dict(c) for c in d['conflicts']] if 'conflicts' in d else None,
+            stats=d.get('stats'),
+            trajectory=d.get('trajectory')
+        )
@@ -0,0 +1,95 @@
+"""
+What-if scenarios: variants of a school described as deltas on a base.
+
+A delta adds, removes or modifies entities by kind:
+
+    {
+        "add":    {"teachers": [{"id": "t9", "name": "New hire", "qualifications": ["Math"]}]},
+        "remove": {"rooms": ["r204"]},
+        "modify": {"classes": [{"id": "c3", "required_sessions": 4}]}
+    }
+
+Applying a delta never touches the base; entities it does not mention are
+shared between the base and every variant.
+"""
+from dataclasses import asdict
+from typing import Any, Dict, List, Sequence, Tuple
+from models import Teacher, Room, SchoolClass, TimeSlot, ScheduledClass
+
+School = Tuple[List[Teacher], List[Room], List[SchoolClass], List[TimeSlot]]
+
+# Delta keys, in School order
+KINDS = (("teachers", Teacher), ("rooms", Room), ("classes", SchoolClass), ("time_slots", TimeSlot))
+
+def _check_delta(delta: Any):
+    # Shape only: a dict of ops, each a dict of kind -> list; ids and
+    # entity fields are checked while applying
+    if not isinstance(delta, dict):
+        raise ValueError("A delta must be an object")
+    for op in ("add", "remove", "modify"):
+        entries = delta.get(op)
+        if entries is None:
+            continue
+        if not isinstance(entries, dict):
+            raise ValueError(f"'{op}' must be an object of entity lists by kind")
+        unknown = set(entries) - {kind for kind, _ in KINDS}
+        if unknown:
+            raise ValueError(f"Unknown entity kind in '{op}': {', '.join(sorted(unknown))}")
+        for kind, items in entries.items():
+            if not isinstance(items, list):
+                raise ValueError(f"'{op}.{kind}' must be a list")
+            for item in items:
+                if op == "remove" and not isinstance(item, str):
+                    raise ValueError(f"'remove.{kind}' must list ids")
+                if op != "remove" and not isinstance(item, dict):
+                    raise ValueError(f"'{op}.{kind}' must list objects")
+                if op == "modify" and not isinstance(item.get("id"), str):
+                    raise ValueError(f"Every 'modify.{kind}' entry needs an id")
+
+def _entity(cls, d: Dict[str, Any]):
+    try:
+        return cls.from_dict(d)
+    except (KeyError, TypeError) as e:
+        raise ValueError(f"Invalid {cls.__name__} in scenario: {e!r}")
+
+def apply_delta(school: School, delta: Dict[str, Any]) -> School:
+    """The school with `delta` applied. Raises ValueError on a malformed
+    delta or on unknown or duplicate ids."""
+    _check_delta(delta)
+
+    result = []
+    for (kind, cls), entities in zip(KINDS, school):
+        removed = set((delta.get("remove") or {}).get(kind, []))
+        changes = {d["id"]: d for d in (delta.get("modify") or {}).get(kind, [])}
+        existing = {e.id for e in entities}
+        for entity_id in (removed | set(changes)) - existing:
+            raise ValueError(f"Unknown {kind} id in scenario: {entity_id}")
+
+        variant = []
+        for e in entities:
+            if e.id in removed:
+                continue
+            if e.id in changes:
+                e = _entity(cls, {**asdict(e), **changes[e.id]})
+            variant.append(e)
+        ids = existing - removed
+        for d in (delta.get("add") or {}).get(kind, []):
+            e = _entity(cls, d)
+            if e.id in ids:
+                raise ValueError(f"Duplicate {kind} id in scenario: {e.id}")
+            ids.add(e.id)
+            variant.append(e)
+        result.append(variant)
+    return tuple(result)
+
+def diff_schedules(base: Sequence[ScheduledClass], other: Sequence[ScheduledClass]) -> Dict[str, Any]:
+    """Assignments added and removed going from `base` to `other`."""
+    before = {(a.class_id, a.teacher_id, a.room_id, a.time_slot_id) for a in base}
+    after = {(a.class_id, a.teacher_id, a.room_id, a.time_slot_id) for a in other}
+    added, removed = sorted(after - before), sorted(before - after)
+    return {
+        "added": [asdict(ScheduledClass(*a)) for a in added],
+        "removed": [asdict(ScheduledClass(*a)) for a in removed],
+        "unchanged": len(before & after),
+        "changed_classes": sorted({a[0] for a in added} | {a[0] for a in removed}),
+    }
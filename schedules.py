@@ -0,0 +1,212 @@
+"""
+Solved schedules held server-side, indexed for slice queries and export.
+
+IndexedSchedule keeps a schedule as the solver's columnar arrays (see
+compact.py) and builds, on first use, one row index per teacher, room,
+class and day. Each index lists rows in slot order. A query then reads only
+the rows it returns, not the whole schedule.
+
+Export writes Arrow IPC streams or Parquet files. The id columns are
+dictionary-encoded: their indices are the schedule's own integer arrays,
+handed to Arrow without copying. pyarrow is optional; without it export
+raises ExportUnavailable.
+"""
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence
+from compact import ColumnarSchedule, Interner
+from models import ScheduledClass, TimeSlot
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+# Query kind -> column holding its key
+KINDS = ("teacher", "room", "class", "day")
+
+EXPORT_FORMATS = {
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+class ScheduleNotFound(LookupError):
+    """Unknown result id, or a schedule no longer kept."""
+
+class ExportUnavailable(RuntimeError):
+    """pyarrow is not installed."""
+
+class IndexedSchedule:
+    """A solved schedule with row indexes by teacher, room, class and day.
+
+    Days and periods come from `time_slots`. Without them, slots keep their
+    input order and the day index is empty.
+    """
+    def __init__(self, schedule: Sequence[ScheduledClass], time_slots: Optional[Sequence[TimeSlot]] = None):
+        if not isinstance(schedule, ColumnarSchedule):
+            schedule = _columnar(schedule, time_slots)
+        self.schedule = schedule
+        slot_of = {s.id: s for s in time_slots or []}
+        days = Interner()
+        # Per slot number: day number (-1 if unknown), period and position
+        # in the week
+        self.slot_day = array('i')
+        self.slot_period = array('i')
+        position = {s.id: i for i, s in enumerate(time_slots or [])}
+        slot_pos = []
+        for n, slot_id in enumerate(schedule.slots):
+            s = slot_of.get(slot_id)
+            self.slot_day.append(days.add(s.day) if s else -1)
+            self.slot_period.append(s.period if s else 0)
+            slot_pos.append(position.get(slot_id, len(position) + n))
+        self.days = days
+        # All rows in slot order; every index keeps this order
+        self.order = array('i', sorted(range(len(schedule)), key=lambda row: slot_pos[schedule.slot_col[row]]))
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.schedule)
+
+    def _column(self, kind: str):
+        s = self.schedule
+        if kind == "day":
+            slot_day = self.slot_day
+            return [slot_day[n] for n in s.slot_col], self.days.ids
+        return {"teacher": (s.teacher_col, s.teachers), "room": (s.room_col, s.rooms),
+                "class": (s.class_col, s.classes)}[kind]
+
+    def index(self, kind: str) -> Dict[str, array]:
+        """Key id -> rows (in slot order) for one query kind; built once."""
+        if kind not in KINDS:
+            raise ValueError(f"Unknown schedule index: {kind}")
+        index = self._indexes.get(kind)
+        if index is None:
+            with self._lock:
+                index = self._indexes.get(kind)
+                if index is None:
+                    col, ids = self._column(kind)
+                    buckets = {}
+                    for row in self.order:
+                        key = col[row]
+                        if key >= 0:
+                            buckets.setdefault(key, array('i')).append(row)
+                    index = self._indexes[kind] = {ids[key]: rows for key, rows in buckets.items()}
+        return index
+
+    def rows(self, kind: str, key: str) -> array:
+        return self.index(kind).get(key, array('i'))
+
+    def records(self, rows: Optional[Sequence[int]] = None) -> List[dict]:
+        """Rows as JSON objects, with day and period when the slots are known."""
+        s = self.schedule
+        classes, teachers, rooms, slots, days = s.classes, s.teachers, s.rooms, s.slots, self.days.ids
+        out = []
+        for row in self.order if rows is None else rows:
+            n = s.slot_col[row]
+            record = {"class_id": classes[s.class_col[row]], "teacher_id": teachers[s.teacher_col[row]],
+                      "room_id": rooms[s.room_col[row]], "time_slot_id": slots[n]}
+            if self.slot_day[n] >= 0:
+                record["day"] = days[self.slot_day[n]]
+                record["period"] = self.slot_period[n]
+            out.append(record)
+        return out
+
+    def summary(self) -> dict:
+        """Session counts per teacher, room, class and day."""
+        return {"sessions": len(self), **{kind: {key: len(rows) for key, rows in self.index(kind).items()}
+                                         for kind in KINDS}}
+
+    def to_arrow(self, rows: Optional[Sequence[int]] = None):
+        """A pyarrow Table of the schedule (or of `rows`), in slot order."""
+        if pa is None:
+            raise ExportUnavailable("Arrow export needs pyarrow")
+        s = self.schedule
+        n_rows = len(s)
+
+        def ints(values: array, length: int):
+            # Zero-copy view of an int array
+            return pa.Array.from_buffers(pa.int32(), length, [None, pa.py_buffer(values)])
+
+        def ids(col: array, table: List[str]):
+            return pa.DictionaryArray.from_arrays(ints(col, n_rows), pa.array(table, pa.string()))
+
+        columns = {
+            "class_id": ids(s.class_col, s.classes),
+            "teacher_id": ids(s.teacher_col, s.teachers),
+            "room_id": ids(s.room_col, s.rooms),
+            "time_slot_id": ids(s.slot_col, s.slots),
+        }
+        if self.days.ids:
+            slot_day, slot_period = self.slot_day, self.slot_period
+            columns["day"] = ids(array('i', (slot_day[n] for n in s.slot_col)), self.days.ids)
+            columns["period"] = ints(array('i', (slot_period[n] for n in s.slot_col)), n_rows)
+        table = pa.table(columns)
+        selected = self.order if rows is None else array('i', rows)
+        return table.take(ints(selected, len(selected)))
+
+    def export(self, fmt: str, rows: Optional[Sequence[int]] = None):
+        """Arrow IPC stream or Parquet file bytes, as a pyarrow Buffer."""
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"Unknown export format: {fmt}")
+        table = self.to_arrow(rows)
+        sink = pa.BufferOutputStream()
+        if fmt == "parquet":
+            pq.write_table(table, sink)
+        else:
+            with pa.ipc.new_stream(sink, table.schema) as writer:
+                writer.write_table(table)
+        return sink.getvalue()
+
+def _columnar(schedule: Sequence[ScheduledClass], time_slots: Optional[Sequence[TimeSlot]]) -> ColumnarSchedule:
+    classes, teachers, rooms = Interner(), Interner(), Interner()
+    # Slot numbers follow the week when it is known
+    slots = Interner(s.id for s in time_slots or [])
+    columnar = ColumnarSchedule(classes.ids, teachers.ids, rooms.ids, slots.ids)
+    for a in schedule:
+        columnar.append(classes.add(a.class_id), teachers.add(a.teacher_id), rooms.add(a.room_id),
+                        slots.add(a.time_slot_id))
+    return columnar
+
+class ScheduleStore:
+    """Recently solved schedules by result id, indexed lazily.
+
+    Holds references to schedules the result cache already keeps, plus
+    their time slots, for at most `max_entries` ids (least recently used
+    out first).
+    """
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # result id -> (schedule, time slots, IndexedSchedule or None)
+        self._lock = threading.Lock()
+
+    def put(self, result_id: str, schedule: Sequence[ScheduledClass], time_slots: Sequence[TimeSlot]):
+        with self._lock:
+            entry = self._entries.get(result_id)
+            if entry is not None and entry[0] is schedule:
+                self._entries.move_to_end(result_id)
+                return
+            self._entries[result_id] = (schedule, time_slots, None)
+            self._entries.move_to_end(result_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, result_id: str) -> Optional[IndexedSchedule]:
+        with self._lock:
+            entry = self._entries.get(result_id)
+            if entry is None:
+                return None
+            self._entries.move_to_end(result_id)
+            schedule, time_slots, indexed = entry
+        if indexed is None:
+            # Built outside the lock; a concurrent first query may build it twice
+            indexed = IndexedSchedule(schedule, time_slots)
+            with self._lock:
+                if result_id in self._entries:
+                    self._entries[result_id] = (schedule, time_slots, indexed)
+        return indexed
+
+    def __len__(self) -> int:
+        return len(self._entries)
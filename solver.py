@@ -1,110 +1,1011 @@
+import random
+import time
+from array import array
+from bisect import bisect_left
+from contextlib import contextmanager
+from dataclasses import replace
+from itertools import compress, cycle
 from ortools.sat.python import cp_model
-from typing import List, Dict, Tuple
-from models import Teacher, Room, SchoolClass, TimeSlot, ScheduleResponse, ScheduledClass
+from typing import List, Dict, Tuple, Optional, Callable, Any, Sequence
+from models import Teacher, Room, SchoolClass, TimeSlot, ScheduleResponse, ScheduledClass, SolverOptions, Conflict
+from analysis import analyze, slot_masks
+from compact import Interner, ColumnarSchedule
+from templates import ModelTemplate, TemplateCache, skeleton_key
+
+# What a model variable stands for (SchoolScheduler.var_kind)
+OTHER, ASSIGN, SLOT, TEACH, ROOM = range(5)
+
+# LNS: total budget when options.time_limit is unset, and the most any one
+# neighborhood may take
+LNS_TIME_LIMIT = 30.0
+LNS_STEP_TIME = 2.0
+
+class ScheduleSolutionCallback(cp_model.CpSolverSolutionCallback):
+    """Reports every improving solution found while CP-SAT is still searching.
+
+    `on_solution` receives a FEASIBLE ScheduleResponse carrying the current
+    objective and bound; returning False from it stops the search.
+    """
+    def __init__(self, scheduler: 'SchoolScheduler', on_solution: Callable[[ScheduleResponse], Optional[bool]]):
+        super().__init__()
+        self.scheduler = scheduler
+        self.on_solution = on_solution
+        self.solution_count = 0
+
+    def on_solution_callback(self):
+        self.solution_count += 1
+        response = ScheduleResponse(
+            status="FEASIBLE",
+            schedule=self.scheduler._extract(self.response_proto.solution),
+            wall_time=self.WallTime(),
+            objective=self.ObjectiveValue(),
+            bound=self.BestObjectiveBound()
+        )
+        if self.on_solution(response) is False:
+            self.StopSearch()
 
 class SchoolScheduler:
-    def __init__(self, teachers: List[Teacher], rooms: List[Room], classes: List[SchoolClass], time_slots: List[TimeSlot]):
+    def __init__(self, teachers: List[Teacher], rooms: List[Room], classes: List[SchoolClass], time_slots: List[TimeSlot],
+                 options: Optional[SolverOptions] = None, previous: Optional[List[ScheduledClass]] = None,
+                 templates: Optional[TemplateCache] = None):
         self.teachers = teachers
         self.rooms = rooms
         self.classes = classes
         self.time_slots = time_slots
+        self.options = options or SolverOptions()
+        # Schedule from an earlier solve, used to warm-start this one
+        self.previous = previous or []
+        # Built models to reuse for schools with the same skeleton
+        self.templates = templates
+        # Whether build() found a template (None: templates not used)
+        self.template_hit = None
         
         self.model = cp_model.CpModel()
         self.solver = cp_model.CpSolver()
         
-        # Variables
-        self.assignment_vars = {} # (c.id, t.id, r.id, s.id) -> BoolVar
+        self.built = False
+        # Seconds spent per phase of the last solve()
+        self.timings = {}
 
-    def solve(self) -> ScheduleResponse:
-        # 1. Create Variables
-        # x_c_t_r_s = 1 if class c is assign to teacher t in room r at slot s
+        # Entity ids interned to dense integers; the model, the variable
+        # tables and the result all refer to entities by these numbers.
+        self.class_ids = Interner(c.id for c in classes)
+        self.teacher_ids = Interner(t.id for t in teachers)
+        self.room_ids = Interner(r.id for r in rooms)
+        self.slot_ids = Interner(s.id for s in time_slots)
+
+        # Availability compiled to bitsets over slot numbers (bit s set:
+        # usable at slot s): open (unblocked) slots, then per teacher and
+        # per room number. Variables are only created where all of the
+        # class's teacher, room and slot are available.
+        self.open_mask, self.teacher_masks, self.room_masks = slot_masks(teachers, rooms, time_slots)
+        self._slot_lists = {}  # mask -> slot numbers
+
+        # Variables are written straight into the proto. For every proto
+        # variable index the arrays below record what it stands for, -1
+        # where a dimension does not apply:
+        #   ASSIGN (c, t, r, s) - cube: class c taught by t in room r at s
+        #   SLOT   (c, s)       - factorized: class c meets at slot s
+        #   TEACH  (c, t, s)    - factorized: teacher t teaches c at s
+        #   ROOM   (c, r, s)    - factorized: class c sits in room r at s
+        self.var_kind = array('b')
+        self.var_class = array('i')
+        self.var_teacher = array('i')
+        self.var_room = array('i')
+        self.var_slot = array('i')
+        # Per class number: (first variable index, end of the block,
+        # {teacher number: local position}, {room number: local position}).
+        # Pruning leaves gaps, so variables are found by binary search over
+        # the block, which is sorted by _var_key.
+        self.layout = {}
+        # Per class number: index of its required-sessions constraint
+        self.session_constraints = {}
+
+        # Assumption literals guarding each entity's constraints (explain mode)
+        self.guards = {}     # (kind, id) -> literal index
+
+        # Interchangeable rooms are modelled as one pooled resource, keyed by
+        # the group's first room; concrete rooms are assigned after solving.
+        self.room_groups = {}    # representative r.id -> [Room]
+        self.room_group_of = {}  # r.id -> representative r.id
+
+        # When this model is an LNS sub-problem: resources held by the
+        # classes outside the neighborhood, as (teacher number, slot number)
+        # and (room-group representative number, slot number) -> rooms used
+        self.busy_teachers = set()
+        self.rooms_in_use = {}
+        # Set by stop(); the LNS loop checks it between neighborhoods
+        self.stopped = False
+        self._sub_solver = None
+
+    def _new_bool(self, name: str = '', kind: int = OTHER, c: int = -1, t: int = -1, r: int = -1,
+                  s: int = -1) -> int:
+        var = self.model.Proto().variables.add()
+        var.domain.extend((0, 1))
+        if name:
+            var.name = name
+        self.var_kind.append(kind)
+        self.var_class.append(c)
+        self.var_teacher.append(t)
+        self.var_room.append(r)
+        self.var_slot.append(s)
+        return len(self.var_kind) - 1
+
+    def _new_int(self, lb: int, ub: int) -> int:
+        i = self._new_bool()
+        domain = self.model.Proto().variables[i].domain
+        domain[0], domain[1] = lb, ub
+        return i
+
+    def _slots_in(self, mask: int) -> List[int]:
+        slots = self._slot_lists.get(mask)
+        if slots is None:
+            slots = self._slot_lists[mask] = [s_n for s_n in range(len(self.time_slots)) if mask >> s_n & 1]
+        return slots
+
+    def _qualified_teachers(self, c: SchoolClass) -> List[Teacher]:
+        return [t for t in self.teachers if c.can_be_taught_by(t)]
+
+    def _candidate_rooms(self, c: SchoolClass) -> List[Room]:
+        # One representative per room group
+        return [group[0] for group in self.room_groups.values() if c.can_use_room(group[0])]
+
+    def _group_rooms(self):
+        """Partition rooms into groups that no constraint can tell apart.
+
+        Two rooms are interchangeable when exactly the same classes may use
+        them at the same slots. Without symmetry handling every room is its
+        own group.
+        """
+        groups = {}
+        for r_n, r in enumerate(self.rooms):
+            if self.options.symmetry:
+                signature = (frozenset(c.id for c in self.classes if c.can_use_room(r)), self.room_masks[r_n])
+            else:
+                signature = r.id
+            groups.setdefault(signature, []).append(r)
+        for group in groups.values():
+            self.room_groups[group[0].id] = group
+            for r in group:
+                self.room_group_of[r.id] = group[0].id
+
+    def _slot_groups(self) -> List[List[TimeSlot]]:
+        """Groups of time slots that no constraint can tell apart.
+
+        Open slots at which the same teachers and rooms are available are
+        interchangeable, unless a previous schedule is being preserved or
+        resources are taken at some slots (LNS). The spread objective only
+        leaves slots of the same day interchangeable.
+        """
+        if not self.options.symmetry or (self.previous and self.options.disruption != "none"):
+            return []
+        if self.busy_teachers or self.rooms_in_use:
+            return []
+        groups = {}
+        for s_n, s in enumerate(self.time_slots):
+            if not self.open_mask >> s_n & 1:
+                continue
+            signature = (
+                s.day if self.options.spread else None,
+                tuple(t_n for t_n, m in enumerate(self.teacher_masks) if not m >> s_n & 1),
+                tuple(r_n for r_n, m in enumerate(self.room_masks) if not m >> s_n & 1),
+            )
+            groups.setdefault(signature, []).append(s)
+        return [group for group in groups.values() if len(group) > 1]
+
+    def _days(self) -> Dict[str, List[TimeSlot]]:
+        days = {}
+        for s in self.time_slots:
+            days.setdefault(s.day, []).append(s)
+        return days
+
+    def _add_room_limit(self, indices: List[int], rep_id: str, in_use: int = 0):
+        # A group of k rooms hosts at most k classes per slot, fewer when
+        # classes outside an LNS neighborhood already sit in some of them
+        size = len(self.room_groups[rep_id]) - in_use
+        if len(indices) > size:
+            if size == 1:
+                self._add_at_most_one(indices, self._guard("room", rep_id))
+            else:
+                self._add_linear(indices, 0, max(size, 0), enforce=self._guard("room", rep_id))
+
+    def _add_teacher_limit(self, indices: List[int], t_n: int, s_n: int):
+        # A teacher teaches at most one class per slot, none if busy with a
+        # class outside an LNS neighborhood
+        if (t_n, s_n) in self.busy_teachers:
+            if indices:
+                self._add_linear(indices, 0, 0)
+        elif len(indices) > 1:
+            self._add_at_most_one(indices, self._guard("teacher", self.teacher_ids[t_n]))
+
+    def _add_spread(self, class_slot: List[List[int]]):
+        # Soft constraint: a class meeting n > 1 times on one day costs n - 1.
+        # class_slot holds the literals of class c at slot s at c * S + s.
+        n_slots = len(self.time_slots)
+        days = [[self.slot_ids.index[s.id] for s in day] for day in self._days().values()]
+        excess = []
         for c in self.classes:
-            for t in self.teachers:
-                # Qualification check
-                if c.subject not in t.qualifications:
+            if c.required_sessions < 2:
+                continue
+            c_n = self.class_ids.index[c.id]
+            for day in days:
+                lits = [i for s_n in day for i in class_slot[c_n * n_slots + s_n]]
+                if len(day) < 2 or len(lits) < 2:
                     continue
-                
-                # Teacher Pre-assignment check
-                if c.teacher_id and c.teacher_id != t.id:
+                e = self._new_int(0, len(day) - 1)
+                self._add_linear(lits + [e], -len(day), 1, [1] * len(lits) + [-1])
+                excess.append(e)
+        objective = self.model.Proto().objective
+        objective.vars.extend(excess)
+        objective.coeffs.extend([1] * len(excess))
+
+    def _break_slot_symmetry(self, slot_loads: Dict[str, List[int]]):
+        # Any permutation of interchangeable slots maps a schedule onto
+        # another valid one. Requiring their session counts to be
+        # non-increasing keeps (at least) one schedule of every orbit and
+        # cuts the rest of the search space, notably for infeasibility proofs.
+        for group in self._slot_groups():
+            for a, b in zip(group, group[1:]):
+                before, after = slot_loads.get(a.id, []), slot_loads.get(b.id, [])
+                if before or after:
+                    self._add_linear(before + after, 0, len(after), [1] * len(before) + [-1] * len(after))
+
+    def _guard(self, kind: str, entity_id: str) -> Optional[int]:
+        """Assumption literal enforcing the constraints of one entity.
+
+        Only created in explain mode; None otherwise (unconditional).
+        """
+        if not self.options.explain:
+            return None
+        key = (kind, entity_id)
+        if key not in self.guards:
+            self.guards[key] = self._new_bool(f'guard_{kind}_{entity_id}')
+        return self.guards[key]
+
+    def _add_linear(self, indices: List[int], lb: int, ub: int, coeffs: Optional[List[int]] = None,
+                    enforce: Optional[int] = None) -> int:
+        # Constraints are written straight into the CpModelProto from variable
+        # indices. The Python-side builders (sum(), AddAtMostOne) re-validate
+        # every literal, which dominates build time on large models.
+        constraints = self.model.Proto().constraints
+        ct = constraints.add()
+        if enforce is not None:
+            ct.enforcement_literal.append(enforce)
+        ct.linear.vars.extend(indices)
+        ct.linear.coeffs.extend(coeffs if coeffs is not None else [1] * len(indices))
+        ct.linear.domain.extend((lb, ub))
+        return len(constraints) - 1
+
+    def _add_at_most_one(self, indices: List[int], enforce: Optional[int] = None):
+        if enforce is not None:
+            # at_most_one does not support enforcement literals
+            self._add_linear(indices, 0, 1, enforce=enforce)
+            return
+        self.model.Proto().constraints.add().at_most_one.literals.extend(indices)
+
+    def build(self):
+        """Create variables and constraints for the selected formulation.
+
+        With a template cache the model is copied from a template for the
+        same skeleton (built first if there is none) and only session
+        counts and teacher pre-assignments are applied.
+        """
+        if self.built:
+            return
+        # Explain mode and LNS sub-problems build per-request structure
+        templated = (self.templates is not None and not self.options.explain
+                     and not self.busy_teachers and not self.rooms_in_use)
+        if templated:
+            self._build_from_template()
+        else:
+            self._build_model()
+        if self.previous:
+            self._apply_previous()
+        if self.options.missed_sessions:
+            self._allow_missed_sessions()
+        self.built = True
+
+    def _build_model(self):
+        if not self.room_groups:
+            # LNS sub-problems share the groups of the full model
+            self._group_rooms()
+        if self.options.formulation == "factorized":
+            self._build_factorized()
+        else:
+            self._build_cube()
+
+    def _build_from_template(self):
+        key = skeleton_key(self.teachers, self.rooms, self.classes, self.time_slots, self.options,
+                           bool(self._slot_groups()))
+        template = self.templates.get(key)
+        self.template_hit = template is not None
+        if template is None:
+            # Every class with as many sessions as there are slots and any
+            # qualified teacher: all variables any request could need
+            generic = SchoolScheduler(
+                self.teachers, self.rooms,
+                [replace(c, required_sessions=len(self.time_slots), teacher_id=None) for c in self.classes],
+                self.time_slots, self.options, self.previous
+            )
+            generic._build_model()
+            template = ModelTemplate(
+                generic.model.Proto(), generic.var_kind, generic.var_class, generic.var_teacher,
+                generic.var_room, generic.var_slot, generic.layout, generic.session_constraints,
+                {rep: [r.id for r in group] for rep, group in generic.room_groups.items()}
+            )
+            self.templates.put(key, template)
+
+        proto = self.model.Proto()
+        proto.CopyFrom(template.proto)
+        # Copies: the penalize objective appends variables
+        self.var_kind = array('b', template.var_kind)
+        self.var_class = array('i', template.var_class)
+        self.var_teacher = array('i', template.var_teacher)
+        self.var_room = array('i', template.var_room)
+        self.var_slot = array('i', template.var_slot)
+        self.layout = template.layout
+        self.session_constraints = template.session_constraints
+        rooms = {r.id: r for r in self.rooms}
+        for rep, group in template.room_groups.items():
+            self.room_groups[rep] = [rooms[r] for r in group]
+            for r in group:
+                self.room_group_of[r] = rep
+
+        for c in self.classes:
+            c_n = self.class_ids.index[c.id]
+            domain = proto.constraints[self.session_constraints[c_n]].linear.domain
+            domain[0] = domain[1] = c.required_sessions
+            if not c.teacher_id or c_n not in self.layout:
+                continue
+            # Pre-assignment: every other teacher's variables are 0
+            base, end, _, _ = self.layout[c_n]
+            t_n = self.teacher_ids.get(c.teacher_id)
+            kinds, teachers = self.var_kind, self.var_teacher
+            others = [i for i in range(base, end) if kinds[i] in (ASSIGN, TEACH) and teachers[i] != t_n]
+            if others:
+                self._add_linear(others, 0, 0)
+
+    def _assignment_literals(self, a: ScheduledClass) -> Optional[List[int]]:
+        """Indices of the literals that are all true iff assignment `a` is part of the solution.
+
+        None when the assignment is no longer possible (class, teacher, room
+        or slot removed, or the teacher is no longer eligible).
+        """
+        c = self.class_ids.get(a.class_id)
+        t = self.teacher_ids.get(a.teacher_id)
+        rep = self.room_ids.get(self.room_group_of.get(a.room_id))
+        s = self.slot_ids.get(a.time_slot_id)
+        if c is None or t is None or rep is None or s is None or c not in self.layout:
+            return None
+        _, _, teacher_pos, room_pos = self.layout[c]
+        if t not in teacher_pos or rep not in room_pos:
+            return None
+        if self.options.formulation == "factorized":
+            keys = [(s, SLOT, -1, -1), (s, TEACH, teacher_pos[t], -1), (s, ROOM, -1, room_pos[rep])]
+        else:
+            keys = [(teacher_pos[t], room_pos[rep], s)]
+        lits = [self._find_var(c, key) for key in keys]
+        # Missing when pruned: teacher or room unavailable at the slot
+        return None if None in lits else lits
+
+    def _var_key(self, c: int, i: int) -> tuple:
+        # Sort key of variable i within the block of class c: the cube is
+        # teacher-major, then room, then slot; the factorized block is
+        # slot-major with the slot literal, then teachers, then rooms.
+        _, _, teacher_pos, room_pos = self.layout[c]
+        if self.options.formulation == "factorized":
+            return (self.var_slot[i], self.var_kind[i], teacher_pos.get(self.var_teacher[i], -1),
+                    room_pos.get(self.var_room[i], -1))
+        return (teacher_pos[self.var_teacher[i]], room_pos[self.var_room[i]], self.var_slot[i])
+
+    def _find_var(self, c: int, key: tuple) -> Optional[int]:
+        base, end, _, _ = self.layout[c]
+        i = bisect_left(range(base, end), key, key=lambda i: self._var_key(c, i))
+        return base + i if i < end - base and self._var_key(c, base + i) == key else None
+
+    def _hint(self, assignments: Sequence[ScheduledClass]):
+        # Replace the solution hint by the literals of `assignments` that are
+        # still possible. Only the true literals are hinted: once the input
+        # has changed, a complete 0/1 hint is usually infeasible and steers
+        # the search worse than a cold start.
+        on = set()
+        for a in assignments:
+            lits = self._assignment_literals(a)
+            if lits is not None:
+                on.update(lits)
+        hint = self.model.Proto().solution_hint
+        del hint.vars[:]
+        del hint.values[:]
+        hint.vars.extend(sorted(on))
+        hint.values.extend([1] * len(on))
+
+    def _apply_previous(self):
+        self._hint(self.previous)
+        previous_lits = {}
+        for a in self.previous:
+            lits = self._assignment_literals(a)
+            if lits is not None:
+                previous_lits[a.class_id, a.teacher_id, a.room_id, a.time_slot_id] = (a, lits)
+
+        if self.options.disruption == "fix":
+            # Keep assignments that are still valid, unless the class now
+            # needs fewer sessions than it had (then any of them may move).
+            sessions = {c.id: c.required_sessions for c in self.classes}
+            per_class = {}
+            for a, _ in previous_lits.values():
+                per_class[a.class_id] = per_class.get(a.class_id, 0) + 1
+            for a, lits in previous_lits.values():
+                if per_class[a.class_id] <= sessions[a.class_id]:
+                    for l in lits:
+                        self._add_linear([l], 1, 1)
+
+        elif self.options.disruption == "penalize":
+            # Objective: number of previous assignments that did not survive
+            kept = []
+            for a, lits in previous_lits.values():
+                if len(lits) == 1:
+                    kept.append(lits[0])
+                else:
+                    k = self._new_bool()
+                    for l in lits:
+                        ct = self.model.Proto().constraints.add()
+                        ct.enforcement_literal.append(k)
+                        ct.bool_and.literals.append(l)
+                    kept.append(k)
+            n_previous = len({(a.class_id, a.teacher_id, a.room_id, a.time_slot_id) for a in self.previous})
+            objective = self.model.Proto().objective
+            objective.vars.extend(kept)
+            objective.coeffs.extend([-1] * len(kept))
+            objective.offset = n_previous
+
+    def _allow_missed_sessions(self):
+        # Session counts become upper bounds. Each missed session weighs more
+        # than the largest value the rest of the objective can take.
+        proto = self.model.Proto()
+        objective = proto.objective
+        weight = 1 + sum(abs(coeff) * max(abs(d) for d in proto.variables[v].domain)
+                         for v, coeff in zip(objective.vars, objective.coeffs))
+        for c in self.classes:
+            linear = proto.constraints[self.session_constraints[self.class_ids.index[c.id]]].linear
+            linear.domain[0] = 0
+            objective.vars.extend(linear.vars)
+            objective.coeffs.extend([-weight] * len(linear.vars))
+            objective.offset += weight * c.required_sessions
+
+    def _apply_parameters(self):
+        params = self.solver.parameters
+        if self.options.time_limit is not None:
+            params.max_time_in_seconds = self.options.time_limit
+        if self.options.num_workers is not None:
+            params.num_workers = self.options.num_workers
+        if self.options.relative_gap is not None:
+            params.relative_gap_limit = self.options.relative_gap
+        if self.options.stop_at_first_solution:
+            params.stop_after_first_solution = True
+
+    def _set_assumptions(self, indices: List[int]):
+        assumptions = self.model.Proto().assumptions
+        del assumptions[:]
+        assumptions.extend(indices)
+
+    @contextmanager
+    def _phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = self.timings.get(name, 0.0) + time.perf_counter() - start
+
+    def solve(self, on_solution: Optional[Callable[[ScheduleResponse], Optional[bool]]] = None) -> ScheduleResponse:
+        """Build and solve the model.
+
+        If `on_solution` is given it is called with each intermediate
+        solution (see ScheduleSolutionCallback) before the final response
+        is returned.
+        """
+        self.timings = {}
+        # The checks assume every session must be placed
+        if self.options.precheck and not self.options.missed_sessions:
+            with self._phase("precheck"):
+                conflicts = analyze(self.teachers, self.rooms, self.classes, self.time_slots)
+            if conflicts:
+                return self._finish(ScheduleResponse(status="INFEASIBLE", schedule=[], conflicts=conflicts))
+        if self.options.lns:
+            return self._finish(self._solve_lns(on_solution))
+
+        with self._phase("build"):
+            self.build()
+        self._apply_parameters()
+        if self.guards:
+            # Explain mode: every entity's constraints hold unless dropped
+            # while searching for a core
+            self._set_assumptions(list(self.guards.values()))
+
+        # 3. Solve
+        callback = ScheduleSolutionCallback(self, on_solution) if on_solution else None
+        with self._phase("search"):
+            status = self.solver.Solve(self.model, callback)
+        wall_time = self.solver.WallTime()
+        # UNKNOWN only comes back when a limit stopped the search; FEASIBLE
+        # also does unless we asked to stop at the first solution.
+        budget_exhausted = status == cp_model.UNKNOWN or (
+            self.options.time_limit is not None and wall_time >= self.options.time_limit
+        )
+
+        # 4. Extract Solution
+        if status == cp_model.OPTIMAL or status == cp_model.FEASIBLE:
+            status_str = "OPTIMAL" if status == cp_model.OPTIMAL else "FEASIBLE"
+            with self._phase("extract"):
+                schedule = self._extract(self.solver.ResponseProto().solution)
+            return self._finish(ScheduleResponse(status=status_str, schedule=schedule,
+                                                 budget_exhausted=budget_exhausted, wall_time=wall_time,
+                                                 objective=self.solver.ObjectiveValue(),
+                                                 bound=self.solver.BestObjectiveBound()))
+
+        # Running out of budget before the first solution proves nothing
+        if status == cp_model.UNKNOWN:
+            return self._finish(ScheduleResponse(status="UNKNOWN", schedule=[],
+                                                 budget_exhausted=budget_exhausted, wall_time=wall_time))
+
+        conflicts = None
+        if self.options.explain:
+            with self._phase("explain"):
+                conflicts = self._explain_infeasibility()
+        return self._finish(ScheduleResponse(status="INFEASIBLE", schedule=[],
+                                             budget_exhausted=budget_exhausted, wall_time=wall_time,
+                                             conflicts=conflicts))
+
+    def _finish(self, response: ScheduleResponse) -> ScheduleResponse:
+        if self.options.stats:
+            response.stats = self.collect_stats(response)
+        return response
+
+    def collect_stats(self, response: ScheduleResponse) -> Dict[str, Any]:
+        """Phase wall times, model size and CP-SAT search statistics of the last solve."""
+        stats = {"phases": {name: round(seconds, 6) for name, seconds in self.timings.items()}}
+        if self.built:
+            proto = self.model.Proto()
+            stats["model"] = {"variables": len(proto.variables), "constraints": len(proto.constraints)}
+            if self.template_hit is not None:
+                stats["model"]["template_hit"] = self.template_hit
+        if "search" in self.timings:
+            solved = response.status in ("OPTIMAL", "FEASIBLE")
+            stats["solver"] = {
+                "branches": self.solver.NumBranches(),
+                "conflicts": self.solver.NumConflicts(),
+                "wall_time": self.solver.WallTime(),
+                "objective": self.solver.ObjectiveValue() if solved else None,
+                "bound": self.solver.BestObjectiveBound() if solved else None,
+            }
+        return stats
+
+    def stop(self):
+        """Stop the running search; safe to call from another thread."""
+        self.stopped = True
+        self.solver.StopSearch()
+        sub_solver = self._sub_solver
+        if sub_solver is not None:
+            sub_solver.StopSearch()
+
+    # --- Large Neighborhood Search ---
+    #
+    # The LNS state maps each class id to its sessions as (teacher id,
+    # room-group representative id, slot id); concrete rooms are assigned
+    # only when a schedule is reported.
+
+    def _solve_lns(self, on_solution: Optional[Callable[[ScheduleResponse], Optional[bool]]]) -> ScheduleResponse:
+        """First solution of the full model, then neighborhood re-solves."""
+        start = time.perf_counter()
+        deadline = start + (self.options.time_limit or LNS_TIME_LIMIT)
+        with self._phase("build"):
+            self.build()
+        self._apply_parameters()
+        params = self.solver.parameters
+        params.max_time_in_seconds = deadline - time.perf_counter()
+        params.stop_after_first_solution = True
+        if self.guards:
+            self._set_assumptions(list(self.guards.values()))
+        with self._phase("search"):
+            status = self.solver.Solve(self.model)
+        if status not in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+            if status == cp_model.INFEASIBLE:
+                conflicts = None
+                if self.options.explain:
+                    with self._phase("explain"):
+                        conflicts = self._explain_infeasibility()
+                return ScheduleResponse(status="INFEASIBLE", schedule=[], budget_exhausted=False,
+                                        wall_time=time.perf_counter() - start, conflicts=conflicts)
+            return ScheduleResponse(status="UNKNOWN", schedule=[], budget_exhausted=True,
+                                    wall_time=time.perf_counter() - start)
+
+        with self._phase("extract"):
+            current = {}
+            for a in self._extract_grouped(self.solver.ResponseProto().solution):
+                current.setdefault(a.class_id, []).append((a.teacher_id, a.room_id, a.time_slot_id))
+        best = self._objective_value(current)
+        bound = self.solver.BestObjectiveBound() if status == cp_model.FEASIBLE else best
+        trajectory = [{"time": round(time.perf_counter() - start, 3), "objective": best, "neighborhood": "initial"}]
+
+        def report() -> Optional[bool]:
+            if on_solution is None:
+                return None
+            return on_solution(ScheduleResponse(status="FEASIBLE", schedule=self._lns_schedule(current),
+                                                wall_time=time.perf_counter() - start, objective=best,
+                                                bound=bound, trajectory=list(trajectory)))
+
+        stopped = report() is False
+        classes = {c.id: c for c in self.classes}
+        rng = random.Random(0)
+        kinds = cycle(("day", "teacher", "room"))
+        stall = 0
+        budget_exhausted = False
+        with self._phase("lns"):
+            while not stopped and best > bound and stall < self.options.lns_stall:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0.01:
+                    budget_exhausted = True
+                    break
+                name, freed = self._neighborhood(next(kinds), current, rng)
+                candidate = self._solve_neighborhood([classes[c] for c in freed], current,
+                                                     min(LNS_STEP_TIME, remaining))
+                if self.stopped:
+                    break
+                value = self._objective_value(candidate) if candidate is not None else best
+                if value >= best:
+                    stall += 1
                     continue
+                current, best, stall = candidate, value, 0
+                trajectory.append({"time": round(time.perf_counter() - start, 3), "objective": best,
+                                   "neighborhood": name})
+                stopped = report() is False
+
+        return ScheduleResponse(status="OPTIMAL" if best <= bound else "FEASIBLE",
+                                schedule=self._lns_schedule(current), budget_exhausted=budget_exhausted,
+                                wall_time=time.perf_counter() - start, objective=best, bound=bound,
+                                trajectory=trajectory)
+
+    def _neighborhood(self, kind: str, current: Dict[str, List[Tuple[str, str, str]]],
+                      rng: random.Random) -> Tuple[str, List[str]]:
+        """Classes to free: those meeting on one day, taught by one teacher or
+        using one room group, at most options.lns_neighborhood of them."""
+        if kind == "day":
+            day_of = {s.id: s.day for s in self.time_slots}
+            day = rng.choice(list(self._days()))
+            name, freed = f"day:{day}", [c for c, rows in current.items() if any(day_of[s] == day for _, _, s in rows)]
+        elif kind == "teacher":
+            teacher = rng.choice(sorted({t for rows in current.values() for t, _, _ in rows}))
+            name, freed = f"teacher:{teacher}", [c for c, rows in current.items() if any(t == teacher for t, _, _ in rows)]
+        else:
+            room = rng.choice(sorted({r for rows in current.values() for _, r, _ in rows}))
+            name, freed = f"room:{room}", [c for c, rows in current.items() if any(r == room for _, r, _ in rows)]
+        if len(freed) > self.options.lns_neighborhood:
+            freed = rng.sample(freed, self.options.lns_neighborhood)
+        return name, freed
+
+    def _solve_neighborhood(self, freed: List[SchoolClass], current: Dict[str, List[Tuple[str, str, str]]],
+                            time_limit: float) -> Optional[Dict[str, List[Tuple[str, str, str]]]]:
+        """Re-solve the classes in `freed` with every other class fixed.
+
+        Returns the new LNS state, or None if no solution was found in time.
+        The sub-model only has variables for the freed classes; the fixed
+        classes enter as teachers and rooms taken at their slots.
+        """
+        freed_ids = {c.id for c in freed}
+        options = replace(self.options, lns=False, time_limit=time_limit, precheck=False, explain=False,
+                          stats=False, stop_at_first_solution=False, decompose=False)
+        sub = SchoolScheduler(self.teachers, self.rooms, freed, self.time_slots, options,
+                              [a for a in self.previous if a.class_id in freed_ids])
+        sub.room_groups, sub.room_group_of = self.room_groups, self.room_group_of
+        teacher_ids, room_ids, slot_ids = self.teacher_ids.index, self.room_ids.index, self.slot_ids.index
+        for c_id, rows in current.items():
+            if c_id in freed_ids:
+                continue
+            for t, r, s in rows:
+                sub.busy_teachers.add((teacher_ids[t], slot_ids[s]))
+                key = (room_ids[r], slot_ids[s])
+                sub.rooms_in_use[key] = sub.rooms_in_use.get(key, 0) + 1
+        sub.build()
+        # The current assignment is a solution of the sub-model; start there
+        sub._hint([ScheduledClass(c.id, t, r, s) for c in freed for t, r, s in current.get(c.id, [])])
+        sub._apply_parameters()
+
+        self._sub_solver = sub.solver
+        try:
+            status = sub.solver.Solve(sub.model)
+        finally:
+            self._sub_solver = None
+        if status not in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+            return None
+        candidate = {c_id: rows for c_id, rows in current.items() if c_id not in freed_ids}
+        for a in sub._extract_grouped(sub.solver.ResponseProto().solution):
+            candidate.setdefault(a.class_id, []).append((a.teacher_id, a.room_id, a.time_slot_id))
+        return candidate
 
-                for r in self.rooms:
-                    for s in self.time_slots:
-                        var_name = f'c{c.id}_t{t.id}_r{r.id}_s{s.id}'
-                        self.assignment_vars[(c.id, t.id, r.id, s.id)] = self.model.NewBoolVar(var_name)
+    def _objective_value(self, current: Dict[str, List[Tuple[str, str, str]]]) -> int:
+        """The model's objective for an LNS state, computed directly."""
+        value = 0
+        if self.options.spread:
+            day_of = {s.id: s.day for s in self.time_slots}
+            for rows in current.values():
+                days = [day_of[s] for _, _, s in rows]
+                value += len(days) - len(set(days))
+        if self.previous and self.options.disruption == "penalize":
+            kept = {(c, t, r, s) for c, rows in current.items() for t, r, s in rows}
+            previous = {(a.class_id, a.teacher_id, a.room_id, a.time_slot_id) for a in self.previous}
+            value += len(previous) - sum(
+                (c, t, self.room_group_of.get(r), s) in kept for c, t, r, s in previous
+            )
+        return value
+
+    def _lns_schedule(self, current: Dict[str, List[Tuple[str, str, str]]]) -> ColumnarSchedule:
+        schedule = ColumnarSchedule(self.class_ids.ids, self.teacher_ids.ids, self.room_ids.ids, self.slot_ids.ids)
+        teacher_ids, room_ids, slot_ids = self.teacher_ids.index, self.room_ids.index, self.slot_ids.index
+        for c_id, rows in current.items():
+            c_n = self.class_ids.index[c_id]
+            for t, r, s in rows:
+                schedule.append(c_n, teacher_ids[t], room_ids[r], slot_ids[s])
+        return self._assign_rooms(schedule)
+
+    def _explain_infeasibility(self) -> List[Conflict]:
+        """Find a minimal set of entities whose constraints cannot all hold.
+
+        Every entity's constraints are guarded by an assumption literal.
+        CP-SAT returns a sufficient (not necessarily minimal) subset of
+        assumptions for infeasibility; a deletion pass then drops every
+        guard whose removal keeps the core infeasible.
+        """
+        by_index = {i: key for key, i in self.guards.items()}
+
+        def infeasible_core(indices: List[int]) -> Optional[List[int]]:
+            self._set_assumptions(indices)
+            solver = cp_model.CpSolver()
+            # Core extraction needs a single worker
+            solver.parameters.num_workers = 1
+            if self.options.time_limit is not None:
+                solver.parameters.max_time_in_seconds = self.options.time_limit
+            if solver.Solve(self.model) != cp_model.INFEASIBLE:
+                return None
+            return list(solver.SufficientAssumptionsForInfeasibility())
+
+        core = infeasible_core(list(by_index))
+        if core is None:
+            # Not reproducible under assumptions (e.g. time limit)
+            return []
+        for i in list(core):
+            if i not in core:
+                continue
+            trial = [j for j in core if j != i]
+            smaller = infeasible_core(trial)
+            if smaller is not None:
+                core = smaller if len(smaller) < len(trial) else trial
+        self._set_assumptions([])
+
+        entities = {}
+        for i in core:
+            kind, entity_id = by_index[i]
+            if kind == "room":
+                entities.setdefault("rooms", []).extend(r.id for r in self.room_groups[entity_id])
+            else:
+                entities.setdefault({"class": "classes", "teacher": "teachers"}[kind], []).append(entity_id)
+        return [Conflict(
+            "constraint_core",
+            "These classes' session requirements cannot be met together with the teacher and room "
+            "single-assignment constraints of the listed teachers and rooms",
+            entities
+        )]
+
+    def _build_cube(self):
+        # 1. Create Variables
+        # x_c_t_r_s = 1 if class c is assign to teacher t in room r at slot s
+        # Constraint buckets are filled in the same pass, so construction only
+        # touches variables that survive qualification, room and
+        # availability filtering.
+        # Buckets hold proto variable indices, in flat lists indexed by
+        # entity number * number of slots + slot number.
+        name_vars = self.options.name_vars
+        n_slots = len(self.time_slots)
+        class_vars = {}                                               # c.id -> [index]
+        teacher_slot = [[] for _ in range(len(self.teachers) * n_slots)]
+        room_slot = [[] for _ in range(len(self.rooms) * n_slots)]
+        class_slot = [[] for _ in range(len(self.classes) * n_slots)]
+        for c in self.classes:
+            c_n = self.class_ids.index[c.id]
+            c_vars = class_vars[c.id] = []
+            teachers = self._qualified_teachers(c)
+            rooms = self._candidate_rooms(c)
+            t_nums = [self.teacher_ids.index[t.id] for t in teachers]
+            r_nums = [self.room_ids.index[r.id] for r in rooms]
+            base = len(self.var_kind)
+            # Block layout: teacher-major, then room, then slot
+            for t, t_n in zip(teachers, t_nums):
+                t_mask = self.teacher_masks[t_n]
+                for r, r_n in zip(rooms, r_nums):
+                    for s_n in self._slots_in(t_mask & self.room_masks[r_n]):
+                        s = self.time_slots[s_n]
+                        i = self._new_bool(f'c{c.id}_t{t.id}_r{r.id}_s{s.id}' if name_vars else '',
+                                           ASSIGN, c_n, t_n, r_n, s_n)
+                        c_vars.append(i)
+                        teacher_slot[t_n * n_slots + s_n].append(i)
+                        room_slot[r_n * n_slots + s_n].append(i)
+                        class_slot[c_n * n_slots + s_n].append(i)
+            self.layout[c_n] = (base, len(self.var_kind), {t: i for i, t in enumerate(t_nums)},
+                                {r: i for i, r in enumerate(r_nums)})
 
         # 2. Constraints
 
         # C1: Each class must be assigned exactly 'required_sessions' times
+        # (with no qualified teacher the sum is empty and the constraint
+        # cannot hold, making the model infeasible)
         for c in self.classes:
-            c_vars = []
-            for t in self.teachers:
-                for r in self.rooms:
-                    for s in self.time_slots:
-                        if (c.id, t.id, r.id, s.id) in self.assignment_vars:
-                            c_vars.append(self.assignment_vars[(c.id, t.id, r.id, s.id)])
-            
-            if c_vars:
-                self.model.Add(sum(c_vars) == c.required_sessions)
-            else:
-                # Impossible to schedule this class (e.g. no qualified teacher)
-                # We can't return early if we want to debug, but for now strict:
-                pass 
-                # If no variables exist for a class, it means NO qualified teacher found.
-                # The constraint sum(c_vars) == required (where required > 0) will be 0 == N => False (INFEASIBLE).
-                # So we can just Add(0 == 1) if c_vars is empty but required > 0
-                if c.required_sessions > 0:
-                     self.model.Add(0 == 1)
+            self.session_constraints[self.class_ids.index[c.id]] = self._add_linear(
+                class_vars[c.id], c.required_sessions, c.required_sessions, enforce=self._guard("class", c.id))
 
         # C2: Teacher Enforce Single Assignment per Slot
-        for t in self.teachers:
-            for s in self.time_slots:
-                t_s_vars = []
-                for c in self.classes:
-                    for r in self.rooms:
-                        if (c.id, t.id, r.id, s.id) in self.assignment_vars:
-                            t_s_vars.append(self.assignment_vars[(c.id, t.id, r.id, s.id)])
-                if t_s_vars:
-                    self.model.Add(sum(t_s_vars) <= 1)
+        for k, t_s_vars in enumerate(teacher_slot):
+            self._add_teacher_limit(t_s_vars, k // n_slots, k % n_slots)
 
         # C3: Room Enforce Single Assignment per Slot
-        for r in self.rooms:
-            for s in self.time_slots:
-                r_s_vars = []
-                for c in self.classes:
-                    for t in self.teachers:
-                        if (c.id, t.id, r.id, s.id) in self.assignment_vars:
-                            r_s_vars.append(self.assignment_vars[(c.id, t.id, r.id, s.id)])
-                if r_s_vars:
-                    self.model.Add(sum(r_s_vars) <= 1)
+        for k, r_s_vars in enumerate(room_slot):
+            if r_s_vars:
+                self._add_room_limit(r_s_vars, self.room_ids[k // n_slots],
+                                     self.rooms_in_use.get((k // n_slots, k % n_slots), 0))
 
         # C4: Class Single Assignment per Slot (No concurrency for same class)
+        slot_loads = {}
+        for k, c_s_vars in enumerate(class_slot):
+            if not c_s_vars:
+                continue
+            slot_loads.setdefault(self.slot_ids[k % n_slots], []).extend(c_s_vars)
+            if len(c_s_vars) > 1:
+                self._add_at_most_one(c_s_vars, self._guard("class", self.class_ids[k // n_slots]))
+
+        if self.options.spread:
+            self._add_spread(class_slot)
+        self._break_slot_symmetry(slot_loads)
+
+    def _build_factorized(self):
+        # Instead of the 4-D cube, split each decision into three layers:
+        #   slot[c,s]    - class c meets at slot s
+        #   teach[c,t,s] - qualified teacher t teaches class c at slot s
+        #   room[c,r,s]  - class c sits in room r at slot s
+        # Channeling ties the teacher and room layers to the slot layer, so
+        # any solution maps 1:1 onto a cube solution while the model only
+        # grows with C*S*(T_qualified + R) instead of C*T*R*S. Slots where no
+        # teacher or no room of the class is available get no variables.
+        name_vars = self.options.name_vars
+        n_slots = len(self.time_slots)
+        teacher_slot = [[] for _ in range(len(self.teachers) * n_slots)]
+        room_slot = [[] for _ in range(len(self.rooms) * n_slots)]
+        class_slot = [[] for _ in range(len(self.classes) * n_slots)]
+        slot_loads = {}      # s.id -> [index]
         for c in self.classes:
-            for s in self.time_slots:
-                c_s_vars = []
-                for t in self.teachers:
-                    for r in self.rooms:
-                        if (c.id, t.id, r.id, s.id) in self.assignment_vars:
-                            c_s_vars.append(self.assignment_vars[(c.id, t.id, r.id, s.id)])
-                if c_s_vars:
-                    self.model.Add(sum(c_s_vars) <= 1)
+            c_n = self.class_ids.index[c.id]
+            teachers = self._qualified_teachers(c)
+            if not teachers:
+                # No qualified teacher: same strict behaviour as the cube model
+                self.session_constraints[c_n] = self._add_linear([], c.required_sessions, c.required_sessions,
+                                                                 enforce=self._guard("class", c.id))
+                continue
 
-        # 3. Solve
-        status = self.solver.Solve(self.model)
-        
-        # 4. Extract Solution
-        if status == cp_model.OPTIMAL or status == cp_model.FEASIBLE:
-            schedule = []
-            for (c_id, t_id, r_id, s_id), var in self.assignment_vars.items():
-                if self.solver.Value(var) == 1:
-                    schedule.append(ScheduledClass(
-                        class_id=c_id,
-                        teacher_id=t_id,
-                        room_id=r_id,
-                        time_slot_id=s_id
-                    ))
-            
-            status_str = "OPTIMAL" if status == cp_model.OPTIMAL else "FEASIBLE"
-            return ScheduleResponse(status=status_str, schedule=schedule)
-        
-        return ScheduleResponse(status="INFEASIBLE", schedule=[])
\ No newline at end of file
+            rooms = self._candidate_rooms(c)
+            t_nums = [self.teacher_ids.index[t.id] for t in teachers]
+            r_nums = [self.room_ids.index[r.id] for r in rooms]
+            t_masks = [self.teacher_masks[t_n] for t_n in t_nums]
+            r_masks = [self.room_masks[r_n] for r_n in r_nums]
+            teachers_free = rooms_free = 0
+            for m in t_masks:
+                teachers_free |= m
+            for m in r_masks:
+                rooms_free |= m
+            base = len(self.var_kind)
+            # Block layout per slot: slot literal, then teachers, then rooms
+            c_vars = []
+            for s_n in self._slots_in(teachers_free & rooms_free):
+                s = self.time_slots[s_n]
+                x_i = self._new_bool(f'c{c.id}_s{s.id}' if name_vars else '', SLOT, c_n, s=s_n)
+                c_vars.append(x_i)
+                class_slot[c_n * n_slots + s_n].append(x_i)
+                slot_loads.setdefault(s.id, []).append(x_i)
+
+                t_vars = []
+                for t, t_n, m in zip(teachers, t_nums, t_masks):
+                    if not m >> s_n & 1:
+                        continue
+                    y_i = self._new_bool(f'c{c.id}_t{t.id}_s{s.id}' if name_vars else '', TEACH, c_n, t_n, s=s_n)
+                    t_vars.append(y_i)
+                    teacher_slot[t_n * n_slots + s_n].append(y_i)
+
+                r_vars = []
+                for r, r_n, m in zip(rooms, r_nums, r_masks):
+                    if not m >> s_n & 1:
+                        continue
+                    z_i = self._new_bool(f'c{c.id}_r{r.id}_s{s.id}' if name_vars else '', ROOM, c_n, r=r_n, s=s_n)
+                    r_vars.append(z_i)
+                    room_slot[r_n * n_slots + s_n].append(z_i)
+
+                # Channel: exactly one teacher iff the class meets at s
+                self._add_linear(t_vars + [x_i], 0, 0, [1] * len(t_vars) + [-1])
+                # Channel: exactly one room iff the class meets at s
+                self._add_linear(r_vars + [x_i], 0, 0, [1] * len(r_vars) + [-1])
+
+            self.layout[c_n] = (base, len(self.var_kind), {t: i for i, t in enumerate(t_nums)},
+                                {r: i for i, r in enumerate(r_nums)})
+            # C1: required sessions (C4 is implied, slot[c,s] is a single bool)
+            self.session_constraints[c_n] = self._add_linear(c_vars, c.required_sessions, c.required_sessions,
+                                                             enforce=self._guard("class", c.id))
+
+        # C2: Teacher single assignment per slot
+        for k, t_s_vars in enumerate(teacher_slot):
+            self._add_teacher_limit(t_s_vars, k // n_slots, k % n_slots)
+
+        # C3: Room single assignment per slot
+        for k, r_s_vars in enumerate(room_slot):
+            if r_s_vars:
+                self._add_room_limit(r_s_vars, self.room_ids[k // n_slots],
+                                     self.rooms_in_use.get((k // n_slots, k % n_slots), 0))
+
+        if self.options.spread:
+            self._add_spread(class_slot)
+        self._break_slot_symmetry(slot_loads)
+
+    def _extract(self, solution: Sequence[int]) -> ColumnarSchedule:
+        """The schedule encoded by a full solution vector (one value per proto variable)."""
+        return self._assign_rooms(self._extract_grouped(solution))
+
+    def _assign_rooms(self, schedule: ColumnarSchedule) -> ColumnarSchedule:
+        """Replace room-group representatives with concrete rooms.
+
+        The model guarantees at most len(group) classes per group and slot,
+        so this always succeeds. Classes keep their previous room when it is
+        in the right group, so warm-started solves do not shuffle rooms.
+        """
+        if all(len(group) == 1 for group in self.room_groups.values()):
+            return schedule
+        previous_room = {}
+        for a in self.previous:
+            key = (self.class_ids.get(a.class_id), self.slot_ids.get(a.time_slot_id))
+            previous_room[key] = self.room_ids.get(a.room_id)
+        by_group_slot = {}
+        for row, key in enumerate(zip(schedule.room_col, schedule.slot_col)):
+            by_group_slot.setdefault(key, []).append(row)
+        for (rep, s), rows in by_group_slot.items():
+            group = self.room_groups[self.room_ids[rep]]
+            if len(group) == 1:
+                continue
+            free = [self.room_ids.index[r.id] for r in group]
+            pending = []
+            for row in rows:
+                prev = previous_room.get((schedule.class_col[row], s))
+                if prev in free:
+                    schedule.room_col[row] = prev
+                    free.remove(prev)
+                else:
+                    pending.append(row)
+            for row, r in zip(pending, free):
+                schedule.room_col[row] = r
+        return schedule
+
+    def _extract_grouped(self, solution: Sequence[int]) -> ColumnarSchedule:
+        # Room numbers in the result are still room-group representatives.
+        # compress() walks the solution vector in C, so only true literals
+        # reach Python.
+        schedule = ColumnarSchedule(self.class_ids.ids, self.teacher_ids.ids, self.room_ids.ids, self.slot_ids.ids)
+        kinds, classes, teachers, rooms, slots = self.var_kind, self.var_class, self.var_teacher, self.var_room, self.var_slot
+        true = compress(range(len(kinds)), solution)
+        if self.options.formulation != "factorized":
+            for i in true:
+                if kinds[i] == ASSIGN:
+                    schedule.append(classes[i], teachers[i], rooms[i], slots[i])
+            return schedule
+
+        teacher_at = {}
+        room_at = {}
+        for i in true:
+            kind = kinds[i]
+            if kind == TEACH:
+                teacher_at[classes[i], slots[i]] = teachers[i]
+            elif kind == ROOM:
+                room_at[classes[i], slots[i]] = rooms[i]
+        for (c, s), t in teacher_at.items():
+            schedule.append(c, t, room_at[c, s], s)
+        return schedule
@@ -136,6 +136,8 @@ function removeClass(id) {
 }
 
 // Schedule Generation
+let solveController = null;
+
 async function generateSchedule() {
   if (teachers.length === 0 || rooms.length === 0 || classes.length === 0) {
     return alert('Please add teachers, rooms, and classes first.');
@@ -164,26 +166,88 @@ async function generateSchedule() {
     time_slots
   };
 
+  // Stream improving solutions so large solves render before the search ends
+  solveController = new AbortController();
+  document.getElementById('stop-btn').disabled = false;
+
   try {
-    const response = await fetch('/api/solve', {
+    const response = await fetch('/api/solve/stream', {
       method: 'POST',
       headers: { 'Content-Type': 'application/json' },
-      body: JSON.stringify(payload)
+      body: JSON.stringify(payload),
+      signal: solveController.signal
     });
 
+    if (response.status === 503) {
+      const retry = response.headers.get('Retry-After');
+      document.getElementById('status-display').textContent = `Server busy, try again in ${retry}s`;
+      return;
+    }
     if (!response.ok) throw new Error('Solver failed');
 
-    const data = await response.json();
-    document.getElementById('status-display').textContent = `Status: ${data.status}`;
-
-    renderSchedule(data.schedule, time_slots);
+    await readEvents(response, (event, data) => {
+      if (event === 'error') {
+        document.getElementById('status-display').textContent = data.error;
+        return;
+      }
+      if (event === 'solution') {
+        document.getElementById('status-display').textContent =
+          `Searching... (objective ${data.objective}, bound ${data.bound})`;
+      } else {
+        const reasons = (data.conflicts || []).map(c => c.message).join('; ');
+        document.getElementById('status-display').textContent =
+          `Status: ${data.status}` + (reasons ? ` - ${reasons}` : '');
+      }
+      if (data.schedule.length > 0 || event === 'result') {
+        renderSchedule(data.schedule, time_slots);
+      }
+    });
 
   } catch (e) {
-    console.error(e);
-    document.getElementById('status-display').textContent = 'Error calling solver';
+    if (e.name === 'AbortError') {
+      document.getElementById('status-display').textContent += ' (stopped)';
+    } else {
+      console.error(e);
+      document.getElementById('status-display').textContent = 'Error calling solver';
+    }
+  } finally {
+    document.getElementById('stop-btn').disabled = true;
+    solveController = null;
+  }
+}
+
+// Parse a text/event-stream body, calling onEvent(event, data) per frame
+async function readEvents(response, onEvent) {
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    let sep;
+    while ((sep = buffer.indexOf('\n\n')) !== -1) {
+      const frame = buffer.slice(0, sep);
+      buffer = buffer.slice(sep + 2);
+
+      let event = 'message';
+      let data = '';
+      frame.split('\n').forEach(line => {
+        if (line.startsWith('event: ')) event = line.slice(7);
+        else if (line.startsWith('data: ')) data += line.slice(6);
+      });
+      if (data) onEvent(event, JSON.parse(data));
+    }
   }
 }
 
+// Abort the running search; the server stops CP-SAT when the stream closes
+function stopSchedule() {
+  if (solveController) solveController.abort();
+}
+
 function renderSchedule(schedule, timeSlots) {
   const grid = document.getElementById('schedule-grid');
   grid.innerHTML = '';
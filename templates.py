@@ -0,0 +1,208 @@
+"""
+Reusable built models for schools that share a skeleton.
+
+Most requests differ from an earlier one only in session counts and
+teacher pre-assignments. The skeleton is everything else: the teachers and
+their qualifications, the rooms, the slots, and the classes with their
+subjects. Building the model is driven by the skeleton alone if every
+class is built with the largest session count and no pre-assignment. That
+generic model is kept as a ModelTemplate. A request then copies its proto
+and sets session counts and pre-assignments by bounding constraints and
+variables (see SchoolScheduler.build).
+
+TemplateCache keeps templates in an LRU bounded by their serialized size.
+The optional disk tier writes one file per template under `disk_dir`, so a
+restarted server (or another worker process) starts warm.
+"""
+import base64
+import hashlib
+import json
+import os
+import re
+import struct
+import tempfile
+import threading
+from array import array
+from collections import OrderedDict
+from dataclasses import dataclass, asdict
+from typing import Dict, List, Optional, Tuple
+from google.protobuf.message import DecodeError
+from ortools.sat import cp_model_pb2
+
+_KEY_RE = re.compile(r'[0-9a-f]{64}')
+
+def skeleton_key(teachers, rooms, classes, time_slots, options, slot_symmetry: bool) -> str:
+    """SHA-256 of everything a model template depends on.
+
+    Names, session counts and teacher pre-assignments are left out: names
+    never reach the model, and the other two are applied per request.
+    Order matters, since entities are numbered in input order.
+    """
+    def without(entity, *fields):
+        d = asdict(entity)
+        for f in fields:
+            d.pop(f, None)
+        return d
+
+    skeleton = {
+        "teachers": [without(t, "name") for t in teachers],
+        "rooms": [without(r, "name") for r in rooms],
+        "classes": [without(c, "name", "required_sessions", "teacher_id") for c in classes],
+        "time_slots": [asdict(s) for s in time_slots],
+        "options": {"formulation": options.formulation, "name_vars": options.name_vars,
+                    "symmetry": options.symmetry, "spread": options.spread, "slot_symmetry": slot_symmetry},
+    }
+    blob = json.dumps(skeleton, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(blob.encode()).hexdigest()
+
+@dataclass
+class ModelTemplate:
+    """A generic built model and the variable tables that describe it."""
+    proto: cp_model_pb2.CpModelProto
+    var_kind: array
+    var_class: array
+    var_teacher: array
+    var_room: array
+    var_slot: array
+    # Class number -> (first variable index, end of the block, {teacher number: position},
+    # {room number: position})
+    layout: Dict[int, Tuple[int, int, Dict[int, int], Dict[int, int]]]
+    # Class number -> index of its required-sessions constraint
+    session_constraints: Dict[int, int]
+    # Representative room id -> ids of the rooms in its group
+    room_groups: Dict[str, List[str]]
+
+    def nbytes(self) -> int:
+        return self.proto.ByteSize() + sum(a.itemsize * len(a) for a in self._arrays())
+
+    def _arrays(self):
+        return self.var_kind, self.var_class, self.var_teacher, self.var_room, self.var_slot
+
+    def to_bytes(self) -> bytes:
+        """Length-prefixed JSON metadata followed by the serialized proto."""
+        meta = json.dumps({
+            "arrays": [[a.typecode, base64.b64encode(a.tobytes()).decode()] for a in self._arrays()],
+            "layout": [[c, base, end, list(teachers), list(rooms)]
+                       for c, (base, end, teachers, rooms) in self.layout.items()],
+            "session_constraints": list(self.session_constraints.items()),
+            "room_groups": self.room_groups,
+        }, separators=(',', ':')).encode()
+        return struct.pack('>I', len(meta)) + meta + self.proto.SerializeToString()
+
+    @staticmethod
+    def from_bytes(blob: bytes) -> 'ModelTemplate':
+        (n,) = struct.unpack_from('>I', blob)
+        meta = json.loads(blob[4:4 + n])
+        proto = cp_model_pb2.CpModelProto()
+        proto.ParseFromString(blob[4 + n:])
+        arrays = []
+        for typecode, data in meta["arrays"]:
+            a = array(typecode)
+            a.frombytes(base64.b64decode(data))
+            arrays.append(a)
+        return ModelTemplate(
+            proto, *arrays,
+            layout={c: (base, end, {t: i for i, t in enumerate(teachers)}, {r: i for i, r in enumerate(rooms)})
+                    for c, base, end, teachers, rooms in meta["layout"]},
+            session_constraints=dict(meta["session_constraints"]),
+            room_groups=meta["room_groups"],
+        )
+
+class TemplateCache:
+    """Two-tier cache of ModelTemplates keyed by skeleton_key.
+
+    The memory tier is an LRU bounded by the templates' size; the optional
+    disk tier stores one file per key under `disk_dir` and survives restarts.
+    """
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024, disk_dir: Optional[str] = None):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self._entries = OrderedDict()  # key -> (ModelTemplate, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.evictions = 0
+
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def get(self, key: str) -> Optional[ModelTemplate]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+        template = self._read_disk(key)
+        with self._lock:
+            if template is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.disk_hits += 1
+            self._insert(key, template)
+        return template
+
+    def put(self, key: str, template: ModelTemplate):
+        with self._lock:
+            self._insert(key, template)
+        self._write_disk(key, template)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "disk_hits": self.disk_hits,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "disk": bool(self.disk_dir),
+            }
+
+    def _insert(self, key: str, template: ModelTemplate):
+        # Caller holds the lock
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= old[1]
+        size = template.nbytes()
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (template, size)
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self._bytes -= evicted
+            self.evictions += 1
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key[:2], f"{key}.tmpl")
+
+    def _read_disk(self, key: str) -> Optional[ModelTemplate]:
+        if not self.disk_dir or not _KEY_RE.fullmatch(key):
+            return None
+        try:
+            with open(self._disk_path(key), 'rb') as f:
+                return ModelTemplate.from_bytes(f.read())
+        except (OSError, ValueError, struct.error, DecodeError) as e:
+            if not isinstance(e, FileNotFoundError):
+                print(f"Warning: could not read model template {key}: {e}")
+            return None
+
+    def _write_disk(self, key: str, template: ModelTemplate):
+        if not self.disk_dir or not _KEY_RE.fullmatch(key):
+            return
+        path = self._disk_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write then rename so readers never see a partial file
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+            with os.fdopen(fd, 'wb') as f:
+                f.write(template.to_bytes())
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"Warning: could not write model template {key}: {e}")
@@ -0,0 +1,255 @@
+"""
+Term-long timetables from solved pattern weeks.
+
+A term repeats a weekly pattern. With an A/B (or longer) rotation, week n
+of the term runs pattern rotation[(n - 1) % len(rotation)], and a class's
+sessions per cycle are shared out evenly between the rotation weeks. Each
+distinct pattern week is solved once, so a term costs one week's solve per
+distinct pattern however many weeks it has.
+
+Exception weeks (holidays, exam days, a teacher away) close slots or make
+teachers and rooms unavailable. Each is applied as a small incremental
+solve. Pattern sessions that are still possible stay where they are. Only
+the classes that lost a session are re-solved, around the fixed ones, with
+as few changes to their pattern as possible. Sessions that cannot be placed
+that week are reported as missed instead of making the week infeasible.
+Exceptions that are identical on the same pattern are solved once.
+"""
+import time
+from dataclasses import asdict, dataclass, field, replace
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from models import ScheduledClass, ScheduleResponse, SolverOptions, Conflict
+from scenarios import School, diff_schedules
+from solver import SchoolScheduler
+
+# solve(teachers, rooms, classes, time_slots, options, previous) -> ScheduleResponse
+Solve = Callable[..., ScheduleResponse]
+
+@dataclass(slots=True)
+class WeekException:
+    # Term week, counted from 1
+    week: int
+    # Days the school is closed (holidays)
+    closed_days: List[str] = field(default_factory=list)
+    # Slot ids of the representative week closed to all classes (exams)
+    blocked: List[str] = field(default_factory=list)
+    # Extra unavailable slot ids by teacher id and by room id
+    teachers: Dict[str, List[str]] = field(default_factory=dict)
+    rooms: Dict[str, List[str]] = field(default_factory=dict)
+
+    @staticmethod
+    def from_dict(d: Dict[str, Any]):
+        return WeekException(
+            week=int(d['week']),
+            closed_days=[str(day) for day in d.get('closed_days', [])],
+            blocked=[str(s) for s in d.get('blocked', [])],
+            teachers={t: [str(s) for s in slots] for t, slots in (d.get('teachers') or {}).items()},
+            rooms={r: [str(s) for s in slots] for r, slots in (d.get('rooms') or {}).items()}
+        )
+
+    def signature(self) -> tuple:
+        # Exceptions with equal signatures change a pattern the same way
+        def sorted_map(m):
+            return tuple(sorted((k, tuple(sorted(set(v)))) for k, v in m.items() if v))
+        return (tuple(sorted(set(self.closed_days))), tuple(sorted(set(self.blocked))),
+                sorted_map(self.teachers), sorted_map(self.rooms))
+
+@dataclass(slots=True)
+class TermSpec:
+    weeks: int = 1
+    # Labels of the weeks of one rotation cycle, e.g. ["A", "B"]
+    rotation: List[str] = field(default_factory=lambda: ["A"])
+    # Sessions per cycle by class id; by default required_sessions times
+    # the cycle length
+    cycle_sessions: Dict[str, int] = field(default_factory=dict)
+    exceptions: List[WeekException] = field(default_factory=list)
+
+    @staticmethod
+    def from_dict(d: Dict[str, Any]):
+        weeks = int(d.get('weeks', 1))
+        if weeks < 1:
+            raise ValueError("weeks must be at least 1")
+        rotation = [str(label) for label in d.get('rotation') or ["A"]]
+        if len(set(rotation)) != len(rotation):
+            raise ValueError("Rotation labels must be unique")
+        cycle_sessions = {c: int(n) for c, n in (d.get('cycle_sessions') or {}).items()}
+        if any(n < 0 for n in cycle_sessions.values()):
+            raise ValueError("cycle_sessions must not be negative")
+        exceptions = [WeekException.from_dict(e) for e in d.get('exceptions', [])]
+        seen = set()
+        for e in exceptions:
+            if not 1 <= e.week <= weeks:
+                raise ValueError(f"Exception week {e.week} is outside the term")
+            if e.week in seen:
+                raise ValueError(f"Duplicate exception for week {e.week}")
+            seen.add(e.week)
+        return TermSpec(weeks=weeks, rotation=rotation, cycle_sessions=cycle_sessions, exceptions=exceptions)
+
+    def pattern_of(self, week: int) -> str:
+        return self.rotation[(week - 1) % len(self.rotation)]
+
+@dataclass(slots=True)
+class TermWeek:
+    week: int
+    pattern: str
+    # Exception weeks only: the status of the week's re-solve, its
+    # schedule, what changed against the pattern and the sessions that
+    # could not be placed by class id
+    status: Optional[str] = None
+    schedule: Optional[List[ScheduledClass]] = None
+    changes: Optional[Dict[str, Any]] = None
+    missed: Dict[str, int] = field(default_factory=dict)
+
+    def to_dict(self):
+        d = {"week": self.week, "pattern": self.pattern}
+        if self.schedule is not None:
+            d.update(status=self.status, schedule=[asdict(a) for a in self.schedule],
+                     changes=self.changes, missed=self.missed)
+        return d
+
+@dataclass(slots=True)
+class TermResponse:
+    # OPTIMAL when every pattern and exception week is; the failing
+    # pattern's status if one could not be solved
+    status: str
+    # Pattern schedules by rotation label, in representative-week slot ids
+    patterns: Dict[str, List[ScheduledClass]]
+    weeks: List[TermWeek]
+    wall_time: Optional[float] = None
+    conflicts: Optional[List[Conflict]] = None
+
+    def week_schedule(self, week: TermWeek) -> List[ScheduledClass]:
+        return week.schedule if week.schedule is not None else self.patterns[week.pattern]
+
+    def expand(self) -> List[Tuple[int, ScheduledClass]]:
+        """Every session of the term as (week, assignment)."""
+        return [(w.week, a) for w in self.weeks for a in self.week_schedule(w)]
+
+    def to_dict(self, expand: bool = False):
+        d = {
+            "status": self.status,
+            "patterns": {label: [asdict(a) for a in rows] for label, rows in self.patterns.items()},
+            "weeks": [w.to_dict() for w in self.weeks],
+        }
+        if self.wall_time is not None:
+            d["wall_time"] = self.wall_time
+        if self.conflicts is not None:
+            d["conflicts"] = [c.to_dict() for c in self.conflicts]
+        if expand:
+            d["schedule"] = [{"week": week, **asdict(a)} for week, a in self.expand()]
+        return d
+
+def rotation_schools(school: School, spec: TermSpec) -> Dict[str, School]:
+    """The week to solve for every rotation label.
+
+    A class with n sessions per cycle of k weeks gets n // k in every week;
+    the n % k others go to consecutive weeks starting at a different week
+    for each class, so no week collects all the remainders.
+    """
+    teachers, rooms, classes, time_slots = school
+    unknown = set(spec.cycle_sessions) - {c.id for c in classes}
+    if unknown:
+        raise ValueError(f"Unknown class id in cycle_sessions: {', '.join(sorted(unknown))}")
+    k = len(spec.rotation)
+    weeks = {label: [] for label in spec.rotation}
+    for i, c in enumerate(classes):
+        base, extra = divmod(spec.cycle_sessions.get(c.id, c.required_sessions * k), k)
+        for j, label in enumerate(spec.rotation):
+            sessions = base + ((j - i) % k < extra)
+            weeks[label].append(c if sessions == c.required_sessions else replace(c, required_sessions=sessions))
+    return {label: (teachers, rooms, week, time_slots) for label, week in weeks.items()}
+
+def _solve_directly(teachers, rooms, classes, time_slots, options, previous) -> ScheduleResponse:
+    return SchoolScheduler(teachers, rooms, classes, time_slots, options, previous).solve()
+
+def solve_exception(school: School, pattern: List[ScheduledClass], exception: WeekException,
+                    options: SolverOptions, solve: Solve = _solve_directly) -> TermWeek:
+    """Apply one exception to a pattern week; returns the week without its number and label."""
+    teachers, rooms, classes, time_slots = school
+    closed = set(exception.blocked) | {s.id for s in time_slots if s.day in exception.closed_days}
+    teacher_off = {t: set(slots) for t, slots in exception.teachers.items()}
+    room_off = {r: set(slots) for r, slots in exception.rooms.items()}
+
+    def possible(a: ScheduledClass) -> bool:
+        return (a.time_slot_id not in closed and a.time_slot_id not in teacher_off.get(a.teacher_id, ())
+                and a.time_slot_id not in room_off.get(a.room_id, ()))
+
+    freed = {a.class_id for a in pattern if not possible(a)}
+    if not freed:
+        return TermWeek(0, "", status="OPTIMAL", schedule=list(pattern), changes=diff_schedules(pattern, pattern))
+
+    # Classes that keep their whole pattern hold their teachers and rooms
+    kept = [a for a in pattern if a.class_id not in freed]
+    busy_teachers, busy_rooms = {}, {}
+    for a in kept:
+        busy_teachers.setdefault(a.teacher_id, set()).add(a.time_slot_id)
+        busy_rooms.setdefault(a.room_id, set()).add(a.time_slot_id)
+
+    def unavailable(entity, off, busy):
+        extra = off.get(entity.id, set()) | busy.get(entity.id, set())
+        return replace(entity, unavailable=entity.unavailable + sorted(extra - set(entity.unavailable)))
+
+    sessions = {}
+    for a in pattern:
+        if a.class_id in freed:
+            sessions[a.class_id] = sessions.get(a.class_id, 0) + 1
+    week_school = (
+        [unavailable(t, teacher_off, busy_teachers) for t in teachers],
+        [unavailable(r, room_off, busy_rooms) for r in rooms],
+        [replace(c, required_sessions=sessions[c.id]) for c in classes if c.id in freed],
+        [replace(s, blocked=True) if s.id in closed else s for s in time_slots],
+    )
+    previous = [a for a in pattern if a.class_id in freed]
+    sub_options = replace(options, disruption="penalize", missed_sessions=True, lns=False, explain=False,
+                          precheck=False)
+    result = solve(*week_school, sub_options, previous)
+
+    placed = list(result.schedule) if result.status in ("OPTIMAL", "FEASIBLE") else []
+    schedule = kept + placed
+    got = {}
+    for a in placed:
+        got[a.class_id] = got.get(a.class_id, 0) + 1
+    missed = {c: n - got.get(c, 0) for c, n in sessions.items() if n > got.get(c, 0)}
+    return TermWeek(0, "", status=result.status, schedule=schedule, changes=diff_schedules(pattern, schedule),
+                    missed=missed)
+
+def solve_term(school: School, spec: TermSpec, options: Optional[SolverOptions] = None,
+               solve: Solve = _solve_directly) -> TermResponse:
+    """Solve each distinct rotation week once, then apply the exception weeks.
+
+    `solve` runs one model (the server passes one that goes through its
+    executor and result cache).
+    """
+    options = options or SolverOptions()
+    start = time.perf_counter()
+    rotation = rotation_schools(school, spec)
+    patterns = {}
+    results = {}  # session counts -> ScheduleResponse
+    optimal = True
+    for label, week in rotation.items():
+        key = tuple(c.required_sessions for c in week[2])
+        if key not in results:
+            results[key] = solve(*week, options, None)
+        result = results[key]
+        if result.status not in ("OPTIMAL", "FEASIBLE"):
+            return TermResponse(status=result.status, patterns={}, weeks=[],
+                                wall_time=time.perf_counter() - start, conflicts=result.conflicts)
+        optimal = optimal and result.status == "OPTIMAL"
+        patterns[label] = list(result.schedule)
+    exceptions = {e.week: e for e in spec.exceptions}
+    solved = {}  # (label, exception signature) -> TermWeek
+    weeks = []
+    for week in range(1, spec.weeks + 1):
+        label = spec.pattern_of(week)
+        exception = exceptions.get(week)
+        if exception is None:
+            weeks.append(TermWeek(week, label))
+            continue
+        key = (label, exception.signature())
+        if key not in solved:
+            solved[key] = solve_exception(rotation[label], patterns[label], exception, options, solve)
+        weeks.append(replace(solved[key], week=week, pattern=label))
+
+    optimal = optimal and all(w.status in (None, "OPTIMAL") for w in weeks)
+    return TermResponse(status="OPTIMAL" if optimal else "FEASIBLE", patterns=patterns, weeks=weeks,
+                        wall_time=time.perf_counter() - start)
@@ -0,0 +1,73 @@
+from analysis import analyze
+from models import Teacher, Room, SchoolClass, TimeSlot, SolverOptions
+from solver import SchoolScheduler
+from test_solver import sample_school
+
+def test_feasible_input_has_no_conflicts():
+    assert analyze(*sample_school()) == []
+
+def test_subject_coverage_and_capacity():
+    teachers, rooms, classes, time_slots = sample_school()
+    classes = classes + [SchoolClass(id="c9", name="Art 101", subject="Art", required_sessions=1)]
+    conflicts = analyze(teachers, rooms[:1], classes, time_slots)
+    kinds = {c.kind: c for c in conflicts}
+    assert kinds["no_qualified_teacher"].entities == {"classes": ["c9"]}
+    assert kinds["room_capacity"].entities == {"rooms": ["r1"]}
+
+def test_teacher_capacity_finds_hall_violator():
+    # Two math teachers, three math classes of 3 sessions each, 4 slots:
+    # 9 sessions but only 8 teacher-slots among the eligible teachers.
+    teachers = [
+        Teacher(id="t1", name="A", qualifications=["Math"]),
+        Teacher(id="t2", name="B", qualifications=["Math"]),
+        Teacher(id="t3", name="C", qualifications=["Art"]),
+    ]
+    rooms = [Room(id=f"r{i}", name=f"R{i}", capacity=30) for i in range(4)]
+    classes = [SchoolClass(id=f"m{i}", name=f"Math {i}", subject="Math", required_sessions=3) for i in range(3)]
+    classes.append(SchoolClass(id="a1", name="Art", subject="Art", required_sessions=1))
+    time_slots = [TimeSlot(id=f"s{p}", day="Mon", period=p) for p in range(4)]
+    conflicts = analyze(teachers, rooms, classes, time_slots)
+    assert [c.kind for c in conflicts] == ["teacher_capacity"]
+    assert sorted(conflicts[0].entities["classes"]) == ["m0", "m1", "m2"]
+    assert sorted(conflicts[0].entities["teachers"]) == ["t1", "t2"]
+
+def test_precheck_short_circuits_solver():
+    teachers, rooms, classes, time_slots = sample_school()
+    result = SchoolScheduler(teachers, rooms[:1], classes, time_slots).solve()
+    assert result.status == "INFEASIBLE"
+    assert result.wall_time is None
+    assert result.to_dict()["conflicts"][0]["kind"] == "room_capacity"
+
+def test_explain_extracts_minimal_core():
+    # t1 must teach both pre-assigned classes (2 + 2 sessions) in 3 slots.
+    # The pre-check would catch this, so it is disabled to exercise the
+    # assumption-based explanation.
+    teachers = [
+        Teacher(id="t1", name="A", qualifications=["Math"]),
+        Teacher(id="t2", name="B", qualifications=["Math"]),
+    ]
+    rooms = [Room(id="r1", name="R1", capacity=30), Room(id="r2", name="R2", capacity=30)]
+    classes = [
+        SchoolClass(id="c1", name="Math 1", subject="Math", required_sessions=2, teacher_id="t1"),
+        SchoolClass(id="c2", name="Math 2", subject="Math", required_sessions=2),
+        SchoolClass(id="c3", name="Math 3", subject="Math", required_sessions=2, teacher_id="t1"),
+    ]
+    time_slots = [TimeSlot(id=f"s{p}", day="Mon", period=p) for p in range(3)]
+    for formulation in SolverOptions.FORMULATIONS:
+        options = SolverOptions(formulation=formulation, precheck=False, explain=True)
+        result = SchoolScheduler(teachers, rooms, classes, time_slots, options).solve()
+        assert result.status == "INFEASIBLE"
+        (conflict,) = result.conflicts
+        assert sorted(conflict.entities["classes"]) == ["c1", "c3"]
+        assert conflict.entities["teachers"] == ["t1"]
+
+def test_availability_checks():
+    teachers, rooms, classes, time_slots = sample_school()
+    classes[1].room_type = "lab"
+    conflicts = analyze(teachers, rooms, classes, time_slots)
+    assert [(c.kind, c.entities) for c in conflicts] == [("no_suitable_room", {"classes": ["c2"]})]
+    # Science 101 needs 3 sessions; its only teacher is away for two of the four slots
+    teachers, rooms, classes, time_slots = sample_school()
+    teachers[1].unavailable = ["s1", "s2"]
+    conflicts = analyze(teachers, rooms, classes, time_slots)
+    assert {c.kind for c in conflicts} == {"too_many_sessions", "teacher_overloaded"}
@@ -0,0 +1,37 @@
+import gzip
+import os
+import time
+from assets import AssetCache
+
+def test_assets_are_precompressed_and_negotiated(tmp_path):
+    (tmp_path / "static").mkdir()
+    (tmp_path / "static" / "app.js").write_text("console.log('hello');\n" * 200)
+    cache = AssetCache(str(tmp_path))
+    cache.preload("static")
+
+    asset = cache.get("static/app.js")
+    assert "javascript" in asset.content_type and asset.content_type.endswith("; charset=utf-8")
+    assert asset.etag.startswith('"') and asset.etag.endswith('"')
+
+    encoding, body = asset.negotiate("gzip, deflate")
+    assert encoding == "gzip"
+    assert gzip.decompress(body) == asset.bodies[""]
+    assert asset.negotiate("") == ("", asset.bodies[""])
+    assert asset.negotiate("identity")[0] == ""
+
+def test_changed_files_are_reloaded(tmp_path):
+    path = tmp_path / "style.css"
+    path.write_text("body { color: red; }")
+    cache = AssetCache(str(tmp_path))
+    first = cache.get("style.css")
+    assert cache.get("style.css") is first
+
+    path.write_text("body { color: blue; }")
+    os.utime(path, ns=(time.time_ns(), first.mtime_ns + 1_000_000))
+    second = cache.get("style.css")
+    assert second.bodies[""] == b"body { color: blue; }"
+    assert second.etag != first.etag
+
+    path.unlink()
+    assert cache.get("style.css") is None
+    assert cache.get("missing.css") is None
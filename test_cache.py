@@ -0,0 +1,46 @@
+from dataclasses import replace
+from cache import ResultCache, canonical_key
+from models import Teacher, ScheduleResponse, ScheduledClass, SolverOptions
+from test_solver import sample_school
+
+def test_key_ignores_ordering():
+    teachers, rooms, classes, time_slots = sample_school()
+    key = canonical_key(teachers, rooms, classes, time_slots)
+
+    shuffled = [Teacher(id=t.id, name=t.name, qualifications=list(reversed(t.qualifications)))
+                for t in reversed(teachers)]
+    assert canonical_key(shuffled, rooms[::-1], classes[::-1], time_slots[::-1]) == key
+    assert canonical_key(teachers, rooms, classes, time_slots, SolverOptions(time_limit=5)) != key
+
+def test_lru_evicts_by_size(tmp_path):
+    response = ScheduleResponse(status="OPTIMAL", schedule=[ScheduledClass("c1", "t1", "r1", "s1")])
+    cache = ResultCache(max_bytes=250)
+    for i in range(5):
+        cache.put(f"k{i}", response)
+    stats = cache.stats()
+    assert stats["bytes"] <= 250
+    assert stats["evictions"] > 0
+    assert cache.get("k4").schedule[0].room_id == "r1"
+    assert cache.get("k0") is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+def test_disk_tier_survives_restart(tmp_path):
+    response = ScheduleResponse(status="INFEASIBLE", schedule=[])
+    key = "ab" * 32
+    ResultCache(disk_dir=str(tmp_path)).put(key, response)
+
+    cache = ResultCache(disk_dir=str(tmp_path))
+    assert cache.get(key).status == "INFEASIBLE"
+    assert cache.get("../../etc/passwd") is None
+    assert cache.stats()["disk_hits"] == 1
+
+def test_unknown_results_are_not_cached():
+    cache = ResultCache()
+    cache.put("k", ScheduleResponse(status="UNKNOWN", schedule=[]))
+    assert cache.get("k") is None
+
+def test_key_ignores_display_names():
+    teachers, rooms, classes, time_slots = sample_school()
+    key = canonical_key(teachers, rooms, classes, time_slots)
+    renamed = [replace(c, name=c.name + " (renamed)") for c in classes]
+    assert canonical_key([replace(t, name="?") for t in teachers], rooms, renamed, time_slots) == key
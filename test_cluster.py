@@ -0,0 +1,170 @@
+import socket
+import threading
+import time
+import pytest
+import cluster as cluster_module
+from cluster import ClusterExecutor, Channel, WorkerServer, encode_job, split_address
+from executor import SolveExecutor, Overloaded
+from generator import generate_school
+from models import SolverOptions
+from solver import SchoolScheduler
+from test_solver import sample_school, assert_valid
+
+TOKEN = "test-token"
+
+def start_worker():
+    server = WorkerServer(("127.0.0.1", 0), SolveExecutor(max_workers=1, max_queue=0, cpus=1), TOKEN)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"127.0.0.1:{server.server_address[1]}"
+
+def stop_worker(server):
+    server.shutdown()
+    server.server_close()
+    server.executor.shutdown()
+
+def test_least_loaded_dispatch_and_overload():
+    (a, a_address), (b, b_address) = start_worker(), start_worker()
+    cluster = ClusterExecutor([a_address, b_address], TOKEN, health_interval=0.2)
+    stop = threading.Event()
+    busy = SchoolScheduler(*generate_school(n_teachers=30, n_classes=100, n_rooms=20, seed=100),
+                           SolverOptions(time_limit=60))
+    background = threading.Thread(target=lambda: cluster.submit(busy, cancelled=stop.is_set))
+    try:
+        school = sample_school()
+        result, timings = cluster.submit(SchoolScheduler(*school))
+        assert result.status == "OPTIMAL" and "search" in timings
+        assert_valid(result.schedule, *school)
+
+        background.start()
+        time.sleep(0.5)
+        busy_worker = a if a.executor.admitted else b
+        free_worker = b if busy_worker is a else a
+        # The second job goes to the idle worker
+        result, _ = cluster.submit(SchoolScheduler(*school))
+        assert result.status == "OPTIMAL"
+        assert busy_worker.executor.admitted == 1 and free_worker.executor.admitted == 0
+        assert {w["address"]: w["in_flight"] for w in cluster.workers()}[
+            a_address if busy_worker is a else b_address] == 1
+
+        # Both take one job at a time: with one busy and one taken, the next is refused
+        hold = threading.Thread(target=lambda: cluster.submit(busy, cancelled=stop.is_set))
+        hold.start()
+        time.sleep(0.3)
+        assert cluster.full
+        with pytest.raises(Overloaded):
+            cluster.submit(SchoolScheduler(*school))
+        stop.set()
+        hold.join(timeout=30)
+        background.join(timeout=30)
+        assert cluster.admitted == 0
+    finally:
+        stop.set()
+        cluster.shutdown()
+        stop_worker(a)
+        stop_worker(b)
+
+def test_job_is_retried_when_a_worker_is_lost():
+    # A worker that answers health checks but drops every job
+    listener = socket.create_server(("127.0.0.1", 0))
+    dropped = []
+
+    def flaky():
+        while True:
+            try:
+                conn, _ = listener.accept()
+            except OSError:
+                return
+            with conn:
+                channel = Channel.accept(conn, TOKEN.encode())
+                message = channel.recv()
+                if message["type"] == "ping":
+                    channel.send({"type": "pong", "max_workers": 4, "capacity": 8, "admitted": 0})
+                else:
+                    dropped.append(message)
+
+    threading.Thread(target=flaky, daemon=True).start()
+    worker, address = start_worker()
+    # The flaky worker has more room, so it is tried first
+    cluster = ClusterExecutor([f"127.0.0.1:{listener.getsockname()[1]}", address], TOKEN, health_interval=60)
+    try:
+        school = sample_school()
+        result, _ = cluster.submit(SchoolScheduler(*school))
+        assert result.status == "OPTIMAL"
+        assert_valid(result.schedule, *school)
+        assert len(dropped) == 1
+        assert [w["healthy"] for w in cluster.workers()] == [False, True]
+    finally:
+        cluster.shutdown()
+        listener.close()
+        stop_worker(worker)
+
+def test_solutions_stream_back_and_can_stop_the_search():
+    worker, address = start_worker()
+    cluster = ClusterExecutor([address], TOKEN, health_interval=60)
+    school = generate_school(n_teachers=20, n_subjects=10, n_rooms=15, n_classes=60, periods=6, seed=0)
+    seen = []
+
+    def on_solution(response):
+        seen.append(response)
+        return False
+
+    try:
+        options = SolverOptions(formulation="factorized", spread=True, time_limit=60)
+        result, _ = cluster.submit(SchoolScheduler(*school, options), on_solution=on_solution)
+    finally:
+        cluster.shutdown()
+        stop_worker(worker)
+    # Solutions already on the wire when the cancel went out may still arrive
+    assert seen and seen[0].status == "FEASIBLE"
+    assert_valid(seen[0].schedule, *school)
+    assert result.status in ("OPTIMAL", "FEASIBLE") and result.wall_time < 30
+
+def test_frames_need_the_cluster_token():
+    with pytest.raises(ValueError):
+        ClusterExecutor([], "")
+    worker, address = start_worker()
+    outsider = ClusterExecutor([address], "wrong-token", health_interval=60)
+    try:
+        # The worker drops unsigned frames, so it never looks healthy
+        assert [w["healthy"] for w in outsider.workers()] == [False]
+        with pytest.raises(Overloaded):
+            outsider.submit(SchoolScheduler(*sample_school()))
+    finally:
+        outsider.shutdown()
+        stop_worker(worker)
+
+def test_frames_cannot_be_replayed_or_oversized():
+    worker, address = start_worker()
+    job = encode_job(SchoolScheduler(*sample_school()), stream=False)
+    try:
+        # Record a signed job frame as sent on one connection
+        sent = []
+        with socket.create_connection(split_address(address)) as sock:
+            channel = Channel.connect(sock, TOKEN.encode())
+            channel.sock = type("Recorder", (), {"sendall": lambda self, data: sent.append(data)})()
+            channel.send(job)
+        # Replayed on a new one, under a new nonce, it gets no answer
+        with socket.create_connection(split_address(address), timeout=10) as sock:
+            sock.recv(16)
+            sock.sendall(sent[0])
+            assert sock.recv(1) == b""
+        # An unsigned length is refused before any body is read
+        with socket.create_connection(split_address(address), timeout=10) as sock:
+            sock.recv(16)
+            sock.sendall(b"\xff\xff\xff\xff" + bytes(32))
+            assert sock.recv(1) == b""
+        assert worker.executor.admitted == 0
+    finally:
+        stop_worker(worker)
+
+def test_rejected_job_is_a_client_error(monkeypatch):
+    worker, address = start_worker()
+    cluster = ClusterExecutor([address], TOKEN, health_interval=60)
+    try:
+        # A job the worker cannot decode
+        monkeypatch.setattr(cluster_module, "encode_job", lambda scheduler, stream: {"type": "solve", "school": [1]})
+        with pytest.raises(ValueError, match="Bad job"):
+            cluster.submit(SchoolScheduler(*sample_school()))
+    finally:
+        cluster.shutdown()
+        stop_worker(worker)
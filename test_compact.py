@@ -0,0 +1,30 @@
+import pickle
+from compact import Interner, ColumnarSchedule
+from models import ScheduleResponse, ScheduledClass, SolverOptions
+from solver import SchoolScheduler
+from test_solver import sample_school, assert_valid
+
+def test_interner_is_dense_and_stable():
+    ids = Interner(["t2", "t1", "t2"])
+    assert len(ids) == 2
+    assert ids.add("t3") == 2 and ids.add("t1") == 1
+    assert ids[0] == "t2" and ids.get("nope") is None
+
+def test_columnar_schedule_reads_like_a_list():
+    schedule = ColumnarSchedule(["c1", "c2"], ["t1"], ["r1", "r2"], ["s1"])
+    schedule.append(0, 0, 1, 0)
+    schedule.append(1, 0, 0, 0)
+    rows = [ScheduledClass("c1", "t1", "r2", "s1"), ScheduledClass("c2", "t1", "r1", "s1")]
+    assert len(schedule) == 2 and schedule[1] == rows[1]
+    assert list(schedule) == rows and schedule == rows
+    response = ScheduleResponse(status="OPTIMAL", schedule=schedule)
+    assert response.to_dict() == ScheduleResponse(status="OPTIMAL", schedule=rows).to_dict()
+    assert pickle.loads(pickle.dumps(schedule)) == rows
+
+def test_solver_returns_columnar_schedules():
+    school = sample_school()
+    for formulation in SolverOptions.FORMULATIONS:
+        result = SchoolScheduler(*school, SolverOptions(formulation=formulation)).solve()
+        assert isinstance(result.schedule, ColumnarSchedule)
+        assert_valid(result.schedule, *school)
+        assert ScheduleResponse.from_dict(result.to_dict()).schedule == result.schedule
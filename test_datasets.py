@@ -0,0 +1,64 @@
+import json
+import pytest
+from cache import canonical_key, school_digest
+from datasets import (DatasetStore, DatasetNotFound, VersionConflict, school_from_dict, school_from_records,
+                      school_to_dict, jsonl_records, csv_records)
+from test_solver import sample_school
+
+def test_jsonl_and_csv_imports_agree():
+    school = sample_school()
+    lines = [json.dumps({"type": t, **e}).encode() + b"\n"
+             for t, (_, entities) in zip(["teacher", "room", "class", "time_slot"], school_to_dict(school).items())
+             for e in entities]
+    assert school_from_records(jsonl_records(lines)) == tuple(list(k) for k in school)
+
+    csv_lines = [b"type,id,name,qualifications,unavailable,capacity,room_type,subject,required_sessions,day,period,blocked\n",
+                 b"teacher,t1,Ann,Math;Science,Mon_1; Mon_2,,,,,,,\n",
+                 b"room,r1,Lab,,,30,lab,,,,,\n",
+                 b"class,c1,Math 7,,,,,Math,2,,,\n",
+                 b"time_slot,Mon_1,,,,,,,,Mon,1,false\n",
+                 b"time_slot,Mon_2,,,,,,,,Mon,2,1\n"]
+    teachers, rooms, classes, time_slots = school_from_records(csv_records(csv_lines))
+    assert teachers[0].qualifications == ["Math", "Science"] and teachers[0].unavailable == ["Mon_1", "Mon_2"]
+    assert rooms[0].capacity == 30 and rooms[0].room_type == "lab" and classes[0].required_sessions == 2
+    assert [s.blocked for s in time_slots] == [False, True]
+
+    with pytest.raises(ValueError):
+        school_from_records(jsonl_records([b'{"type": "room", "id": "r1", "name": "A", "capacity": 1}',
+                                           b'{"type": "room", "id": "r1", "name": "B", "capacity": 1}']))
+
+def test_patch_versions_and_conflicts():
+    store = DatasetStore(max_versions=2)
+    dataset_id, first = store.create(sample_school())
+    second = store.patch(dataset_id, {"modify": {"classes": [{"id": "c1", "required_sessions": 1}]}}, base_version=1)
+    assert second.version == 2 and second.school[1][0] is first.school[1][0]
+    assert second.digest == school_digest(*second.school) != first.digest
+    with pytest.raises(VersionConflict):
+        store.patch(dataset_id, {}, base_version=1)
+    store.patch(dataset_id, {})
+    assert store.versions(dataset_id) == [2, 3]
+    with pytest.raises(DatasetNotFound):
+        store.get(dataset_id, 1)
+    # Solving by dataset shares cache entries with an uploaded copy
+    teachers, rooms, classes, time_slots = second.school
+    assert canonical_key(teachers, rooms, classes, time_slots, school=second.digest) == \
+        canonical_key(teachers, rooms, classes, time_slots)
+    store.delete(dataset_id)
+    with pytest.raises(DatasetNotFound):
+        store.get(dataset_id)
+
+def test_datasets_replay_from_disk(tmp_path):
+    store = DatasetStore(disk_dir=str(tmp_path))
+    dataset_id, _ = store.create(sample_school())
+    latest = store.patch(dataset_id, {"remove": {"time_slots": ["s1"]}})
+    with open(tmp_path / f"{dataset_id}.jsonl", "a") as f:
+        f.write('{"version": 3, "del')  # torn write
+    restarted = DatasetStore(disk_dir=str(tmp_path))
+    assert restarted.versions(dataset_id) == [1, 2]
+    assert restarted.get(dataset_id).digest == latest.digest
+
+@pytest.mark.parametrize("body", [[1], "school", {"teachers": {}}, {"teachers": [1]},
+                                  {"rooms": [{"name": "No id", "capacity": 1}]}])
+def test_malformed_school_body_is_rejected(body):
+    with pytest.raises(ValueError):
+        school_from_dict(body)
@@ -0,0 +1,52 @@
+from decompose import component_jobs, find_components, merge_responses
+from executor import SolveExecutor
+from models import Teacher, SchoolClass, ScheduleResponse, ScheduledClass, SolverOptions
+from solver import SchoolScheduler
+from test_solver import sample_school, assert_valid
+
+def test_shared_rooms_keep_problem_connected():
+    teachers, rooms, classes, time_slots = sample_school()
+    classes = classes + [SchoolClass(id="c9", name="Art 101", subject="Art", required_sessions=1)]
+    teachers = teachers + [Teacher(id="t9", name="Idle", qualifications=["Music"])]
+    components = find_components(teachers, rooms, classes)
+    assert len(components) == 1
+    # Idle teacher belongs to no component
+    assert [t.id for t in components[0][0]] == ["t1", "t2"]
+
+def test_teachers_split_components():
+    # Without shared rooms, components follow teacher eligibility alone
+    teachers, _, classes, _ = sample_school()
+    assert len(find_components(teachers, [], classes)) == 1
+    teachers = teachers[:1] + [Teacher(id="t3", name="Sci", qualifications=["Science"])]
+    components = find_components(teachers, [], classes)
+    assert sorted(sorted(c.id for c in comp[2]) for comp in components) == [["c1", "c3"], ["c2"]]
+
+def test_merge_statuses():
+    a = ScheduleResponse(status="OPTIMAL", schedule=[ScheduledClass("c1", "t1", "r1", "s1")], wall_time=1.0)
+    b = ScheduleResponse(status="FEASIBLE", schedule=[ScheduledClass("c2", "t2", "r2", "s1")], wall_time=2.0)
+    merged = merge_responses([a, b])
+    assert merged.status == "FEASIBLE" and len(merged.schedule) == 2 and merged.wall_time == 2.0
+    merged = merge_responses([a, ScheduleResponse(status="INFEASIBLE", schedule=[])])
+    assert merged.status == "INFEASIBLE" and merged.schedule == []
+
+def test_connected_problem_falls_back_to_monolithic():
+    school = sample_school()
+    executor = SolveExecutor(max_workers=2, cpus=8)
+    [job] = executor._jobs(SchoolScheduler(*school, SolverOptions(decompose=True)), stream=False)
+    assert job[2] == school[2] and job[4].num_workers == 4
+
+def test_room_types_split_components():
+    teachers, rooms, classes, time_slots = sample_school()
+    rooms[1].room_type = "lab"
+    classes[1].room_type = "lab"
+    # Science 101 still shares t2 with Math 101
+    assert len(find_components(teachers, rooms, classes)) == 1
+    classes[0].teacher_id = "t1"
+    classes[0].required_sessions = 2
+    components = find_components(teachers, rooms, classes)
+    assert sorted(sorted(c.id for c in comp[2]) for comp in components) == [["c1", "c3"], ["c2"]]
+    assert sorted([r.id for r in comp[1]] for comp in components) == [["r1"], ["r2"]]
+    jobs = component_jobs(teachers, rooms, classes, time_slots)
+    result = merge_responses([SchoolScheduler(t, r, c, s, SolverOptions(), p).solve() for t, r, c, s, p in jobs])
+    assert result.status == "OPTIMAL"
+    assert_valid(result.schedule, teachers, rooms, classes, time_slots)
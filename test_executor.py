@@ -0,0 +1,103 @@
+import threading
+import time
+import pytest
+from dataclasses import replace
+from decompose import find_components
+from executor import SolveExecutor, Overloaded
+from generator import generate_school
+from models import SolverOptions
+from solver import SchoolScheduler
+from test_solver import sample_school, assert_valid
+
+def test_solves_in_worker_process():
+    executor = SolveExecutor(max_workers=1, max_queue=0, cpus=2)
+    school = sample_school()
+    try:
+        result, timings = executor.submit(SchoolScheduler(*school))
+    finally:
+        executor.shutdown()
+    assert result.status == "OPTIMAL"
+    assert_valid(result.schedule, *school)
+    assert "search" in timings
+    assert executor.admitted == 0
+
+def test_full_queue_rejects_and_cancel_stops_search():
+    executor = SolveExecutor(max_workers=1, max_queue=0, cpus=1)
+    school = generate_school(n_teachers=30, n_classes=100, n_rooms=20, seed=100)
+    scheduler = SchoolScheduler(*school, SolverOptions(time_limit=60))
+    stop = threading.Event()
+    results = []
+    worker = threading.Thread(target=lambda: results.append(executor.submit(scheduler, cancelled=stop.is_set)))
+    worker.start()
+    try:
+        time.sleep(0.5)
+        with pytest.raises(Overloaded) as e:
+            executor.submit(SchoolScheduler(*sample_school()))
+        assert e.value.retry_after >= 1
+
+        start = time.perf_counter()
+        stop.set()
+        worker.join(timeout=30)
+        assert time.perf_counter() - start < 10
+    finally:
+        stop.set()
+        worker.join()
+        executor.shutdown()
+    assert results[0][0].status in ("UNKNOWN", "FEASIBLE")
+
+def test_decomposed_solve_reports_timings_and_stops_on_cancel():
+    executor = SolveExecutor(max_workers=1, max_queue=0, cpus=1)
+    school = sample_school()
+    doubled = with_copy(school)
+    big = with_copy(generate_school(n_teachers=30, n_classes=100, n_rooms=20, seed=100))
+    try:
+        assert len(find_components(*doubled[:3])) == 2
+        # Side by side, the two components split the request's threads
+        splitter = SolveExecutor(max_workers=2, cpus=8)
+        jobs = splitter._jobs(SchoolScheduler(*doubled, SolverOptions(decompose=True)), stream=False)
+        assert [job[4].num_workers for job in jobs] == [2, 2]
+        [whole] = splitter._jobs(SchoolScheduler(*doubled, SolverOptions(decompose=True)), stream=True)
+        assert whole[4].num_workers == 4
+
+        result, timings = executor.submit(SchoolScheduler(*doubled, SolverOptions(decompose=True)))
+        assert result.status == "OPTIMAL"
+        assert_valid(result.schedule, *doubled)
+        assert "search" in timings
+
+        stop = threading.Event()
+        threading.Timer(1.0, stop.set).start()
+        start = time.perf_counter()
+        scheduler = SchoolScheduler(*big, SolverOptions(decompose=True, time_limit=60))
+        result, _ = executor.submit(scheduler, cancelled=stop.is_set)
+        # The running component stops and the other is skipped
+        assert time.perf_counter() - start < 15 and result.status == "UNKNOWN"
+    finally:
+        executor.shutdown()
+
+def with_copy(school):
+    # A second, independent copy of the school makes two components
+    copy = tuple([replace(e, id=e.id + "b", **extra(e)) for e in entities] for entities in school[:3])
+    return school[0] + copy[0], school[1] + copy[1], school[2] + copy[2], school[3]
+
+def extra(entity):
+    # Subjects and room types renamed so the copy shares no teacher or room
+    # with the original
+    if hasattr(entity, "qualifications"):
+        return {"qualifications": [q + "b" for q in entity.qualifications]}
+    if hasattr(entity, "subject"):
+        return {"subject": entity.subject + "b", "teacher_id": entity.teacher_id and entity.teacher_id + "b",
+                "room_type": "b"}
+    return {"room_type": "b"}
+
+def test_stream_delivers_the_last_solution():
+    executor = SolveExecutor(max_workers=1, max_queue=0, cpus=1)
+    school = generate_school(n_teachers=20, n_subjects=10, n_rooms=15, n_classes=60, periods=6, seed=0)
+    seen = []
+    try:
+        options = SolverOptions(formulation="factorized", spread=True, time_limit=20)
+        result, _ = executor.submit(SchoolScheduler(*school, options), on_solution=seen.append)
+    finally:
+        executor.shutdown()
+    # The final result is the last improving solution, which must not be lost
+    # in the worker's event queue
+    assert seen and seen[-1].objective == result.objective
@@ -0,0 +1,57 @@
+import sys
+import pytest
+from gemini_integration import (StubBackend, set_backend, parse_scheduler_command, parse_scheduler_commands,
+                                analyze_schedule_insights)
+
+@pytest.fixture
+def stub():
+    backend = StubBackend()
+    set_backend(backend)
+    yield backend
+    set_backend(None)
+
+def test_import_does_not_load_vertexai():
+    # The client is created on the first request, not at import
+    assert "vertexai" not in sys.modules
+
+def test_batched_parse_is_one_call_and_cached(stub):
+    text = """Add Mr. Smith who teaches Math and Physics
+    Create a room called Room 101 with 30 seats
+
+    Math 101 class for Math subject needs 3 sessions
+    """
+    results = parse_scheduler_commands(text)
+    assert [r["type"] for r in results] == ["teacher", "room", "class"]
+    assert results[0]["data"] == {"name": "Mr. Smith", "qualifications": ["Math", "Physics"]}
+    assert results[1]["data"] == {"name": "Room 101", "capacity": 30}
+    assert results[2]["data"]["required_sessions"] == 3
+    assert stub.calls == 1
+
+    # Whitespace differences hit the cache; only the new line is sent
+    assert parse_scheduler_command("  Add Mr. Smith  who teaches Math and Physics") == results[0]
+    parse_scheduler_commands("Create a room called Room 101 with 30 seats\nAdd Ms. Davis for Biology")
+    assert stub.calls == 2
+
+def test_insights_cached_by_schedule(stub):
+    csv_data = "Day,Period,Class,Subject,Teacher,Room\nMon,1,A,Math,Smith,R1\nTue,1,B,Bio,Davis,R1\n"
+    first = analyze_schedule_insights(csv_data)
+    assert "2 sessions across 2 teachers and 1 rooms" in first
+    assert analyze_schedule_insights(csv_data) == first
+    assert stub.calls == 1
+
+def test_non_object_items_are_parse_errors():
+    class ListBackend(StubBackend):
+        def parse(self, lines):
+            self.calls += 1
+            return ["Room 101", 30][:len(lines)]
+
+    backend = ListBackend()
+    set_backend(backend)
+    try:
+        results = parse_scheduler_commands("A room called Room 101\nwith 30 seats")
+        assert all("error" in r for r in results)
+        # Not cached: the next call asks the model again
+        parse_scheduler_command("A room called Room 101")
+        assert backend.calls == 2
+    finally:
+        set_backend(None)
@@ -0,0 +1,45 @@
+import pytest
+import loadtest
+from analysis import analyze
+from benchmark import SIZES, compare
+from generator import generate_school
+
+def test_generator_is_seeded():
+    assert generate_school(seed=3) == generate_school(seed=3)
+    assert generate_school(seed=3) != generate_school(seed=4)
+
+def test_benchmark_sizes_pass_prechecks():
+    for size in SIZES.values():
+        assert analyze(*generate_school(**size)) == []
+
+def test_compare_flags_regressions():
+    base = {"size": "small", "formulation": "cube", "variables": 100, "build_s": 1.0,
+            "solve_s": 1.0, "peak_rss_mb": 100.0, "status": "OPTIMAL"}
+    same = dict(base, build_s=1.1)
+    slower = dict(base, solve_s=2.0, status="FEASIBLE")
+    assert compare([same], {"results": [base]}, 0.25) == []
+    assert len(compare([slower], {"results": [base]}, 0.25)) == 2
+
+def test_loadtest_percentiles_and_mix():
+    latencies = [i / 100 for i in range(1, 101)]
+    assert loadtest.percentile(latencies, 50) == 0.5 and loadtest.percentile(latencies, 95) == 0.95
+    assert loadtest.percentile([0.2], 99) == 0.2 and loadtest.percentile([], 50) is None
+    assert loadtest.parse_mix("tiny-hit:6, medium-miss") == [(("tiny", "hit"), 6.0), (("medium", "miss"), 1.0)]
+    for mix in ("tiny-hot:1", "huge-hit:1", "tiny:1", "tiny-hit:many"):
+        with pytest.raises(ValueError):
+            loadtest.parse_mix(mix)
+
+def test_loadtest_compare_flags_regressions():
+    # 503s and failures stay out of the percentiles
+    rows = [(("tiny", "hit"), 0.0, i / 10, 200) for i in range(1, 11)] + [(("tiny", "hit"), 0.0, 0.001, 503)]
+    summary = loadtest.summarize(rows, elapsed=10.0)
+    assert summary["overall"]["p50_s"] == 0.5 and summary["overall"]["rate_503"] == round(1 / 11, 4)
+    base = {"summary": summary, "peak_rss_mb": 100.0}
+    assert loadtest.compare(base, base, 0.25) == []
+
+    slow = [(kind, sent, seconds * 2, status) for kind, sent, seconds, status in rows]
+    report = {"summary": loadtest.summarize(slow, elapsed=10.0), "peak_rss_mb": 200.0}
+    regressions = loadtest.compare(report, base, 0.25)
+    assert any(r.startswith("overall: p95_s") for r in regressions)
+    assert any(r.startswith("tiny-hit: p50_s") for r in regressions)
+    assert "peak_rss_mb 100.0 -> 200.0" in regressions
@@ -0,0 +1,25 @@
+from metrics import Counter, Gauge, Histogram, Registry
+
+def test_render_prometheus_text():
+    registry = Registry()
+    requests = registry.register(Counter('requests_total', 'Requests', ('code',)))
+    in_flight = registry.register(Gauge('in_flight', 'Running'))
+    registry.register(Gauge('entries', 'Entries', function=lambda: 7))
+    latency = registry.register(Histogram('latency_seconds', 'Latency', buckets=(0.1, 1)))
+
+    requests.inc(code=200)
+    requests.inc(code=200)
+    in_flight.inc()
+    in_flight.dec()
+    for value in (0.05, 0.5, 5):
+        latency.observe(value)
+
+    text = registry.render()
+    assert '# TYPE requests_total counter' in text
+    assert 'requests_total{code="200"} 2' in text
+    assert 'in_flight 0' in text
+    assert 'entries 7' in text
+    assert 'latency_seconds_bucket{le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{le="1"} 2' in text
+    assert 'latency_seconds_bucket{le="+Inf"} 3' in text
+    assert 'latency_seconds_count 3' in text
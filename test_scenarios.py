@@ -0,0 +1,46 @@
+import pytest
+from models import ScheduledClass
+from scenarios import apply_delta, diff_schedules
+from test_solver import sample_school
+
+def test_apply_delta_shares_untouched_entities():
+    school = sample_school()
+    teachers, rooms, classes, time_slots = apply_delta(school, {
+        "add": {"teachers": [{"id": "t9", "name": "New hire", "qualifications": ["Math"]}]},
+        "remove": {"time_slots": ["s1"]},
+        "modify": {"classes": [{"id": "c1", "required_sessions": 1}]},
+    })
+    assert [t.id for t in teachers] == [t.id for t in school[0]] + ["t9"]
+    assert rooms[0] is school[1][0]
+    assert classes[0].required_sessions == 1 and school[2][0].required_sessions != 1
+    assert classes[1] is school[2][1]
+    assert "s1" not in [s.id for s in time_slots]
+
+def test_apply_delta_rejects_bad_ids():
+    school = sample_school()
+    with pytest.raises(ValueError):
+        apply_delta(school, {"remove": {"rooms": ["nope"]}})
+    with pytest.raises(ValueError):
+        apply_delta(school, {"add": {"rooms": [{"id": "r1", "name": "Again", "capacity": 10}]}})
+    with pytest.raises(ValueError):
+        apply_delta(school, {"remove": {"pupils": ["p1"]}})
+
+@pytest.mark.parametrize("delta", [
+    [],
+    {"add": []},
+    {"remove": {"rooms": "r1"}},
+    {"remove": {"rooms": [{"id": "r1"}]}},
+    {"modify": {"classes": [{"required_sessions": 4}]}},
+    {"modify": {"classes": ["c1"]}},
+    {"add": {"rooms": [{"id": "r9"}]}},
+])
+def test_apply_delta_rejects_malformed_deltas(delta):
+    with pytest.raises(ValueError):
+        apply_delta(sample_school(), delta)
+
+def test_diff_schedules():
+    base = [ScheduledClass("c1", "t1", "r1", "s1"), ScheduledClass("c2", "t2", "r1", "s2")]
+    other = [ScheduledClass("c1", "t1", "r1", "s1"), ScheduledClass("c2", "t2", "r1", "s3")]
+    diff = diff_schedules(base, other)
+    assert diff["unchanged"] == 1 and diff["changed_classes"] == ["c2"]
+    assert diff["added"][0]["time_slot_id"] == "s3" and diff["removed"][0]["time_slot_id"] == "s2"
@@ -0,0 +1,51 @@
+import pytest
+from dataclasses import astuple
+from models import SolverOptions, TimeSlot
+from schedules import IndexedSchedule, ScheduleStore
+from solver import SchoolScheduler
+from test_solver import sample_school
+
+def solved_school():
+    teachers, rooms, classes, _ = sample_school()
+    time_slots = [TimeSlot(id=f"{d}{p}", day=d, period=p) for d in ("Mon", "Tue") for p in (1, 2, 3)]
+    school = (teachers, rooms, classes, time_slots)
+    return school, SchoolScheduler(*school, SolverOptions(num_workers=1)).solve()
+
+def test_indexes_slice_the_schedule_in_slot_order():
+    school, result = solved_school()
+    time_slots = school[3]
+    position = {s.id: i for i, s in enumerate(time_slots)}
+    for schedule in (result.schedule, list(result.schedule)):
+        indexed = IndexedSchedule(schedule, time_slots)
+        for kind, field in (("teacher", "teacher_id"), ("room", "room_id"), ("class", "class_id")):
+            for key, rows in indexed.index(kind).items():
+                records = indexed.records(rows)
+                expected = sorted((a for a in result.schedule if getattr(a, field) == key),
+                                  key=lambda a: position[a.time_slot_id])
+                assert [astuple(a) for a in expected] == [
+                    (r["class_id"], r["teacher_id"], r["room_id"], r["time_slot_id"]) for r in records]
+        monday = indexed.records(indexed.rows("day", "Mon"))
+        assert monday and all(r["day"] == "Mon" and r["time_slot_id"] == f"Mon{r['period']}" for r in monday)
+        assert indexed.summary()["sessions"] == len(result.schedule) == sum(indexed.summary()["class"].values())
+        assert len(indexed.rows("teacher", "nobody")) == 0
+    with pytest.raises(ValueError):
+        indexed.index("subject")
+
+def test_store_evicts_least_recently_used():
+    school, result = solved_school()
+    store = ScheduleStore(max_entries=2)
+    for key in ("a", "b"):
+        store.put(key, result.schedule, school[3])
+    assert store.get("a") is store.get("a")
+    store.put("c", result.schedule, school[3])
+    assert store.get("b") is None and store.get("a") is not None and len(store) == 2
+
+def test_arrow_export_round_trips():
+    pa = pytest.importorskip("pyarrow")
+    school, result = solved_school()
+    indexed = IndexedSchedule(result.schedule, school[3])
+    table = indexed.to_arrow(indexed.rows("teacher", "t1"))
+    assert table.column("teacher_id").to_pylist() == ["t1"] * len(table)
+    stream = indexed.export("arrow")
+    read = pa.ipc.open_stream(stream).read_all()
+    assert read.column("class_id").to_pylist() == [r["class_id"] for r in indexed.records()]
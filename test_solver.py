@@ -0,0 +1,242 @@
+from dataclasses import astuple
+from ortools.sat.python import cp_model
+from models import Teacher, Room, SchoolClass, TimeSlot, ScheduledClass, SolverOptions
+from solver import SchoolScheduler
+
+def sample_school():
+    teachers = [
+        Teacher(id="t1", name="Mr. Smith", qualifications=["Math"]),
+        Teacher(id="t2", name="Ms. Jones", qualifications=["Science", "Math"]),
+    ]
+    rooms = [
+        Room(id="r1", name="Room 101", capacity=30),
+        Room(id="r2", name="Room 102", capacity=20),
+    ]
+    classes = [
+        SchoolClass(id="c1", name="Math 101", subject="Math", required_sessions=3),
+        SchoolClass(id="c2", name="Science 101", subject="Science", required_sessions=3),
+        SchoolClass(id="c3", name="Math 102", subject="Math", required_sessions=2, teacher_id="t1"),
+    ]
+    time_slots = [TimeSlot(id=f"s{p}", day="Mon", period=p) for p in range(1, 5)]
+    return teachers, rooms, classes, time_slots
+
+def assert_valid(schedule, teachers, rooms, classes, time_slots):
+    teacher_by_id = {t.id: t for t in teachers}
+    room_by_id = {r.id: r for r in rooms}
+    blocked = {s.id for s in time_slots if s.blocked}
+    seen_teacher, seen_room, seen_class = set(), set(), set()
+    sessions = {}
+    for item in schedule:
+        cls = next(c for c in classes if c.id == item.class_id)
+        assert cls.subject in teacher_by_id[item.teacher_id].qualifications
+        if cls.teacher_id:
+            assert item.teacher_id == cls.teacher_id
+        assert cls.can_use_room(room_by_id[item.room_id])
+        assert item.time_slot_id not in blocked
+        assert item.time_slot_id not in teacher_by_id[item.teacher_id].unavailable
+        assert item.time_slot_id not in room_by_id[item.room_id].unavailable
+        assert (item.teacher_id, item.time_slot_id) not in seen_teacher
+        assert (item.room_id, item.time_slot_id) not in seen_room
+        assert (item.class_id, item.time_slot_id) not in seen_class
+        seen_teacher.add((item.teacher_id, item.time_slot_id))
+        seen_room.add((item.room_id, item.time_slot_id))
+        seen_class.add((item.class_id, item.time_slot_id))
+        sessions[item.class_id] = sessions.get(item.class_id, 0) + 1
+    for c in classes:
+        assert sessions.get(c.id, 0) == c.required_sessions
+
+def test_formulations_agree_on_feasible_input():
+    school = sample_school()
+    for formulation in SolverOptions.FORMULATIONS:
+        result = SchoolScheduler(*school, SolverOptions(formulation=formulation)).solve()
+        assert result.status == "OPTIMAL"
+        assert_valid(result.schedule, *school)
+
+def test_formulations_agree_on_infeasible_input():
+    teachers, rooms, classes, time_slots = sample_school()
+    # Only one room for 8 sessions in 4 slots
+    rooms = rooms[:1]
+    for formulation in SolverOptions.FORMULATIONS:
+        result = SchoolScheduler(teachers, rooms, classes, time_slots, SolverOptions(formulation=formulation)).solve()
+        assert result.status == "INFEASIBLE"
+        assert result.schedule == []
+
+def test_budget_is_reported():
+    school = sample_school()
+    result = SchoolScheduler(*school, SolverOptions(time_limit=10, num_workers=1)).solve()
+    assert result.status == "OPTIMAL"
+    assert result.budget_exhausted is False
+    assert result.to_dict()["budget_exhausted"] is False
+
+def test_stop_at_first_solution():
+    school = sample_school()
+    options = SolverOptions(formulation="factorized", stop_at_first_solution=True, num_workers=1)
+    result = SchoolScheduler(*school, options).solve()
+    assert result.status in ("OPTIMAL", "FEASIBLE")
+    assert_valid(result.schedule, *school)
+
+def test_on_solution_streams_and_can_stop():
+    school = sample_school()
+    seen = []
+    def on_solution(response):
+        seen.append(response)
+        return False
+    result = SchoolScheduler(*school, SolverOptions(num_workers=1)).solve(on_solution=on_solution)
+    assert len(seen) == 1
+    assert seen[0].status == "FEASIBLE"
+    assert_valid(seen[0].schedule, *school)
+    assert result.status in ("OPTIMAL", "FEASIBLE")
+
+def test_incremental_resolve_keeps_previous_assignments():
+    teachers, rooms, classes, time_slots = sample_school()
+    first = SchoolScheduler(teachers, rooms, classes, time_slots).solve()
+
+    # Add one class; existing assignments should survive
+    classes = classes + [SchoolClass(id="c4", name="Science 102", subject="Science", required_sessions=1)]
+    time_slots = time_slots + [TimeSlot(id="s5", day="Mon", period=5)]
+    for formulation in SolverOptions.FORMULATIONS:
+        for disruption in ("penalize", "fix"):
+            options = SolverOptions(formulation=formulation, disruption=disruption)
+            result = SchoolScheduler(teachers, rooms, classes, time_slots, options, previous=first.schedule).solve()
+            assert result.status == "OPTIMAL"
+            assert_valid(result.schedule, teachers, rooms, classes, time_slots)
+            kept = {(a.class_id, a.time_slot_id) for a in result.schedule}
+            assert all((a.class_id, a.time_slot_id) in kept for a in first.schedule)
+            if disruption == "penalize":
+                assert result.objective == 0
+
+def test_identical_rooms_are_pooled():
+    teachers, rooms, classes, time_slots = sample_school()
+    for formulation in SolverOptions.FORMULATIONS:
+        pooled = SchoolScheduler(teachers, rooms, classes, time_slots, SolverOptions(formulation=formulation))
+        result = pooled.solve()
+        assert result.status == "OPTIMAL"
+        assert_valid(result.schedule, teachers, rooms, classes, time_slots)
+        assert {a.room_id for a in result.schedule} <= {"r1", "r2"}
+
+        plain = SchoolScheduler(teachers, rooms, classes, time_slots,
+                                SolverOptions(formulation=formulation, symmetry=False))
+        assert plain.solve().status == "OPTIMAL"
+        assert len(pooled.model.Proto().variables) < len(plain.model.Proto().variables)
+
+def test_pooled_rooms_keep_previous_room():
+    teachers, rooms, classes, time_slots = sample_school()
+    first = SchoolScheduler(teachers, rooms, classes, time_slots, SolverOptions(symmetry=False)).solve()
+    # Swap every room so the previous schedule differs from the default order
+    swap = {"r1": "r2", "r2": "r1"}
+    previous = [ScheduledClass(a.class_id, a.teacher_id, swap[a.room_id], a.time_slot_id) for a in first.schedule]
+    result = SchoolScheduler(teachers, rooms, classes, time_slots,
+                             SolverOptions(disruption="fix"), previous=previous).solve()
+    assert sorted(map(astuple, result.schedule)) == sorted(map(astuple, previous))
+
+def test_stats_are_opt_in():
+    school = sample_school()
+    assert SchoolScheduler(*school).solve().stats is None
+
+    result = SchoolScheduler(*school, SolverOptions(stats=True)).solve()
+    assert {"precheck", "build", "search", "extract"} <= set(result.stats["phases"])
+    assert result.stats["model"]["variables"] > 0
+    assert result.stats["solver"]["branches"] >= 0
+    assert "stats" in result.to_dict()
+
+def test_spread_puts_sessions_on_different_days():
+    teachers, rooms, classes, _ = sample_school()
+    time_slots = [TimeSlot(id=f"{d}{p}", day=d, period=p) for d in ("Mon", "Tue", "Wed") for p in (1, 2, 3)]
+    for formulation in SolverOptions.FORMULATIONS:
+        result = SchoolScheduler(teachers, rooms, classes, time_slots,
+                                 SolverOptions(formulation=formulation, spread=True)).solve()
+        assert result.status == "OPTIMAL" and result.objective == 0
+        days = {(a.class_id, a.time_slot_id[:3]) for a in result.schedule}
+        assert len(days) == len(result.schedule)
+
+def test_lns_improves_on_first_solution():
+    from generator import generate_school
+    school = generate_school(n_teachers=20, n_subjects=10, n_rooms=15, n_classes=60, periods=6, seed=0)
+    options = SolverOptions(formulation="factorized", spread=True, lns=True, time_limit=20, num_workers=1)
+    seen = []
+    result = SchoolScheduler(*school, options).solve(lambda r: seen.append(r.objective))
+    assert_valid(result.schedule, *school)
+    objectives = [step["objective"] for step in result.trajectory]
+    assert objectives == sorted(objectives, reverse=True) and len(objectives) > 1
+    assert result.objective == objectives[-1] == seen[-1]
+    assert result.trajectory[0]["neighborhood"] == "initial"
+
+def test_availability_prunes_variables():
+    teachers, rooms, classes, time_slots = sample_school()
+    teachers[1].unavailable = ["s1"]
+    rooms[0].room_type = "lab"
+    classes[1].room_type = "lab"
+    classes[0].enrollment = 25  # only fits r1, which is now a lab
+    time_slots.append(TimeSlot(id="s5", day="Mon", period=5, blocked=True))
+    for formulation in SolverOptions.FORMULATIONS:
+        scheduler = SchoolScheduler(teachers, rooms, classes, time_slots, SolverOptions(formulation=formulation))
+        assert scheduler.solve().status == "INFEASIBLE"
+        assert scheduler.built is False  # the precheck finds Math 101 has no room
+    classes[0].enrollment = 20
+    classes[0].required_sessions = 2  # Math shares r2, which has 4 open slots
+    for formulation in SolverOptions.FORMULATIONS:
+        scheduler = SchoolScheduler(teachers, rooms, classes, time_slots, SolverOptions(formulation=formulation))
+        result = scheduler.solve()
+        assert result.status == "OPTIMAL"
+        assert_valid(result.schedule, teachers, rooms, classes, time_slots)
+        assert {a.room_id for a in result.schedule if a.class_id == "c2"} == {"r1"}
+        assert not any(a.time_slot_id == "s5" for a in result.schedule)
+        kinds, slots = scheduler.var_kind, scheduler.var_slot
+        assert not any(slots[i] == 4 for i in range(len(kinds)) if kinds[i] != 0)
+        # Hints and warm starts find the pruned variables by binary search
+        again = SchoolScheduler(teachers, rooms, classes, time_slots,
+                                SolverOptions(formulation=formulation, disruption="fix"), list(result.schedule))
+        assert sorted(map(astuple, again.solve().schedule)) == sorted(map(astuple, result.schedule))
+
+def reference_cube(teachers, rooms, classes, time_slots):
+    """C1-C4 built the straightforward way: each constraint family walks the
+    whole class x teacher x room x slot product through the CpModel API."""
+    model = cp_model.CpModel()
+    x = {}
+    for c in classes:
+        for t in teachers:
+            for r in rooms:
+                for s in time_slots:
+                    if (c.can_be_taught_by(t) and c.can_use_room(r) and not s.blocked
+                            and s.id not in t.unavailable and s.id not in r.unavailable):
+                        x[(c.id, t.id, r.id, s.id)] = model.NewBoolVar(f'c{c.id}_t{t.id}_r{r.id}_s{s.id}')
+    for c in classes:
+        model.Add(sum(v for k, v in x.items() if k[0] == c.id) == c.required_sessions)
+    for dim, entities in ((1, teachers), (2, rooms), (0, classes)):
+        for e in entities:
+            for s in time_slots:
+                group = [v for k, v in x.items() if k[dim] == e.id and k[3] == s.id]
+                if len(group) > 1:
+                    model.AddAtMostOne(group)
+    return model, x
+
+def test_bucketed_cube_matches_reference_construction():
+    teachers, rooms, classes, time_slots = sample_school()
+    time_slots = [TimeSlot(id=f"{d}{p}", day=d, period=p, blocked=(d, p) == ("Tue", 3))
+                  for d in ("Mon", "Tue") for p in (1, 2, 3)]
+    teachers[1].unavailable = ["Mon1"]
+    rooms[1].unavailable = ["Tue1"]
+    scheduler = SchoolScheduler(teachers, rooms, classes, time_slots, SolverOptions(symmetry=False))
+    scheduler.build()
+    reference, x = reference_cube(teachers, rooms, classes, time_slots)
+    built, expected = scheduler.model.Proto(), reference.Proto()
+    assert len(built.variables) == len(expected.variables)
+    assert len(built.constraints) == len(expected.constraints)
+
+    # The same objective on both: the optimum only matches if they admit the
+    # same schedules
+    def weight(c_n, t_n, r_n, s_n):
+        return (s_n + 1) * (r_n + 2) + 3 * t_n + c_n
+
+    numbers = [{e.id: n for n, e in enumerate(entities)} for entities in (classes, teachers, rooms, time_slots)]
+    reference.Minimize(sum(weight(*(n[k] for n, k in zip(numbers, key))) * v for key, v in x.items()))
+    indices = range(len(scheduler.var_kind))
+    built.objective.vars.extend(indices)
+    built.objective.coeffs.extend(weight(scheduler.var_class[i], scheduler.var_teacher[i], scheduler.var_room[i],
+                                         scheduler.var_slot[i]) for i in indices)
+    objectives = []
+    for model in (scheduler.model, reference):
+        solver = cp_model.CpSolver()
+        assert solver.Solve(model) == cp_model.OPTIMAL
+        objectives.append(solver.ObjectiveValue())
+    assert objectives[0] == objectives[1]
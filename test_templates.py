@@ -0,0 +1,46 @@
+from dataclasses import replace
+from models import SolverOptions
+from solver import SchoolScheduler
+from templates import TemplateCache
+from test_solver import sample_school, assert_valid
+
+def test_template_reuse_matches_fresh_build():
+    teachers, rooms, classes, time_slots = sample_school()
+    cache = TemplateCache()
+    variants = [
+        classes,
+        [replace(c, required_sessions=1) for c in classes],
+        [replace(c, teacher_id="t2") if c.id == "c1" else c for c in classes],
+        [replace(c, teacher_id="t1") if c.id == "c2" else c for c in classes],  # t1 cannot teach Science
+    ]
+    for formulation in SolverOptions.FORMULATIONS:
+        options = SolverOptions(formulation=formulation, precheck=False)
+        for i, variant in enumerate(variants):
+            fresh = SchoolScheduler(teachers, rooms, variant, time_slots, options).solve()
+            scheduler = SchoolScheduler(teachers, rooms, variant, time_slots, options, templates=cache)
+            reused = scheduler.solve()
+            assert scheduler.template_hit == (i > 0)
+            assert reused.status == fresh.status
+            if reused.schedule:
+                assert_valid(reused.schedule, teachers, rooms, variant, time_slots)
+                if variant[0].teacher_id == "t2":
+                    assert {a.teacher_id for a in reused.schedule if a.class_id == "c1"} == {"t2"}
+    assert cache.stats()["entries"] == 2
+
+def test_templates_survive_restart_and_are_evicted(tmp_path):
+    school = sample_school()
+    cache = TemplateCache(disk_dir=str(tmp_path))
+    SchoolScheduler(*school, templates=cache).build()
+    SchoolScheduler(*school, SolverOptions(formulation="factorized"), templates=cache).build()
+
+    restarted = TemplateCache(disk_dir=str(tmp_path))
+    scheduler = SchoolScheduler(*school, templates=restarted)
+    result = scheduler.solve()
+    assert scheduler.template_hit and restarted.stats()["disk_hits"] == 1
+    assert_valid(result.schedule, *school)
+
+    # Room for only one template in memory
+    small = TemplateCache(max_bytes=cache.stats()["bytes"] * 2 // 3)
+    SchoolScheduler(*school, templates=small).build()
+    SchoolScheduler(*school, SolverOptions(formulation="factorized"), templates=small).build()
+    assert small.stats()["entries"] == 1 and small.stats()["evictions"] == 1
@@ -0,0 +1,54 @@
+import pytest
+from dataclasses import replace
+from models import SolverOptions
+from solver import SchoolScheduler
+from term import TermSpec, rotation_schools, solve_term
+from test_solver import sample_school, assert_valid
+
+def test_rotation_shares_cycle_sessions_evenly():
+    school = sample_school()
+    spec = TermSpec.from_dict({"weeks": 4, "rotation": ["A", "B"], "cycle_sessions": {"c1": 5, "c2": 3}})
+    weeks = rotation_schools(school, spec)
+    sessions = {label: [c.required_sessions for c in week[2]] for label, week in weeks.items()}
+    # c1 and c2 put their odd session in different weeks; c3 keeps 2 per week
+    assert sessions == {"A": [3, 1, 2], "B": [2, 2, 2]}
+    with pytest.raises(ValueError):
+        TermSpec.from_dict({"weeks": 2, "exceptions": [{"week": 3}]})
+    with pytest.raises(ValueError):
+        rotation_schools(school, TermSpec.from_dict({"cycle_sessions": {"nope": 1}}))
+
+def test_exception_weeks_move_or_drop_only_displaced_sessions():
+    teachers, rooms, classes, time_slots = sample_school()
+    time_slots = time_slots + [replace(s, id=f"T{s.period}", day="Tue") for s in time_slots]
+    school = (teachers, rooms, classes, time_slots)
+    spec = TermSpec.from_dict({"weeks": 6, "exceptions": [
+        {"week": 2, "closed_days": ["Mon"]},
+        {"week": 4, "closed_days": ["Mon"]},
+        {"week": 5, "closed_days": ["Mon", "Tue"]},
+        {"week": 6, "teachers": {"t1": ["T1", "T2", "T3", "T4"]}},
+    ]})
+    calls = []
+
+    def solve(*args):
+        calls.append(args)
+        return SchoolScheduler(*args).solve()
+
+    result = solve_term(school, spec, SolverOptions(num_workers=1), solve)
+    assert result.status == "OPTIMAL"
+    # One pattern solve; weeks 2 and 4 share one re-solve
+    assert len(calls) == 4
+    pattern = result.patterns["A"]
+    assert_valid(pattern, *school)
+    assert [w.schedule is None for w in result.weeks] == [True, False, True, False, False, False]
+    week2 = result.weeks[1]
+    assert not any(a.time_slot_id.startswith("s") for a in week2.schedule)
+    assert week2.missed == {} and len(week2.schedule) == len(pattern)
+    assert result.weeks[3].schedule == week2.schedule
+    assert sum(result.weeks[4].missed.values()) == len(pattern) and result.weeks[4].schedule == []
+    # Only t1's Tuesday sessions move; everything else stays put
+    week6 = result.weeks[5]
+    moved = {(a["class_id"], a["time_slot_id"]) for a in week6.changes["removed"]}
+    assert all(a.teacher_id == "t1" and a.time_slot_id.startswith("T")
+               for a in pattern if (a.class_id, a.time_slot_id) in moved)
+    assert not any(a.teacher_id == "t1" and a.time_slot_id.startswith("T") for a in week6.schedule)
+    assert len(result.expand()) == sum(len(result.week_schedule(w)) for w in result.weeks)